@@ -1,48 +1,39 @@
-import os 
+import json
+import hashlib
+import threading
 import pandas as pd
 import numpy as np
-import pickle as pkl
 from collections import Counter
+from typing import Any, Callable, Dict, Hashable, List, NamedTuple, Optional
+from fastapi import Response
+from utils.data_store import DataStore, get_data_store, on_data_store_reload
 
+WEEK_DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+HOUR_BINS = list(range(0, 25, 1))
+HOUR_LABELS = [f'{s:02}:00-{e-1:02}:59' for s, e in zip(HOUR_BINS[:-1], HOUR_BINS[1:])]
 
 
-# Load the user segments
-user_segments = pd.DataFrame()
-PROJECT_ROOT = os.path.abspath(os.getcwd()) 
-DATA_PATH = os.path.join(PROJECT_ROOT, "data/")
-
-# Load the uswe segment data
-user_segments = {}
-with open(os.path.join(DATA_PATH, "user_segments_viz.pkl"), "rb") as f:
-    data = pkl.load(f)
-    user_segments = pd.DataFrame.from_dict(data, orient="index").reset_index()
-    user_segments.rename(columns={'index': 'id'}, inplace=True)
-
-def load_user_segments():
-    segms = user_segments.copy()
+# ==========================================================
+#  PAYLOAD BUILDERS (pure: the shared frames are only read)
+# ==========================================================
+def load_user_segments(store: Optional[DataStore] = None) -> List[Dict[str, Any]]:
+    segms = (store or get_data_store()).user_segments
     segments = []
-    for _, row in segms.iterrows():
-        segment_obj = {
-            "id": row["id"],
-            "title": row["title"],
-            "unique_users": row["df"].user_pseudo_id.nunique(),
-            "trend": (
-                row["df"]
-                .groupby("event_date")
-                .session_id_unique.count()
-                .fillna(0)
-                .tolist()
-            ), 
-        }
-        segments.append(segment_obj)
-    segments 
+    for segment_id, title, df in zip(segms["id"], segms["title"], segms["df"]):
+        segments.append({
+            "id": segment_id,
+            "title": title,
+            "unique_users": int(df.user_pseudo_id.nunique()),
+            "trend": df.groupby("event_date").session_id_unique.count().fillna(0).tolist()
+        })
     return segments
 
-def load_user_segments_detail(id):
+
+def load_user_segments_detail(id, store: Optional[DataStore] = None) -> Dict[str, Any]:
     def get_n_weeks(df):
-      return np.median(list(Counter(list(map(lambda x: x.weekday(), df.event_date.unique()))).values()))
-  
-    segms = user_segments.copy()
+        return np.median(list(Counter(list(map(lambda x: x.weekday(), df.event_date.unique()))).values()))
+
+    segms = (store or get_data_store()).user_segments
     id = int(id)
     segment_det = segms[segms["id"] == id]
 
@@ -50,61 +41,135 @@ def load_user_segments_detail(id):
         return {"error": f"No segment found with id {id}"}
 
     row = segment_det.iloc[0]
+    df = row["df"]
 
     # MEtrics calculation
-    engage_time = float(row["df"][(row["df"]["true_engagement"] == True) & (row["df"]["diff"] > 0) & (row["df"]["diff"] < 30*60)]["diff"].mean() / 60)
-    n_eng = row["df"]["true_engagement"].sum()
-    n_not_eng = row["df"].shape[0] - n_eng
+    engage_time = float(df[(df["true_engagement"] == True) & (df["diff"] > 0) & (df["diff"] < 30*60)]["diff"].mean() / 60)
+    n_eng = df["true_engagement"].sum()
+    n_not_eng = df.shape[0] - n_eng
 
     # Time perspective
     # 1
-    target_cluster_temporal = row["df"].groupby("event_on_weekend").id.count()
-    n_weeks = get_n_weeks(row["df"])
+    target_cluster_temporal = df.groupby("event_on_weekend").id.count()
+    n_weeks = get_n_weeks(df)
     week, weekend = target_cluster_temporal / [5*n_weeks, 2*n_weeks]
-    #2 
-    bins = list(range(0, 25, 1))
-    labels = [f'{s:02}:00-{e-1:02}:59' for s, e in zip(bins[:-1], bins[1:])]
-    row["df"].loc[:, 'time_bin'] = pd.cut(
-    row["df"].event_time.dt.hour, bins, labels=labels, right=False)
-    day_consumption = row["df"].groupby("time_bin").event_date.count()
-    day_consumption_times = [str(k) for k in day_consumption.index]
-    day_consumption_values = [int(v) for v in day_consumption.values]
-    #3
-    df_day_count = row["df"].groupby(row["df"].event_date.dt.day_name()).count().loc[["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]]
-    day_cnt_names = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-    day_cnt_vals = [int(v) for v in df_day_count['event_date'].values]
-
-    # transition matrix las 
-    mm_cat = row["seq_model"]["df"].iloc[:-1,:-1]
-
-    segment_obj = {
-      "id": int(row["id"]),                             
-      "title": str(row["title"]),
-      "desc": str(row["desc"]),
-      "unique_users": int(row["df"].user_pseudo_id.nunique()),  
-      "regions": row["regions"],                         
-      "freq_users": int(row["user_type_cnt"]['frequent']),              
-      "not_freq_users": int(row["user_type_cnt"]['nonfrequent']),              
-      "regions_desc": str(row["regions_desc"]),
-      "engage_time": engage_time,
-      "unique_sessions": int(len(row["df"]["session_id_unique"])),
-      "engaged": int(n_eng),
-      "not_engaged": int(n_not_eng),
-      # Time perspective
-      "weekday": int(week),
-      "weekend": int(weekend),
-      "day_consumption": {
-        "times": day_consumption_times,
-        "values": day_consumption_values
-      },
-      "day_count":{
-        "day": day_cnt_names,
-        "value": day_cnt_vals
-      },
-      # Transition Matrix 
-      "mm_cat": mm_cat
+    # 2 (hour bins as a local series, the shared frame is left untouched)
+    time_bin = pd.cut(df.event_time.dt.hour, HOUR_BINS, labels=HOUR_LABELS, right=False)
+    day_consumption = df.event_date.groupby(time_bin, observed=False).count()
+    # 3
+    day_count = df.event_date.groupby(df.event_date.dt.day_name()).count().loc[WEEK_DAYS]
+
+    # transition matrix las
+    mm_cat = row["seq_model"]["df"].iloc[:-1, :-1]
+
+    return {
+        "id": int(row["id"]),
+        "title": str(row["title"]),
+        "desc": str(row["desc"]),
+        "unique_users": int(df.user_pseudo_id.nunique()),
+        "regions": row["regions"],
+        "freq_users": int(row["user_type_cnt"]['frequent']),
+        "not_freq_users": int(row["user_type_cnt"]['nonfrequent']),
+        "regions_desc": str(row["regions_desc"]),
+        "engage_time": engage_time,
+        "unique_sessions": int(len(df["session_id_unique"])),
+        "engaged": int(n_eng),
+        "not_engaged": int(n_not_eng),
+        # Time perspective
+        "weekday": int(week),
+        "weekend": int(weekend),
+        "day_consumption": {
+            "times": [str(k) for k in day_consumption.index],
+            "values": [int(v) for v in day_consumption.values]
+        },
+        "day_count": {
+            "day": WEEK_DAYS,
+            "value": [int(v) for v in day_count.values]
+        },
+        # Transition Matrix
+        "mm_cat": mm_cat.to_dict()
     }
-    return segment_obj
 
 
+# ==========================================================
+#  RESPONSE CACHE
+# ==========================================================
+class CachedPayload(NamedTuple):
+    body: bytes
+    etag: str
+
+
+def render_payload(content: Any) -> CachedPayload:
+    """JSON body (same encoding as FastAPI's JSONResponse) and its strong ETag."""
+    body = json.dumps(
+        content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+    return CachedPayload(body, f'"{hashlib.sha1(body).hexdigest()}"')
+
+
+class PayloadCache:
+    """
+    Rendered dashboard payloads of the current data snapshot. Each payload
+    is built on first request and served as-is until the data store
+    version changes, so repeated dashboard loads cost a dict lookup.
+    """
+
+    def __init__(self):
+        self._version: Optional[int] = None
+        self._payloads: Dict[Hashable, CachedPayload] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, build: Callable[[DataStore], Any]) -> CachedPayload:
+        store = get_data_store()
+        with self._lock:
+            if self._version != store.version:
+                self._payloads.clear()
+                self._version = store.version
+            payload = self._payloads.get(key)
+        if payload is None:
+            payload = render_payload(build(store))
+            with self._lock:
+                # A reload while building: the payload belongs to the old snapshot
+                if self._version == store.version:
+                    self._payloads[key] = payload
+        return payload
+
+    def clear(self, store: Optional[DataStore] = None) -> None:
+        with self._lock:
+            self._payloads.clear()
+            self._version = None
+
+
+payload_cache = PayloadCache()
+on_data_store_reload(payload_cache.clear)
+
+
+def user_segments_payload() -> CachedPayload:
+    return payload_cache.get("segments", lambda store: {"segments": load_user_segments(store)})
+
+
+def user_segment_detail_payload(id) -> CachedPayload:
+    id = int(id)
+    store = get_data_store()
+    if id not in set(store.user_segments["id"]):
+        # Unknown ids are not cached: the key space is unbounded
+        return render_payload({"segment_detail": load_user_segments_detail(id, store)})
+    return payload_cache.get(
+        ("segment", id), lambda store: {"segment_detail": load_user_segments_detail(id, store)}
+    )
+
+
+def _etag_matches(etag: str, if_none_match: Optional[str]) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    # Weak comparison, as required for If-None-Match
+    return "*" in tags or etag in [t[2:] if t.startswith("W/") else t for t in tags]
+
 
+def payload_response(payload: CachedPayload, if_none_match: Optional[str] = None) -> Response:
+    """200 with the cached body, or 304 when the client already holds this version."""
+    headers = {"ETag": payload.etag, "Cache-Control": "no-cache"}
+    if _etag_matches(payload.etag, if_none_match):
+        return Response(status_code=304, headers=headers)
+    return Response(content=payload.body, media_type="application/json", headers=headers)
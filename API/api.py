@@ -1,11 +1,14 @@
 import uuid
+from typing import Optional
 import uvicorn
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, Query, Header
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from API.SystemAPI import load_user_segments, load_user_segments_detail
+from utils.serialization import dumps
+from API.SystemAPI import user_segments_payload, user_segment_detail_payload, payload_response
 from Assistant.ARDIChat import ChatAssistant
-from crud.thread import create_new_thread, load_threads, load_thread_messages, update_thread_name, remove_thread, get_dataset_evaluations
+from crud.thread import create_new_thread, load_threads, load_thread_messages, update_thread_name, remove_thread, get_dataset_evaluations, HISTORY_PAGE_SIZE
 from crud.users import load_users, create_user
 from crud.login import login_user
 from db.session import get_db
@@ -53,14 +56,33 @@ class Question(BaseModel):
     question: str
     thread_id: str
 @app.post("/chat/ask")
-def chat_endpoint(question: Question, db: Session = Depends(get_db)):
-    response = chat.ask(db, question)
+async def chat_endpoint(question: Question, db: Session = Depends(get_db)):
+    # Async path: the event loop is free while the LLM calls are in flight
+    response = await chat.aask(db, question)
     return {"response": response}
 
 
+async def to_sse(events):
+    """Formats agent events as server-sent events (event name + JSON data)."""
+    async for event in events:
+        payload = {k: v for k, v in event.items() if k != "event"}
+        yield f"event: {event['event']}\ndata: {dumps(payload).decode('utf-8')}\n\n"
+
+@app.post("/chat/ask/stream")
+async def chat_stream_endpoint(question: Question, db: Session = Depends(get_db)):
+    # Same pipeline as /chat/ask, pushed to the client as it progresses:
+    # start -> step (planning, validation, ...) -> tool -> token ... -> final
+    return StreamingResponse(
+        to_sse(chat.aask_stream(db, question)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 class CreateThreadEvaluationRequest(BaseModel):
     user_id: uuid.UUID
     name: str = "Dataset Evaluation"
+    thread_id: Optional[uuid.UUID] = None    # resume an interrupted evaluation
 @app.post("/dataset_evaluation")
 def dataset_evaluation(
     req: CreateThreadEvaluationRequest, 
@@ -70,7 +92,8 @@ def dataset_evaluation(
     response = chat.evaluate_dataset(
         db, 
         user_id=req.user_id,
-        name=req.name
+        name=req.name,
+        thread_id=req.thread_id
     )
     return {"evaluarion": response}
 
@@ -121,18 +144,17 @@ def login_endpoint(
 # ===============================
 # System Endpoints 
 # ===============================
+# Payloads are cached per data version; clients revalidate with If-None-Match
 # Get all user segments
 @app.get("/UserSegments")
-def get_user_segments():
-    response = load_user_segments()
-    return {"segments": response}
+def get_user_segments(if_none_match: Optional[str] = Header(None)):
+    return payload_response(user_segments_payload(), if_none_match)
 
 
 # Get details for one segment by ID
 @app.get("/UserSegment/{id}")
-def get_user_segment_detail(id: str):
-    response = load_user_segments_detail(id)
-    return {"segment_detail": response}
+def get_user_segment_detail(id: str, if_none_match: Optional[str] = Header(None)):
+    return payload_response(user_segment_detail_payload(id), if_none_match)
 
 
 from pydantic import BaseModel
@@ -166,9 +188,14 @@ def get_user_threads(user_id: UUID, db: Session = Depends(get_db)):
 def get_history(
     thread_id: UUID,
     user_id: UUID,
+    before: Optional[int] = None,
+    before_id: Optional[UUID] = None,
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=500),
     db: Session = Depends(get_db)
 ):
-    return load_thread_messages(db, thread_id, user_id)
+    # Cursor pagination: pass the id of the oldest loaded message as `before_id`.
+    # Message timestamps (and `before`) are epoch milliseconds in UTC.
+    return load_thread_messages(db, thread_id, user_id, before=before, limit=limit, before_id=before_id)
 
 
 
@@ -1,31 +1,26 @@
 import os
 import uuid
+import asyncio
 from pydantic import BaseModel
 from dotenv import load_dotenv
 from sqlalchemy.orm import Session
 from langchain.chat_models import init_chat_model
-import pandas as pd
-from collections import defaultdict
 
 # Internal imports
 from utils.utils import Settings
 from .agent_core.workflow import Workflow
 from .agent_core.planner import Plan  
-from db.insert_dataset import DatasetEntry
-from crud.message import create_human_message, create_assistant_message
-from models.thread import Thread
-from models.message import Message
-from models.run import Run
-from models.step import Step
-from models.toolCall import ToolCall
-from sqlalchemy.orm import aliased
+from .agent_core.checkpointer import create_checkpointer
+from .agent_core.response_cache import ResponseCache
+from .agent_core.compactor import OutputCompactor
+from .evaluation import DatasetEvaluationRunner, EVAL_WORKERS
 
+from crud.run import create_run, end_run
+from crud.trace import TraceRecorder
 
-from models.datasetEvaluation import DatasetEvaluation
-import psycopg2
-import psycopg2.extras
+# Workflow nodes whose LLM output is the answer shown to the user
+RESPONSE_NODES = ("generate_response", "direct_response")
 
-from crud.run import create_run, end_run
 
 # ==========================================================
 #  ARDI AGENT
@@ -68,10 +63,27 @@ class Agent:
         """Build the LangGraph workflow with all nodes connected."""
         self.workflow = Workflow(
             base_llm=self.base_llm,
-            plan_structure_llm=self.plan_structure_llm
+            plan_structure_llm=self.plan_structure_llm,
+            checkpointer=create_checkpointer(self.settings.checkpointer),
+            response_cache=self._response_cache(),
+            compactor=OutputCompactor(
+                max_tokens=self.settings.compaction.max_tokens,
+                model_name=self.llm_config.model_name
+            )
         )
         self.request = self.workflow.graph
 
+    def _response_cache(self):
+        """Answer cache keyed on the model config (None when disabled)."""
+        config = self.settings.response_cache
+        if not config.enabled:
+            return None
+        return ResponseCache(
+            model_config=self.llm_config.model_dump(),
+            ttl_s=config.ttl_hours * 3600,
+            max_entries=config.max_entries
+        )
+
     # ------------------------------------------------------
     #  MAIN ENTRYPOINT - Capture User question
     # ------------------------------------------------------
@@ -79,165 +91,135 @@ class Agent:
         """
         Executes the full agent pipeline on a user question.
         """
+        return self.ask_with_run_id(db, message_obj)[1]
+
 
-        thread_id = message_obj.thread_id
+    def ask_with_run_id(self, db: Session, message_obj, checkpoint_key: str = None):
+        """
+        Same as ask, also returning the id of the Run it recorded
+        (used to score evaluation runs from their tool calls).
+        checkpoint_key replaces the thread id as the key of the saved graph
+        state, so concurrent runs on one thread do not share a checkpoint.
+        """
         message_content = message_obj.content
-        session_config = {"configurable": {"thread_id": str(thread_id)}}
         print(f"User question: {message_content}\n")
         execution_result = {}
 
         run = create_run(db, message_obj.id)
-        self.workflow.set_db(db)
-        self.workflow.failed = False
-        state = {
-            "question": message_content, 
-            "thread_id": thread_id,
-            "run_id": run.id
-        }
-        for step in self.request.stream(
-            state,
-            session_config,
-            stream_mode="updates"
-        ):
+        trace = TraceRecorder(db)
+        try:
+            for step in self.request.stream(
+                self._initial_state(message_obj, run.id),
+                self.workflow.run_config(checkpoint_key or message_obj.thread_id, trace),
+                stream_mode="updates"
+            ):
+                print(f"📍 Step update: {step}")
+                key = list(step.keys())[0]         
+                execution_result[key] = step[key]
+        except Exception:
+            # Persist whatever was traced before the failure
+            self._close_run(db, trace, run.id, "failed")
+            raise
+
+        # Last flush of the steps and tool calls (each node flushed its own)
+        self._close_run(db, trace, run.id, "completed")
+        print("\n✅ Agent pipeline finished successfully!\n")
+        return run.id, execution_result 
+
+
+    async def aask(self, db: Session, message_obj):
+        """
+        Async variant of ask: LLM calls are awaited and tools run on worker
+        threads, so many questions can be in flight on one event loop.
+        The few DB round trips are pushed to a thread as well.
+        """
+        execution_result = {}
+        async for _, step in self._arun(db, message_obj, ["updates"]):
             print(f"📍 Step update: {step}")
-            key = list(step.keys())[0]         
+            key = list(step.keys())[0]
             execution_result[key] = step[key]
-        
-        end_run(db, run.id)
+
         print("\n✅ Agent pipeline finished successfully!\n")
-        return execution_result 
+        return execution_result
+
+
+    async def aask_stream(self, db: Session, message_obj):
+        """
+        Runs the pipeline like aask, but yields progress events as they
+        happen instead of waiting for the final answer:
+        - {"event": "step", "node": ..., "data": ...}  a workflow node finished
+        - {"event": "tool", ...}                       a plan task finished
+        - {"event": "plan_update", ...}                the analyzer re-planned
+        - {"event": "token", "data": ...}              a chunk of the answer
+        """
+        async for mode, chunk in self._arun(db, message_obj, ["updates", "messages", "custom"]):
+            if mode == "updates":
+                node = list(chunk.keys())[0]
+                yield {"event": "step", "node": node, "data": chunk[node]}
+            elif mode == "messages":
+                # Only the answer is streamed token by token; the planner
+                # and analyzer LLM calls are reported through their steps
+                message, metadata = chunk
+                if metadata.get("langgraph_node") in RESPONSE_NODES and message.content:
+                    yield {"event": "token", "data": message.content}
+            else:
+                yield chunk
+
+
+    async def _arun(self, db: Session, message_obj, stream_mode: list):
+        """
+        Streams one run of the workflow, yielding (mode, chunk) pairs,
+        and closes the run (trace flush + status) when it ends, fails
+        or is abandoned by the consumer.
+        """
+        print(f"User question: {message_obj.content}\n")
+        run = await asyncio.to_thread(create_run, db, message_obj.id)
+        trace = TraceRecorder(db)
+        try:
+            async for mode, chunk in self.request.astream(
+                self._initial_state(message_obj, run.id),
+                self.workflow.run_config(message_obj.thread_id, trace),
+                stream_mode=stream_mode
+            ):
+                yield mode, chunk
+        except (Exception, asyncio.CancelledError, GeneratorExit):
+            # Also reached when a streaming client disconnects mid-run
+            await asyncio.to_thread(self._close_run, db, trace, run.id, "failed")
+            raise
+
+        await asyncio.to_thread(self._close_run, db, trace, run.id, "completed")
+
+
+    @staticmethod
+    def _initial_state(message_obj, run_id) -> dict:
+        # Per-run fields; 'failed' and 'validation' must be reset since the
+        # thread's previous state is restored from the checkpointer
+        return {
+            "question": message_obj.content,
+            "thread_id": message_obj.thread_id,
+            "run_id": run_id,
+            "validation": None,
+            "failed": False
+        }
+
+
+    @staticmethod
+    def _close_run(db: Session, trace: TraceRecorder, run_id, status: str):
+        trace.flush()
+        end_run(db, run_id, status=status)
     
 
     def process_dataset_entries(
             self, 
             db: Session,
             user_id: uuid.UUID,
-            name: str = "Dataset Evaluation"
+            name: str = "Dataset Evaluation",
+            thread_id: uuid.UUID = None,
+            max_workers: int = EVAL_WORKERS
         ):
-            # Create the new evaluation thread
-            new_session = Thread(name=name, user_id=user_id)
-            db.add(new_session)
-            db.commit()
-            db.refresh(new_session)
-
-            thread_id = new_session.id
-
-            # Fetch dataset entries
-            entries = db.query(DatasetEntry).all()
-            print(f"📦 Found {len(entries)} dataset entries to process.")
-
-            # --- MAIN EXECUTION LOOP ---
-            for i, entry in enumerate(entries, start=1):
-                print(f"\n🚀 Processing entry {i}/{len(entries)} | ID: {entry.id}")
-                print(entry.user_query)
-
-                # Create human message
-                human_msg = create_human_message(
-                    db, thread_id=thread_id, content=entry.user_query
-                )
-                print(human_msg.content)
-
-                execution = self.ask(db, human_msg)
-
-                # Extract assistant response
-                resp_obj = execution.get("direct_response") or execution.get("generate_response")
-                response_text = resp_obj["response"] if resp_obj else None
-
-                # Save assistant message
-                create_assistant_message(
-                    db, thread_id=thread_id, content=response_text, resp_msg_id=human_msg.id
-                )
-                print(response_text)
-
-
-            def evaluate_tool_usage(rows):
-                grouped = defaultdict(lambda: {"labels": set(), "actual": set()})
-
-                for row in rows:
-                    q = row.question   # FIXED
-
-                    if row.tools_used:
-                        grouped[q]["labels"] = set(row.tools_used)
-
-                    if row.tool_name is not None:
-                        grouped[q]["actual"].add(row.tool_name)
-
-                results = []
-
-                for question, data in grouped.items():
-                    labels = data["labels"]
-                    actual = data["actual"]
-
-                    matched = len(actual.intersection(labels))
-                    total_labels = len(labels)
-
-                    ratio = matched / total_labels if total_labels > 0 else 0
-                    ratio_str = f"{matched}/{total_labels}" if total_labels > 0 else "0/0"
-
-                    results.append({
-                        "question": question,
-                        "labels": sorted(labels),
-                        "actual_tools": sorted(actual),
-                        "matched": matched,
-                        "total_labels": total_labels,
-                        "match_ratio": ratio,
-                        "match_ratio_str": ratio_str
-                    })
-
-                results.sort(key=lambda x: x["question"])
-                return results
-
-
-            MessageAlias = aliased(Message)
-
-            rows = (
-                db.query(
-                    Message.content.label("question"),
-                    ToolCall.tool_name.label("tool_name"),
-                    DatasetEntry.tools_used.label("tools_used")
-                )
-                # Thread → Message
-                .join(Thread, Message.thread_id == Thread.id)
-                # Message → user_msg
-                .outerjoin(MessageAlias, MessageAlias.response_to == Message.id)
-                # user_msg → Run
-                .outerjoin(Run, Run.message_id == MessageAlias.id)
-                # Run → Step
-                .outerjoin(
-                    Step,
-                    (Step.run_id == Run.id) & (Step.name == "Plan Execution")
-                )
-                # Step → ToolCall
-                .outerjoin(ToolCall, ToolCall.step_id == Step.id)
-                # Message.content → DatasetEntry.user_query
-                .join(DatasetEntry, DatasetEntry.user_query == Message.content)
-                .filter(Thread.id == thread_id)
-                .order_by(Message.content.asc())
-                .all()
-            )
-
-            # ---------------------------------------------------------
-            # Process evaluation results
-            # ---------------------------------------------------------
-            print(rows)
-            results = evaluate_tool_usage(rows)
-            print(results)
-            df = pd.DataFrame(results)
-            print(df)
-
-            for _, row in df.iterrows():
-                print(row)
-                evaluation = DatasetEvaluation(
-                    thread_id=thread_id,
-                    question=row["question"],
-                    labels=row["labels"],
-                    actual_tools=row["actual_tools"],
-                    matched=row["matched"],
-                    total_labels=row["total_labels"],
-                    match_ratio=row["match_ratio"],
-                    match_ratio_str=row["match_ratio_str"]
-                )
-                db.add(evaluation)
-
-            db.commit()
-            return
\ No newline at end of file
+        """
+        Runs every DatasetEntry through the agent and scores the tools it
+        used. Passing the thread_id of an interrupted evaluation resumes it.
+        """
+        runner = DatasetEvaluationRunner(self, max_workers=max_workers)
+        return runner.run(db, user_id, name, thread_id=thread_id)
\ No newline at end of file
@@ -1,5 +1,6 @@
 import os
 import uuid
+import asyncio
 import logging
 from .ARDI import Agent
 from pydantic import BaseModel
@@ -36,7 +37,43 @@ class ChatAssistant():
         human_msg = create_human_message(db, thread_id=question.thread_id, content=question.question)
         print(human_msg.content)
         execution = self.agent.ask(db, human_msg)
+        return self._build_response(db, question, human_msg, execution)
 
+    async def aask(self, db: Session, question: Question):
+        """
+        Non-blocking variant of ask used by the async API endpoint.
+        """
+        human_msg = await asyncio.to_thread(
+            create_human_message, db, thread_id=question.thread_id, content=question.question
+        )
+        execution = await self.agent.aask(db, human_msg)
+        return await asyncio.to_thread(self._build_response, db, question, human_msg, execution)
+
+    async def aask_stream(self, db: Session, question: Question):
+        """
+        Streaming variant of aask: yields the agent progress events as they
+        happen and, once the answer is complete, persists the assistant
+        message and yields it as the "final" event.
+        """
+        human_msg = await asyncio.to_thread(
+            create_human_message, db, thread_id=question.thread_id, content=question.question
+        )
+        yield {"event": "start", "message_id": str(human_msg.id)}
+
+        execution = {}
+        async for event in self.agent.aask_stream(db, human_msg):
+            if event["event"] == "step":
+                execution[event["node"]] = event["data"]
+                if event["node"] == "run_plan":
+                    # Tool outputs were already sent one by one as "tool" events
+                    event = {**event, "data": {k: v for k, v in event["data"].items() if k != "outputs"}}
+            yield event
+
+        response = await asyncio.to_thread(self._build_response, db, question, human_msg, execution)
+        yield {"event": "final", "data": response}
+
+    @staticmethod
+    def _build_response(db: Session, question: Question, human_msg, execution: dict):
         # Extract relevant information to the user 
         # Response 
         resp_obj = execution.get("direct_response") or execution.get("generate_response")
@@ -47,7 +84,7 @@ class ChatAssistant():
         # Outputs - Grounded base for the answer 
         run_plan = execution.get("run_plan")
         plan_outputs = []
-        if run_plan:
+        if run_plan and run_plan.get("outputs"):
             for output in run_plan["outputs"]:
                 plan_outputs.append(run_plan["outputs"][output]) 
         
@@ -58,6 +95,5 @@ class ChatAssistant():
         }
         return response
     
-    def evaluate_dataset(self, db: Session, user_id=uuid.UUID, name=str):
-        self.agent.process_dataset_entries(db, user_id, name)
-        return "Finish dataset evaluation"
\ No newline at end of file
+    def evaluate_dataset(self, db: Session, user_id=uuid.UUID, name=str, thread_id: uuid.UUID = None):
+        return self.agent.process_dataset_entries(db, user_id, name, thread_id=thread_id)
\ No newline at end of file
@@ -0,0 +1,280 @@
+import time
+import zlib
+import asyncio
+import threading
+from datetime import datetime
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Sequence, Tuple
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.memory import InMemorySaver
+from utils.utils import CheckpointerConfig
+from models.graphCheckpoint import GraphCheckpoint, GraphCheckpointWrite
+
+
+def _thread_config(thread_id: str, checkpoint_ns: str, checkpoint_id: Optional[str]) -> Optional[RunnableConfig]:
+    if checkpoint_id is None:
+        return None
+    return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}}
+
+
+# ==========================================================
+#  BOUNDED IN-MEMORY SAVER
+# ==========================================================
+class BoundedMemorySaver(InMemorySaver):
+    """
+    InMemorySaver that keeps only what the workflow reads back: the latest
+    checkpoint of each thread (the graph never travels back in time), for
+    at most `max_threads` threads, each dropped after `max_idle_s` without
+    use. Evicted threads start their next question from an empty state.
+    """
+
+    def __init__(self, max_threads: int = 256, max_idle_s: float = 7200, **kwargs):
+        super().__init__(**kwargs)
+        self.max_threads = max_threads
+        self.max_idle_s = max_idle_s
+        self._last_used: "OrderedDict[str, float]" = OrderedDict()
+        # The graph writes from worker threads; storage dicts are shared
+        self._lock = threading.RLock()
+
+    def _touch(self, thread_id: str) -> None:
+        self._last_used[thread_id] = time.monotonic()
+        self._last_used.move_to_end(thread_id)
+
+    def _evict(self) -> None:
+        cutoff = time.monotonic() - self.max_idle_s
+        while self._last_used:
+            thread_id, last_used = next(iter(self._last_used.items()))
+            if len(self._last_used) <= self.max_threads and last_used >= cutoff:
+                break
+            super().delete_thread(thread_id)
+            del self._last_used[thread_id]
+
+    def _keep_latest(self, thread_id: str, checkpoint_ns: str, checkpoint: Checkpoint) -> None:
+        saved = self.storage[thread_id][checkpoint_ns]
+        for checkpoint_id in [c for c in saved if c != checkpoint["id"]]:
+            del saved[checkpoint_id]
+            self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+        live = set(checkpoint["channel_versions"].items())
+        for key in [k for k in self.blobs if k[0] == thread_id and k[1] == checkpoint_ns]:
+            if (key[2], key[3]) not in live:
+                del self.blobs[key]
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        with self._lock:
+            thread_id = config["configurable"]["thread_id"]
+            # Lookups must not create entries for unknown threads
+            if thread_id not in self.storage:
+                return None
+            if thread_id in self._last_used:
+                self._touch(thread_id)
+            return super().get_tuple(config)
+
+    def list(self, config, *, filter=None, before=None, limit=None) -> Iterator[CheckpointTuple]:
+        with self._lock:
+            items = list(super().list(config, filter=filter, before=before, limit=limit))
+        yield from items
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        with self._lock:
+            saved = super().put(config, checkpoint, metadata, new_versions)
+            thread_id = config["configurable"]["thread_id"]
+            self._keep_latest(thread_id, config["configurable"]["checkpoint_ns"], checkpoint)
+            self._touch(thread_id)
+            self._evict()
+            return saved
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        with self._lock:
+            super().put_writes(config, writes, task_id, task_path)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            super().delete_thread(thread_id)
+            self._last_used.pop(thread_id, None)
+
+
+# ==========================================================
+#  DATABASE SAVER
+# ==========================================================
+class DatabaseSaver(BaseCheckpointSaver):
+    """
+    Checkpointer backed by the application database (Postgres or SQLite,
+    through SQLAlchemy), so conversation state survives restarts and is
+    not held in process memory. Each thread keeps one row: its latest
+    checkpoint, serialised with the graph serde and zlib compressed,
+    plus the pending writes of that checkpoint.
+    """
+
+    def __init__(self, session_factory, **kwargs):
+        super().__init__(**kwargs)
+        self.session_factory = session_factory
+
+    # ------------------------------------------------------
+    #  Serialisation
+    # ------------------------------------------------------
+    def _dump(self, value: Any) -> Tuple[str, bytes]:
+        type_, data = self.serde.dumps_typed(value)
+        return type_, zlib.compress(data, 1)
+
+    def _load(self, type_: str, data: bytes) -> Any:
+        return self.serde.loads_typed((type_, zlib.decompress(data)))
+
+    def _tuple(self, db, row: GraphCheckpoint) -> CheckpointTuple:
+        writes = (
+            db.query(GraphCheckpointWrite)
+            .filter(
+                GraphCheckpointWrite.thread_id == row.thread_id,
+                GraphCheckpointWrite.checkpoint_ns == row.checkpoint_ns,
+                GraphCheckpointWrite.checkpoint_id == row.checkpoint_id
+            )
+            .order_by(GraphCheckpointWrite.task_path, GraphCheckpointWrite.task_id, GraphCheckpointWrite.idx)
+            .all()
+        )
+        return CheckpointTuple(
+            config=_thread_config(row.thread_id, row.checkpoint_ns, row.checkpoint_id),
+            checkpoint=self._load(row.type, row.checkpoint),
+            metadata=self._load(row.meta_type, row.meta),
+            parent_config=_thread_config(row.thread_id, row.checkpoint_ns, row.parent_checkpoint_id),
+            pending_writes=[(w.task_id, w.channel, self._load(w.type, w.value)) for w in writes]
+        )
+
+    # ------------------------------------------------------
+    #  Reads
+    # ------------------------------------------------------
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        conf = config["configurable"]
+        with self.session_factory() as db:
+            row = db.get(GraphCheckpoint, (conf["thread_id"], conf.get("checkpoint_ns", "")))
+            checkpoint_id = get_checkpoint_id(config)
+            if row is None or (checkpoint_id and row.checkpoint_id != checkpoint_id):
+                return None
+            return self._tuple(db, row)
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        with self.session_factory() as db:
+            query = db.query(GraphCheckpoint)
+            if config:
+                conf = config["configurable"]
+                query = query.filter(GraphCheckpoint.thread_id == conf["thread_id"])
+                if conf.get("checkpoint_ns") is not None:
+                    query = query.filter(GraphCheckpoint.checkpoint_ns == conf["checkpoint_ns"])
+                if get_checkpoint_id(config):
+                    query = query.filter(GraphCheckpoint.checkpoint_id == get_checkpoint_id(config))
+            if before and get_checkpoint_id(before):
+                query = query.filter(GraphCheckpoint.checkpoint_id < get_checkpoint_id(before))
+
+            items = []
+            for row in query.order_by(GraphCheckpoint.checkpoint_id.desc()):
+                if limit is not None and len(items) >= limit:
+                    break
+                item = self._tuple(db, row)
+                if filter and not all(item.metadata.get(k) == v for k, v in filter.items()):
+                    continue
+                items.append(item)
+        yield from items
+
+    # ------------------------------------------------------
+    #  Writes
+    # ------------------------------------------------------
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        conf = config["configurable"]
+        thread_id, checkpoint_ns = conf["thread_id"], conf.get("checkpoint_ns", "")
+        type_, data = self._dump(checkpoint)
+        meta_type, meta = self._dump(get_checkpoint_metadata(config, metadata))
+
+        with self.session_factory() as db:
+            db.merge(GraphCheckpoint(
+                thread_id=thread_id,
+                checkpoint_ns=checkpoint_ns,
+                checkpoint_id=checkpoint["id"],
+                parent_checkpoint_id=conf.get("checkpoint_id"),
+                type=type_,
+                checkpoint=data,
+                meta_type=meta_type,
+                meta=meta,
+                updated_at=datetime.utcnow()
+            ))
+            # Writes of replaced checkpoints are already part of this one
+            db.query(GraphCheckpointWrite).filter(
+                GraphCheckpointWrite.thread_id == thread_id,
+                GraphCheckpointWrite.checkpoint_ns == checkpoint_ns,
+                GraphCheckpointWrite.checkpoint_id != checkpoint["id"]
+            ).delete(synchronize_session=False)
+            db.commit()
+        return _thread_config(thread_id, checkpoint_ns, checkpoint["id"])
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        conf = config["configurable"]
+        key = (conf["thread_id"], conf.get("checkpoint_ns", ""), conf["checkpoint_id"], task_id)
+        with self.session_factory() as db:
+            for idx, (channel, value) in enumerate(writes):
+                idx = WRITES_IDX_MAP.get(channel, idx)
+                # Regular writes are kept as first saved, special ones replaced
+                if idx >= 0 and db.get(GraphCheckpointWrite, (*key, idx)) is not None:
+                    continue
+                type_, data = self._dump(value)
+                db.merge(GraphCheckpointWrite(
+                    thread_id=key[0], checkpoint_ns=key[1], checkpoint_id=key[2], task_id=task_id,
+                    idx=idx, channel=channel, type=type_, value=data, task_path=task_path
+                ))
+            db.commit()
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self.session_factory() as db:
+            db.query(GraphCheckpointWrite).filter(GraphCheckpointWrite.thread_id == str(thread_id)).delete()
+            db.query(GraphCheckpoint).filter(GraphCheckpoint.thread_id == str(thread_id)).delete()
+            db.commit()
+
+    # ------------------------------------------------------
+    #  Async: DB round trips run on a worker thread
+    # ------------------------------------------------------
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+# ==========================================================
+#  FACTORY
+# ==========================================================
+def create_checkpointer(config: Optional[CheckpointerConfig] = None) -> BaseCheckpointSaver:
+    """Checkpointer selected by the `checkpointer` section of settings.yaml."""
+    config = config or CheckpointerConfig()
+    if config.backend == "memory":
+        return BoundedMemorySaver(max_threads=config.max_threads, max_idle_s=config.max_idle_minutes * 60)
+    if config.backend == "database":
+        from db.base import SessionLocal
+        return DatabaseSaver(SessionLocal)
+    raise ValueError(f"Unknown checkpointer backend: {config.backend}. Use 'memory' or 'database'.")
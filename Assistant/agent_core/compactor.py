@@ -0,0 +1,304 @@
+import tiktoken
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from typing_extensions import TypedDict
+from crud.trace import TraceRecorder
+
+
+class State(TypedDict):
+    run_id: str
+    question: str
+    plan: Dict
+    outputs: Dict
+    plan_versions: List
+    response_context: Dict
+    failed: bool
+
+
+COMPACTION_MAX_TOKENS = 3000
+FALLBACK_ENCODING = "o200k_base"
+CHARS_PER_TOKEN = 4      # estimate used when no tiktoken encoding can be loaded
+
+
+# ====================================
+#  TOKEN COUNTING
+# ====================================
+class TokenCounter:
+    """
+    Counts tokens with the tiktoken encoding of the configured model.
+    Encodings are downloaded on first use; when that is not possible
+    (offline deployments, unknown models) the count is estimated from
+    the text length.
+    """
+
+    def __init__(self, model_name: str = ""):
+        self.encoding = None
+        try:
+            try:
+                self.encoding = tiktoken.encoding_for_model(model_name)
+            except KeyError:
+                self.encoding = tiktoken.get_encoding(FALLBACK_ENCODING)
+        except Exception as e:
+            print(f"⚠️ tiktoken encoding unavailable, estimating tokens from length: {e}")
+
+    def count(self, text: str) -> int:
+        if self.encoding is None:
+            return -(-len(text) // CHARS_PER_TOKEN)
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if self.encoding is None:
+            return text[:max_tokens * CHARS_PER_TOKEN]
+        return self.encoding.decode(self.encoding.encode(text, disallowed_special=())[:max_tokens])
+
+
+# ====================================
+#  SUMMARISATION RULES
+# ====================================
+class CompactionLevel(NamedTuple):
+    top_k: Optional[int]        # rows kept per list (None: all)
+    hour_bin: int               # hourly histogram rows merged into one
+    text_chars: Optional[int]   # characters kept per string (None: all)
+
+
+# Tried in order until the rendered outputs fit the budget
+LEVELS = (
+    CompactionLevel(top_k=None, hour_bin=1, text_chars=None),
+    CompactionLevel(top_k=10, hour_bin=2, text_chars=300),
+    CompactionLevel(top_k=5, hour_bin=4, text_chars=150),
+    CompactionLevel(top_k=3, hour_bin=6, text_chars=80),
+)
+
+
+class ToolRule(NamedTuple):
+    rank_by: Optional[str] = None      # rows are sorted on this field (desc) before keeping the top-k
+    histogram: Optional[str] = None    # hourly histogram field: binned instead of cut
+    top_values: Optional[str] = None   # {name: count} field: only the top-k counts are kept
+
+
+TOOL_RULES: Dict[str, ToolRule] = {
+    "get_segment_description": ToolRule(top_values="region_consumption"),
+    "get_segment_regions": ToolRule(rank_by="readers"),
+    "get_segment_regions_batch": ToolRule(rank_by="readers"),
+    "get_topic_transitions": ToolRule(rank_by="probability"),
+    "get_topic_transitions_batch": ToolRule(rank_by="probability"),
+    "get_next_topic_prediction": ToolRule(rank_by="probability"),
+    "get_segment_time_activity": ToolRule(histogram="activity_by_hour"),
+    "get_segment_time_activity_batch": ToolRule(histogram="activity_by_hour"),
+}
+
+
+def _is_scalar(value: Any) -> bool:
+    return value is None or isinstance(value, (str, int, float, bool))
+
+
+def _is_row(value: Any) -> bool:
+    return isinstance(value, dict) and all(_is_scalar(v) for v in value.values())
+
+
+def _bin_hours(rows: List[Dict], size: int) -> List[Dict]:
+    """Merges consecutive hourly rows, summing their counts ('00:00-00:59' .. → '00:00-03:59')."""
+    binned = []
+    for start in range(0, len(rows), size):
+        chunk = rows[start:start + size]
+        merged = {}
+        for key in chunk[0]:
+            values = [row.get(key) for row in chunk]
+            if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+                merged[key] = sum(values)
+            else:
+                first, last = str(values[0]), str(values[-1])
+                merged[key] = first if len(chunk) == 1 else f"{first.split('-')[0]}-{last.split('-')[-1]}"
+        binned.append(merged)
+    return binned
+
+
+def _summarise(value: Any, rule: ToolRule, level: CompactionLevel, field: Optional[str] = None) -> Any:
+    """Applies the rule and level limits to a tool output (recursively)."""
+    if isinstance(value, str):
+        if level.text_chars is not None and len(value) > level.text_chars:
+            return value[:level.text_chars].rstrip() + "…"
+        return value
+
+    if isinstance(value, dict):
+        if field is not None and field == rule.top_values and level.top_k is not None:
+            ranked = sorted(value.items(), key=lambda kv: kv[1] if isinstance(kv[1], (int, float)) else 0, reverse=True)
+            kept = dict(ranked[:level.top_k])
+            if len(ranked) > level.top_k:
+                kept["(others)"] = f"{len(ranked) - level.top_k} more"
+            return kept
+        return {k: _summarise(v, rule, level, k) for k, v in value.items()}
+
+    if isinstance(value, list):
+        if field is not None and field == rule.histogram and all(_is_row(v) for v in value):
+            return _bin_hours(value, level.hour_bin) if level.hour_bin > 1 else value
+        # Only plain lists (values / flat rows) are cut: batch results keep every segment
+        if level.top_k is not None and len(value) > level.top_k and all(_is_scalar(v) or _is_row(v) for v in value):
+            if rule.rank_by and all(isinstance(v, dict) and rule.rank_by in v for v in value):
+                value = sorted(value, key=lambda row: row[rule.rank_by] or 0, reverse=True)
+            dropped = len(value) - level.top_k
+            return [_summarise(v, rule, level) for v in value[:level.top_k]] + [f"… {dropped} more"]
+        return [_summarise(v, rule, level) for v in value]
+
+    return value
+
+
+# ====================================
+#  COMPACT RENDERING
+# ====================================
+def _cell(value: Any) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.4f}".rstrip("0").rstrip(".")
+    if isinstance(value, (dict, list)):
+        return "; ".join(_cell(v) for v in (value.values() if isinstance(value, dict) else value))
+    return str(value).replace("\n", " ")
+
+
+def _render(value: Any, indent: str = "") -> List[str]:
+    """
+    Lines of a JSON-like value: lists of rows become a header plus one
+    '|'-separated line per row, dicts become 'key: value' lines.
+    """
+    if isinstance(value, dict):
+        lines = []
+        for key, item in value.items():
+            if _is_scalar(item) or (isinstance(item, list) and all(_is_scalar(v) for v in item)):
+                lines.append(f"{indent}{key}: {_cell(item)}")
+            else:
+                lines.append(f"{indent}{key}:")
+                lines.extend(_render(item, indent + "  "))
+        return lines
+
+    if isinstance(value, list):
+        rows = [v for v in value if isinstance(v, dict)]
+        if rows and all(_is_row(v) for v in rows):
+            columns = list(dict.fromkeys(k for row in rows for k in row))
+            lines = [indent + " | ".join(columns)]
+            for item in value:
+                if isinstance(item, dict):
+                    lines.append(indent + " | ".join(_cell(item.get(c)) for c in columns))
+                else:
+                    lines.append(indent + _cell(item))
+            return lines
+        if all(_is_scalar(v) for v in value):
+            return [indent + ", ".join(_cell(v) for v in value)]
+        lines = []
+        for item in value:
+            item_lines = _render(item, indent + "  ")
+            if item_lines:
+                lines.append(f"{indent}- {item_lines[0].lstrip()}")
+                lines.extend(item_lines[1:])
+        return lines
+
+    return [indent + _cell(value)]
+
+
+def render_plan(plan: Any) -> str:
+    """One line per task: 'id = tool(key=value, ...) after dep, ...'."""
+    if not isinstance(plan, list):
+        return _cell(plan)
+    lines = []
+    for task in plan:
+        if not isinstance(task, dict):
+            continue
+        args = ", ".join(f"{a.get('key')}={_cell(a.get('value'))}" for a in task.get("args") or [] if isinstance(a, dict))
+        line = f"{task.get('id')} = {task.get('task')}({args})"
+        if task.get("dep"):
+            line += " after " + ", ".join(str(d) for d in task["dep"])
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def executed_plan(state: State) -> Any:
+    """
+    Plan as run_plan executed it: the tasks of every plan version (a
+    re-plan only holds the remaining tasks), later versions replacing the
+    tasks they redefine. The validated plan when nothing was re-planned.
+    """
+    versions = [v for v in state.get("plan_versions") or [] if isinstance(v, list)]
+    if not versions:
+        return state.get("plan", [])
+    tasks = {}
+    for version in versions:
+        for task in version:
+            if isinstance(task, dict):
+                tasks[task.get("id")] = task
+    return list(tasks.values())
+
+
+def render_outputs(outputs: Dict, tools: Dict[str, str], level: CompactionLevel) -> str:
+    # Plan order (outputs arrive in completion order), so equal runs render equal text
+    order = [task_id for task_id in tools if task_id in outputs]
+    order += sorted((task_id for task_id in outputs if task_id not in tools), key=str)
+    sections = []
+    for task_id in order:
+        output, tool = outputs[task_id], tools.get(task_id)
+        rule = TOOL_RULES.get(tool, ToolRule())
+        body = _render(_summarise(output, rule, level))
+        sections.append("\n".join([f"[{task_id}]" + (f" {tool}" if tool else "")] + body))
+    return "\n\n".join(sections)
+
+
+# ====================================
+#  COMPACTION STAGE
+# ====================================
+class OutputCompactor:
+    """
+    Workflow stage between run_plan and generate_response: renders the
+    plan and tool outputs in a compact tabular form and summarises the
+    outputs (top-k rows, binned histograms, shortened texts) until they
+    fit the token budget of the response prompt.
+    """
+
+    def __init__(self, max_tokens: int = COMPACTION_MAX_TOKENS, model_name: str = ""):
+        self.max_tokens = max_tokens
+        self.counter = TokenCounter(model_name)
+
+    def compact(self, plan: Any, outputs: Dict) -> Tuple[str, int, int]:
+        """Compact text of the outputs, the level used and its token count."""
+        tools = {
+            task.get("id"): task.get("task")
+            for task in (plan if isinstance(plan, list) else []) if isinstance(task, dict)
+        }
+        for index, level in enumerate(LEVELS):
+            text = render_outputs(outputs, tools, level)
+            tokens = self.counter.count(text)
+            if tokens <= self.max_tokens:
+                return text, index, tokens
+
+        # Still over budget with every rule applied: hard cut
+        suffix = "\n… (truncated)"
+        text = self.counter.truncate(text, max(self.max_tokens - self.counter.count(suffix), 0)) + suffix
+        return text, len(LEVELS), self.counter.count(text)
+
+    def compact_outputs(self, trace: TraceRecorder, state: State):
+        outputs = state.get("outputs", {})
+        step = trace.create_step(
+            run_id=state["run_id"],
+            name="Output Compaction",
+            input_data={"max_tokens": self.max_tokens, "tasks": list(outputs)}
+        )
+        try:
+            plan = executed_plan(state)
+            tool_outputs, level, tokens = self.compact(plan, outputs)
+            trace.update_step(
+                step_id=step.id,
+                status="Completed",
+                output_data={"level": level, "tokens": tokens}
+            )
+            return {"response_context": {"plan": render_plan(plan), "tool_outputs": tool_outputs}}
+        except Exception as e:
+            print(f"⚠️ Error compacting tool outputs: {e}")
+            trace.update_step(
+                step_id=step.id,
+                status="Error",
+                output_data={"error": str(e)}
+            )
+            raise RuntimeError(f"Output compaction failed: {e}") from e
+
+    async def acompact_outputs(self, trace: TraceRecorder, state: State):
+        """
+        Async node entry point; compaction is CPU-only and returns immediately.
+        """
+        return self.compact_outputs(trace, state)
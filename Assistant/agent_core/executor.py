@@ -1,51 +1,35 @@
 import json
 import copy
+import asyncio
 import datetime
-import numpy as np
-import pandas as pd
-from typing import Dict, Any
-from utils.tools import Tools
-from .planner import TaskPlanning
-from sqlalchemy.orm import Session
+from typing import Any, Callable, Dict, Optional
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from utils.tools import get_tools, TOOL_ARG_TYPES
+from utils.tool_cache import ToolResultCache, MISS
+from utils.serialization import dumps, loads, raw
+from utils.data_store import on_data_store_reload
+from .planner import plan_errors
+from .inference_rules import apply_inference_rules
+from .tool_retrieval import ToolRetriever
 from utils.utils import load_prompt
 from typing_extensions import TypedDict
 from langchain_core.prompts import ChatPromptTemplate
-from crud.step import create_step, update_step
-from crud.tool import create_tool_call, update_tool_call
+from langgraph.config import get_stream_writer
+from crud.trace import TraceRecorder
 
 
 class State(TypedDict):
+    run_id: str
     question: str
     plan: Dict
     validation: bool
     outputs: Dict
     response: str
+    failed: bool
 
 # ====================================
 #  UTILITY HELPERS
 # ====================================
-def make_serializable(value):
-    """Recursively convert pandas/numpy/datetime objects to JSON-safe formats."""
-    if isinstance(value, pd.DataFrame):
-        return value.to_dict(orient="records")
-    elif isinstance(value, (list, tuple, set)):
-        return [make_serializable(v) for v in value]
-    elif isinstance(value, dict):
-        return {k: make_serializable(v) for k, v in value.items()}
-    elif isinstance(value, (pd.Timestamp, datetime.datetime, datetime.date)):
-        return value.isoformat()
-    elif isinstance(value, (np.integer,)):
-        return int(value)
-    elif isinstance(value, (np.floating,)):
-        return float(value)
-    elif isinstance(value, (np.ndarray,)):
-        return value.tolist()
-    elif value is None or isinstance(value, (str, int, float, bool)):
-        return value
-    else:
-        # Fallback: convert unknown objects to string
-        return str(value)
-
 def extract_property(obj, prop_path):
     """Safely extract nested property (supports dot notation and list indices)."""
     try:
@@ -79,54 +63,64 @@ def cast_arg(value, expected_type):
     except Exception:
         raise ValueError(f"Failed to cast value '{value}' to {expected_type.__name__}")
 
+def stream_writer():
+    """LangGraph custom-stream writer, or a no-op when called outside a graph run."""
+    try:
+        return get_stream_writer()
+    except RuntimeError:
+        return lambda event: None
+
+MAX_PARALLEL_TOOLS = 4
+
 class TaskExecutor:
-    def __init__(self, base_llm, structure_llm):
+    def __init__(self, base_llm, structure_llm, max_workers: int = MAX_PARALLEL_TOOLS,
+                 retriever: Optional[Callable[[], ToolRetriever]] = None):
         self.base_llm = base_llm
         self.plan_structure_llm = structure_llm
-        self.tools = Tools()
-        self.analyze_prompt_plan = self._build_analyze_prompts() 
+        # Bounded pool shared by every run: independent tools execute concurrently
+        self.tool_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ardi-tool")
+        # Results of (tool, canonical args) on the current data snapshot
+        self.tool_cache = ToolResultCache()
+        on_data_store_reload(self.tool_cache.clear)
+        self.plan_update_prompt = load_prompt("2.plan_update")
+        # Tool retriever of the planner (TaskPlanning.retriever), so the
+        # analyzer follows the same catalogue when prompt files change
+        if retriever is None:
+            own_retriever = ToolRetriever()
+            retriever = lambda: own_retriever
+        self.retriever = retriever
 
     # ====================================
     #  MAIN EXECUTION LOGIC
     # ====================================
-    def run_plan(self, db: Session, state: State):
+    def run_plan(self, trace: TraceRecorder, state: State):
         """
-        Executes the analytical plan step by step, resolving dependencies,
-        property extraction, type casting, and invoking the LLM-based analyzer
-        when 'analyze_answer' is set to True.
+        Executes the analytical plan as a dependency graph: independent tools
+        run concurrently on the tool pool, while dependencies, property
+        extraction, type casting and the LLM-based analyzer (for tasks with
+        'analyze_answer' set to True) are handled as producers finish.
         """
-        step = create_step(
-            db=db,
+        step = trace.create_step(
             run_id=state["run_id"],
             name="Plan Execution",
             input_data=state["plan"]
         )
+        # future -> (task, tool_call, cache_key) of the tasks in flight
+        running = {}
 
         try:
+            tools = get_tools()
+            # Progress events for streaming clients (no-op unless the graph
+            # is streamed with the "custom" mode)
+            emit = stream_writer()
             outputs = {}
+            # JSON bytes of each output, serialized once and reused for the
+            # trace columns and the response prompt
+            outputs_json = {}
+            timings = {}
             plan_versions = [copy.deepcopy(state["plan"])]
             remaining = copy.deepcopy(state["plan"])
 
-            TOOL_ARG_TYPES = {
-                "get_segment_description": {"segment_id": int},
-                "get_segment_engagement_stats": {"segment_id": int},
-                "get_topic_transitions": {"segment_id": int, "top_n": int},
-                "get_next_topic_prediction": {"segment_id": int, "current_topic": str, "top_n": int},
-                "get_segment_regions": {"segment_id": int, "top_n": int},
-                "get_segment_time_activity": {"segment_id": int},
-                "get_segment_activity_by_day_part": {"segment_id": int},
-                "get_segment_articles_by_time": {"segment_id": int, "start_hour": int, "end_hour": int},
-                "get_segment_engage_docs": {"segment_id": int},
-                "get_segment_not_engage_docs": {"segment_id": int},
-                "get_segment_high_rep_docs": {"segment_id": int},
-                "get_articles_info": {"articles_ids": list},
-                "get_top_recent_articles": {"articles_ids": list, "top": int},
-                "get_unique_clusters": {"articles_ids": list},
-                "get_news_topics_info": {"topics_id": list},
-                "get_news_topics_high_docs": {"topics_id": list},
-                "get_news_topics_low_docs": {"topics_id": list},
-            }
-
             def resolve_args(task):
                 """Resolve dependency references, extract properties, and cast types."""
                 args_list = task.get("args", [])
@@ -141,8 +135,7 @@ class TaskExecutor:
                     if isinstance(v, str) and v.startswith("DEP_"):
                         dep_task_id = v[4:]
                         if dep_task_id not in outputs:
-                            update_step(
-                                db=db,
+                            trace.update_step(
                                 step_id=step.id,
                                 status="Error",
                                 output_data={"outputs": f"Dependency '{dep_task_id}' not yet available for argument '{k}'."}
@@ -162,113 +155,186 @@ class TaskExecutor:
 
                 return resolved
 
+            def task_deps(task):
+                """Explicit 'dep' ids plus any task referenced through a DEP_ argument."""
+                deps = set(task.get("dep", []) or [])
+                for arg in task.get("args", []) or []:
+                    v = arg.get("value")
+                    if isinstance(v, str) and v.startswith("DEP_"):
+                        deps.add(v[4:])
+                return deps
+
             # =========================================
-            #  MAIN EXECUTION LOOP
+            #  MAIN EXECUTION LOOP (DAG scheduler)
             # =========================================
-            while remaining:
-                progress = False
-
-                for task in remaining[:]:
-                    if all(dep in outputs for dep in task.get("dep", [])):
+            # Every task whose dependencies are satisfied is submitted to the
+            # bounded tool pool; DB writes stay on this thread. A task flagged
+            # with 'analyze_answer' acts as a barrier: no new task is scheduled
+            # until the in-flight ones drain and the plan has been re-analyzed.
+            pending_analysis = None
+
+            while remaining or running:
+                if pending_analysis is None:
+                    for task in remaining[:]:
+                        if not task_deps(task).issubset(outputs):
+                            continue
                         args = resolve_args(task)
-                        func = self.tools.TASK_FUNCS.get(task["task"])
+                        func = tools.TASK_FUNCS.get(task["task"])
                         if not func:
-                            update_step(
-                                db=db,
+                            trace.update_step(
                                 step_id=step.id,
                                 status="Error",
                                 output_data={"outputs": f"Unknown tool: {task['task']}"}
                             )
                             raise ValueError(f"Unknown tool: {task['task']}")
 
-                        # Execute the tool
-                        tool_call = create_tool_call(
-                            db=db,
+                        cache_key = self.tool_cache.key(task["task"], func, args, tools.store.version)
+                        cached = self.tool_cache.get(cache_key)
+                        tool_call = trace.create_tool_call(
                             step_id=step.id,
                             tool_name=task["task"],
-                            input_data=args
+                            input_data=args,
+                            meta={"cache_hit": cached is not MISS}
                         )
-
-                        try:
-                            result = func(**args)
-                            result_serializable = make_serializable(result)
-                            update_tool_call(
-                                db=db,
-                                tool_call_id=tool_call.id,
-                                status="success",
-                                output_data={"output": make_serializable(result)}
-                            )
-                        except Exception as e:
-                            update_tool_call(
-                                db=db,
-                                tool_call_id=tool_call.id,
-                                status="error",
-                                output_data={"error": str(e)}
-                            )
-                            raise RuntimeError(f"Tool '{task['task']}' execution failed: {e}") from e
-
-                        outputs[task["id"]] = result_serializable
+                        if cached is MISS:
+                            future = self.tool_pool.submit(self._timed_call, func, args)
+                        else:
+                            # Cached JSON bytes: complete without touching the pool
+                            now = datetime.datetime.utcnow()
+                            future = Future()
+                            future.set_result((cached, now, now))
+                            cache_key = None
+                        running[future] = (task, tool_call, cache_key)
                         remaining.remove(task)
-                        progress = True
-                        print(f"✅ Executed: {task['task']} | ID: {task['id']}")
-
-                        # --------------------------------
-                        #  Handle analyze_answer flag
-                        # --------------------------------
-                        if task.get("analyze_answer", False) and len(plan_versions) < 3:
-                            target_prop = task.get("analyze_target_property")
-                            if target_prop:
-                                try:
-                                    target_value = extract_property(result_serializable, target_prop)
-                                except Exception as e:
-                                    print(f"⚠️ Could not extract property '{target_prop}': {e}")
-                                    target_value = result_serializable
-                            else:
-                                target_value = result_serializable
-
-                            print(f"🧠 Triggering LLM analysis for '{task['id']}'...")
-
-                            new_plan = self._analyze_and_update_plan(
-                                question=state["question"],
-                                plan=remaining,
-                                latest_output=target_value,
-                                previous_outputs=outputs
-                            )
-
-                            validated = TaskPlanning.validate_plan(db, state)
-                            if not validated.get("validation", False):
-                                print("⚠️ New plan failed validation, skipping update.")
-                                continue
-
-                            plan_versions.append(copy.deepcopy(new_plan))
-                            print(f"🔄 Plan updated → version {len(plan_versions)}")
-                            remaining = copy.deepcopy(new_plan)
-                            break  # restart loop with updated plan
 
-                if not progress:
-                    update_step(
-                        db=db,
+                if not running:
+                    trace.update_step(
                         step_id=step.id,
                         status="Error",
                         output_data={"outputs": f"Circular dependency or unresolved dependencies detected."}
                     )
                     raise RuntimeError("Circular dependency or unresolved dependencies detected.")
 
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task, tool_call, cache_key = running.pop(future)
+                    try:
+                        result, started_at, ended_at = future.result()
+                        if cache_key is None:
+                            result_json = result
+                        else:
+                            result_json = dumps(result)
+                            self.tool_cache.put(cache_key, result_json)
+                        result_serializable = loads(result_json)
+                        trace.update_tool_call(
+                            tool_call_id=tool_call.id,
+                            status="success",
+                            output_data={"output": raw(result_json)}
+                        )
+                    except Exception as e:
+                        trace.update_tool_call(
+                            tool_call_id=tool_call.id,
+                            status="error",
+                            output_data={"error": str(e)}
+                        )
+                        emit({"event": "tool", "id": task["id"], "tool": task["task"], "status": "error", "error": str(e)})
+                        raise RuntimeError(f"Tool '{task['task']}' execution failed: {e}") from e
+
+                    outputs[task["id"]] = result_serializable
+                    outputs_json[task["id"]] = result_json
+                    timings[task["id"]] = {
+                        "tool": task["task"],
+                        "started_at": started_at.isoformat(),
+                        "ended_at": ended_at.isoformat(),
+                        "duration_ms": round((ended_at - started_at).total_seconds() * 1000, 3),
+                        "cache_hit": cache_key is None
+                    }
+                    print(f"✅ Executed: {task['task']} | ID: {task['id']}")
+                    emit({
+                        "event": "tool",
+                        "id": task["id"],
+                        "tool": task["task"],
+                        "status": "success",
+                        "duration_ms": timings[task["id"]]["duration_ms"],
+                        "output": result_serializable
+                    })
+
+                    if (
+                        task.get("analyze_answer", False)
+                        and len(plan_versions) < 3
+                        and pending_analysis is None
+                    ):
+                        pending_analysis = (task, result_serializable)
+
+                # --------------------------------
+                #  Handle analyze_answer barrier
+                # --------------------------------
+                if pending_analysis is not None and not running:
+                    task, result_serializable = pending_analysis
+                    pending_analysis = None
+
+                    # Deterministic argument inference first; the LLM only when no rule applies
+                    new_plan = apply_inference_rules(task, result_serializable, remaining)
+                    if new_plan is not None:
+                        source = "rule"
+                        print(f"📐 Arguments inferred by rule from '{task['id']}' (analyzer LLM skipped).")
+                    else:
+                        source = "llm"
+                        target_prop = task.get("analyze_target_property")
+                        if target_prop:
+                            try:
+                                target_value = extract_property(result_serializable, target_prop)
+                            except Exception as e:
+                                print(f"⚠️ Could not extract property '{target_prop}': {e}")
+                                target_value = result_serializable
+                        else:
+                            target_value = result_serializable
+
+                        print(f"🧠 Triggering LLM analysis for '{task['id']}'...")
+
+                        new_plan = self._analyze_and_update_plan(
+                            question=state["question"],
+                            plan=remaining,
+                            latest_output=target_value,
+                            previous_outputs=outputs
+                        )
+
+                    # The new plan may reference tasks that already produced an output
+                    errors = plan_errors(new_plan, tools.TASK_FUNCS, known_ids=outputs)
+                    if errors:
+                        print(f"⚠️ New plan failed validation, skipping update: {errors}")
+                        continue
+
+                    plan_versions.append(copy.deepcopy(new_plan))
+                    print(f"🔄 Plan updated → version {len(plan_versions)} ({source})")
+                    emit({"event": "plan_update", "version": len(plan_versions), "plan": new_plan, "source": source})
+                    # Never re-run a task that already produced an output
+                    remaining = [t for t in copy.deepcopy(new_plan) if t.get("id") not in outputs]
+
             print(f"🏁 All tasks completed. Total plan versions: {len(plan_versions)}")
-            print("output....")
-            print(outputs)
-            update_step(
-                db=db,
+            trace.update_step(
                 step_id=step.id,
                 status="Completed",
-                output_data={"outputs": make_serializable(outputs), "plan_versions": make_serializable(plan_versions)}
+                output_data={
+                    "outputs": {task_id: raw(data) for task_id, data in outputs_json.items()},
+                    "output_bytes": sum(len(data) for data in outputs_json.values()),
+                    "plan_versions": plan_versions,
+                    "timings": timings,
+                    "tool_cache": self.tool_cache.stats()
+                }
             )
             return {"outputs": outputs, "plan_versions": plan_versions}
 
         except Exception as e:
             print(f"❌ Fatal error in run_plan: {e}")
-            update_step(
-                db=db,
+            # Tasks still in flight are abandoned: close their tool calls too
+            for future in running:
+                future.cancel()
+            trace.cancel_tool_calls(
+                [tool_call.id for _, tool_call, _ in running.values()],
+                reason=f"Cancelled: plan execution failed ({e})"
+            )
+            trace.update_step(
                 step_id=step.id,
                 status="Error",
                 output_data={"error": str(e)}
@@ -279,18 +345,32 @@ class TaskExecutor:
 
 
 
+    async def arun_plan(self, trace: TraceRecorder, state: State):
+        """
+        Async entry point: the plan (CPU-bound tools plus the scheduler's
+        blocking waits) runs on a worker thread so the event loop stays free.
+        """
+        return await asyncio.to_thread(self.run_plan, trace, state)
+
+
+    @staticmethod
+    def _timed_call(func, args: dict):
+        """Runs a tool on a pool thread and reports its own start/end timestamps."""
+        started_at = datetime.datetime.utcnow()
+        result = func(**args)
+        return result, started_at, datetime.datetime.utcnow()
+
+
     # Plan Analyzer 
-    def _build_analyze_prompts(self) -> dict:
+    def _analyze_prompt(self, question: str, plan: list) -> ChatPromptTemplate:
         """
-        Builds the LLM prompt templates for generating responses,
+        Analyzer prompt with the catalogue reduced to the tools relevant to
+        the question and every tool of the remaining plan (the full
+        catalogue when nothing matches).
         """
-        
-        business_context = load_prompt("0.business_context")
-        data_sources = load_prompt("1.data_sources_context")
-        tools_planning = load_prompt("2.tools_planning")
-        plan_update_prompt = business_context + data_sources + tools_planning+ load_prompt("2.plan_update")
+        context, _ = self.retriever().context(question, include=[t.get("task") for t in plan])
         return ChatPromptTemplate.from_messages([
-                ("system", plan_update_prompt)
+                ("system", context + self.plan_update_prompt)
             ])
     
 
@@ -298,32 +378,23 @@ class TaskExecutor:
         """
         Invokes the Analyzer LLM to interpret the latest tool output,
         reason about what to do next, and update the remaining plan accordingly.
+        A single structured-output call returns the updated plan.
         """
 
         latest_tool_output = json.dumps(latest_output, indent=2, ensure_ascii=False)
         full_tool_output = json.dumps(list(previous_outputs.keys()), indent=2)
         remaining_plan = json.dumps(plan, indent=2, ensure_ascii=False)        
-        # Call the Analyzer LLM
         try:
-            analyzer_prompt = self.analyze_prompt_plan.invoke({"question": question, 
+            analyzer_prompt = self._analyze_prompt(question, plan).invoke({"question": question, 
                                                             "latest_tool_output": latest_tool_output, 
                                                             "full_tool_output": full_tool_output,
                                                             "remaining_plan": remaining_plan })
-            response = self.base_llm.invoke(analyzer_prompt)
-            text = response.content if hasattr(response, "content") else str(response)
-        except Exception as e:
-            print(f"⚠️ LLM invocation failed: {e}")
-            return plan  # Fallback: continue with current plan
-
-        #  Validate JSON output
-        try:
-            updated_plan_structured = self.plan_structure_llm.invoke(text)
+            updated_plan_structured = self.plan_structure_llm.invoke(analyzer_prompt)
             updated_plan = updated_plan_structured["plan"]
             if not isinstance(updated_plan, list):
                 raise ValueError("Analyzer must return a list of tasks.")
         except Exception as e:
-            print(f"⚠️ Invalid plan format returned by analyzer: {e}")
-            print(f"Raw LLM output:\n{text}")
-            return plan
+            print(f"⚠️ Analyzer LLM failed or returned an invalid plan: {e}")
+            return plan  # Fallback: continue with current plan
         print("🧩 Analyzer LLM produced an updated plan successfully.")
         return updated_plan
\ No newline at end of file
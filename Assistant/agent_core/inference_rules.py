@@ -0,0 +1,95 @@
+import copy
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Hours [start, end) of each day part, as the articles_by_time window expects
+DAY_PART_HOURS = {
+    "night": (0, 6),
+    "morning": (6, 12),
+    "afternoon": (12, 18),
+    "evening": (18, 24),
+}
+
+
+# ====================================
+#  VALUE TRANSFORMS
+# ====================================
+def _hour(text: str) -> int:
+    return int(str(text).strip().split(":")[0])
+
+
+def hour_range_start(value: Any) -> int:
+    """'12:00-12:59' → 12"""
+    return _hour(str(value).split("-")[0])
+
+
+def hour_range_end(value: Any) -> int:
+    """'12:00-12:59' → 13 (exclusive end of the window)"""
+    return _hour(str(value).split("-")[-1]) + 1
+
+
+def day_part_start(value: Any) -> int:
+    return DAY_PART_HOURS[str(value).strip().lower()][0]
+
+
+def day_part_end(value: Any) -> int:
+    return DAY_PART_HOURS[str(value).strip().lower()][1]
+
+
+# ====================================
+#  RULES
+# ====================================
+# (producer tool, consumer tool) -> {consumer argument: (producer output property, transform)}
+INFERENCE_RULES: Dict[Tuple[str, str], Dict[str, Tuple[str, Callable[[Any], Any]]]] = {
+    ("get_segment_time_activity", "get_segment_articles_by_time"): {
+        "start_hour": ("peak_activity", hour_range_start),
+        "end_hour": ("peak_activity", hour_range_end),
+    },
+    ("get_segment_activity_by_day_part", "get_segment_articles_by_time"): {
+        "start_hour": ("peak_day_part", day_part_start),
+        "end_hour": ("peak_day_part", day_part_end),
+    },
+}
+
+
+def _property(value: Any, path: str) -> Any:
+    """Nested property by dot path (list indices allowed); KeyError when missing."""
+    for part in path.split("."):
+        if isinstance(value, list) and part.isdigit():
+            value = value[int(part)]
+        else:
+            value = value[part]
+    return value
+
+
+def _depends_on(task: Dict, producer_id: str) -> bool:
+    if producer_id in (task.get("dep") or []):
+        return True
+    return any(
+        isinstance(arg, dict) and arg.get("value") == f"DEP_{producer_id}"
+        for arg in task.get("args") or []
+    )
+
+
+def apply_inference_rules(producer: Dict, output: Any, plan: List[Dict]) -> Optional[List[Dict]]:
+    """
+    Remaining plan with the arguments INFERENCE_RULES derive from the
+    producer's output written into the tasks that depend on it (as literal
+    values, replacing DEP_ references). None unless a rule resolves every
+    dependent task, in which case the LLM analyzer updates the plan.
+    """
+    updated = copy.deepcopy(plan)
+    dependents = [t for t in updated if isinstance(t, dict) and _depends_on(t, producer.get("id"))]
+    if not dependents:
+        return None
+    for task in dependents:
+        rule = INFERENCE_RULES.get((producer.get("task"), task.get("task")))
+        if rule is None:
+            return None
+        try:
+            values = {arg: str(transform(_property(output, prop))) for arg, (prop, transform) in rule.items()}
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            print(f"⚠️ Inference rule {producer.get('task')} → {task.get('task')} not applicable: {e}")
+            return None
+        args = [a for a in task.get("args") or [] if not (isinstance(a, dict) and a.get("key") in values)]
+        task["args"] = args + [{"key": key, "value": value} for key, value in values.items()]
+    return updated
@@ -0,0 +1,151 @@
+import re
+import json
+import threading
+import unicodedata
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from utils.data_store import get_data_store
+from utils.tools import TOOL_ARG_TYPES
+from .plan_cache import normalize_question, _QUOTED
+
+# Whole questions made of these words are small talk: answered without tools
+GREETING_WORDS = {
+    "hi", "hello", "hey", "hallo", "servus", "moin", "good", "morning", "afternoon", "evening",
+    "guten", "tag", "morgen", "abend", "thanks", "thank", "you", "danke", "bye", "goodbye",
+    "ciao", "tschüss", "there", "ardi", "ok", "okay", "great", "cheers", "much", "so", "a", "lot"
+}
+GREETING_OPENERS = {"hi", "hello", "hey", "hallo", "servus", "moin", "good", "guten", "thanks", "thank", "danke", "bye", "goodbye", "ciao", "tschüss", "cheers"}
+MAX_GREETING_WORDS = 6
+
+# Wording that asks for more than one tool or for arguments the router
+# does not fill (time windows, top-n, topic names): left to the LLM
+COMPOSITE = re.compile(
+    r"\b(then|compare|comparison|versus|vs|metadata|teasers?|clusters?|during|recent|"
+    r"predict\w*|next|after|before|peak hours?|which topics|what topics|topics? (?:they|it) represent|"
+    r"all segments|every segment|segments have|top \d+|first \w+)\b"
+)
+
+# Matched on the normalised question (lower case, punctuation removed)
+_SEGMENT_ID = re.compile(r"\bsegments? (?:(?:nr|no|number|id) )?(\d+(?: (?:and )?\d+)*)\b")
+_TOPIC_ID = re.compile(r"\btopics? (?:(?:nr|no|number|id) )?(\d+)\b")
+
+
+class Intent(NamedTuple):
+    tool: str
+    pattern: re.Pattern
+    entity: str                   # "segment" or "topic"
+    batch_tool: Optional[str] = None
+    generic: bool = False         # only used when no specific intent matches
+
+
+INTENTS: Tuple[Intent, ...] = (
+    Intent("get_segment_engagement_stats", re.compile(r"\bengagement (?:stat\w*|metrics?|numbers|rate|levels?)\b|\bscroll depth\b"),
+           "segment", "get_segment_engagement_stats_batch"),
+    Intent("get_topic_transitions", re.compile(r"\btransition\w*\b"), "segment", "get_topic_transitions_batch"),
+    Intent("get_segment_regions", re.compile(r"\bregion\w*\b"), "segment", "get_segment_regions_batch"),
+    Intent("get_segment_time_activity", re.compile(r"\b(?:when does|what time|which hours?|hourly|by hour|time of day)\b"),
+           "segment", "get_segment_time_activity_batch"),
+    Intent("get_segment_activity_by_day_part", re.compile(r"\bday ?parts?\b"),
+           "segment", "get_segment_activity_by_day_part_batch"),
+    Intent("get_segment_high_rep_docs", re.compile(r"\b(?:high|most) ?representative (?:articles|docs|documents)\b"), "segment"),
+    Intent("get_segment_engage_docs", re.compile(r"\bmost ?engaged (?:articles|docs|documents)\b"), "segment"),
+    Intent("get_segment_not_engage_docs", re.compile(r"\b(?:did not|didn t|do not|don t|not) engage\w*\b"), "segment"),
+    Intent("get_news_topics_high_docs", re.compile(r"\b(?:high|most) ?representative (?:articles|docs|documents)\b"), "topic"),
+    Intent("get_news_topics_low_docs", re.compile(r"\blow (?:relevance )?(?:articles|docs|documents)\b"), "topic"),
+    Intent("get_segment_description", re.compile(r"\b(?:describe|description|profile|overview)\b"),
+           "segment", generic=True),
+)
+
+
+class Route(NamedTuple):
+    plan: List[Dict]              # empty: answered without tools
+    rule: str
+
+
+# ==========================================================
+#  INTENT ROUTER
+# ==========================================================
+class IntentRouter:
+    """
+    Deterministic fast path in front of the planning LLM. Greetings get
+    an empty plan (direct response). Template questions about one tool
+    and explicit segment / topic ids (or a quoted segment title) get a
+    one-task plan built from INTENTS. Anything else, or anything matching
+    more than one intent, returns None and goes to the LLM.
+    """
+
+    def __init__(self):
+        self._titles: Dict[str, int] = {}
+        self._titles_version = None
+        self._lock = threading.Lock()
+
+    def route(self, question: str) -> Optional[Route]:
+        text = normalize_question(question)
+        words = text.split()
+        if not words:
+            return None
+        if self._is_greeting(words):
+            return Route(plan=[], rule="greeting")
+        if COMPOSITE.search(text):
+            return None
+
+        matched = [i for i in INTENTS if not i.generic and i.pattern.search(text)]
+        if not matched:
+            matched = [i for i in INTENTS if i.generic and i.pattern.search(text)]
+
+        segments, topics = self._entities(question, text)
+        candidates = [i for i in matched if (segments if i.entity == "segment" else topics)]
+        if len(candidates) != 1 or (segments and topics):
+            return None
+        intent = candidates[0]
+        ids = segments if intent.entity == "segment" else topics
+
+        # Every number in the question must be one of the ids (no top-n, hours, ...)
+        if not {int(n) for n in re.findall(r"\d+", text)} <= set(ids):
+            return None
+
+        if len(ids) == 1:
+            arg = "segment_id" if intent.entity == "segment" else "topics_id"
+            value = str(ids[0]) if TOOL_ARG_TYPES[intent.tool][arg] is int else json.dumps(ids)
+            return Route(plan=[self._task(intent.tool, arg, value)], rule=intent.tool)
+        if intent.batch_tool:
+            return Route(plan=[self._task(intent.batch_tool, "segment_ids", json.dumps(ids))], rule=intent.batch_tool)
+        return None
+
+    # ------------------------------------------------------
+    #  Features
+    # ------------------------------------------------------
+    @staticmethod
+    def _is_greeting(words: List[str]) -> bool:
+        return (
+            len(words) <= MAX_GREETING_WORDS
+            and words[0] in GREETING_OPENERS
+            and all(w in GREETING_WORDS for w in words)
+        )
+
+    def _entities(self, question: str, text: str) -> Tuple[List[int], List[int]]:
+        segments = []
+        for group in _SEGMENT_ID.findall(text):
+            segments += [int(n) for n in re.findall(r"\d+", group)]
+        for quoted in _QUOTED.findall(unicodedata.normalize("NFKC", question)):
+            segment_id = self._segment_titles().get(normalize_question(quoted))
+            if segment_id is not None:
+                segments.append(segment_id)
+        topics = [int(n) for n in _TOPIC_ID.findall(text)]
+        return list(dict.fromkeys(segments)), list(dict.fromkeys(topics))
+
+    def _segment_titles(self) -> Dict[str, int]:
+        """Normalised segment title → id, rebuilt when the data store is reloaded."""
+        try:
+            store = get_data_store()
+        except Exception:
+            return {}
+        with self._lock:
+            if self._titles_version != store.version:
+                titles = store.user_segments["title"]
+                self._titles = {normalize_question(str(t)): int(i) for i, t in titles.items()}
+                self._titles_version = store.version
+            return self._titles
+
+    @staticmethod
+    def _task(tool: str, key: str, value: str) -> Dict:
+        return {"task": tool, "id": f"{tool.replace('get_', '', 1)}_1", "dep": [], "args": [{"key": key, "value": value}]}
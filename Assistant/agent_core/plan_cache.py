@@ -0,0 +1,201 @@
+import re
+import copy
+import time
+import hashlib
+import inspect
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+PLAN_CACHE_SIZE = 256
+PLAN_CACHE_TTL = 6 * 60 * 60         # seconds
+SIMILARITY_THRESHOLD = 0.85
+
+# Words that do not change which tools a question needs
+STOPWORDS = {
+    "a", "an", "the", "of", "for", "in", "on", "at", "to", "by", "with", "and", "or",
+    "is", "are", "was", "were", "be", "do", "does", "what", "which", "who", "how",
+    "me", "my", "our", "us", "please", "can", "could", "you", "show", "give", "tell",
+    "get", "list", "about", "i", "we", "there", "this", "that", "these", "those"
+}
+
+# Negations flip the tools a question needs (engage / not engage docs):
+# any of them adds the "not" anchor ("didn't" is split into "didn" "t")
+NEGATIONS = {
+    "not", "no", "never", "none", "nor", "without", "cannot", "didn", "don", "doesn",
+    "isn", "aren", "wasn", "weren", "haven", "hasn", "nicht", "kein", "keine", "ohne"
+}
+
+# Ordering / superlative and time qualifiers change the tool or its
+# arguments (most vs least popular, morning vs evening): anchored as-is
+QUALIFIERS = {
+    "most", "least", "top", "bottom", "highest", "lowest", "best", "worst", "first", "last",
+    "more", "less", "fewest", "largest", "smallest", "biggest", "latest", "oldest", "newest", "recent",
+    "morning", "afternoon", "evening", "night", "midnight", "noon", "hour", "hourly", "day", "daily",
+    "week", "weekly", "weekend", "weekday", "month", "monthly", "today", "yesterday", "peak"
+}
+
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)?")
+_QUOTED = re.compile(r"[\"'“”‘’«»]([^\"'“”‘’«»]+)[\"'“”‘’«»]")
+_WORD = re.compile(r"[^\W_]+")
+
+
+# ==========================================================
+#  QUESTION NORMALISATION
+# ==========================================================
+def normalize_question(question: str) -> str:
+    """Case, accent-form, punctuation and whitespace insensitive form of a question."""
+    text = unicodedata.normalize("NFKC", question).lower()
+    return " ".join(_WORD.findall(text))
+
+
+def question_anchors(question: str) -> Tuple[str, ...]:
+    """
+    Values a plan is built around and that must match exactly for two
+    questions to share a plan: numbers (segment ids, hours, top-n),
+    quoted strings, capitalised names (e.g. topic names), negation and
+    ordering / time qualifiers.
+    """
+    text = unicodedata.normalize("NFKC", question)
+    anchors = set(_NUMBER.findall(text))
+    anchors.update(q.strip().lower() for q in _QUOTED.findall(text))
+    words = _WORD.findall(text)
+    anchors.update(w.lower() for w in words[1:] if w[0].isupper())
+    lowered = [w.lower() for w in words]
+    if any(w in NEGATIONS for w in lowered):
+        anchors.add("not")
+    for w in lowered:
+        w = w[:-1] if w.endswith("s") and w[:-1] in QUALIFIERS else w
+        if w in QUALIFIERS:
+            anchors.add(w)
+    return tuple(sorted(anchors))
+
+
+def question_terms(question: str) -> frozenset:
+    """Content words of a question, used for the lexical similarity lookup."""
+    return frozenset(
+        w[:-1] if len(w) > 3 and w.endswith("s") else w
+        for w in normalize_question(question).split()
+        if w not in STOPWORDS
+    )
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+# ==========================================================
+#  INVALIDATION FINGERPRINT
+# ==========================================================
+def plan_fingerprint(prompt_text: str, task_funcs: Dict) -> str:
+    """
+    Identifies the planning context: the planning prompt and the tool set
+    (names and signatures). Cached plans are only reused under the same one.
+    """
+    h = hashlib.sha256(prompt_text.encode("utf-8"))
+    for name in sorted(task_funcs):
+        h.update(f"\n{name}{inspect.signature(task_funcs[name])}".encode("utf-8"))
+    return h.hexdigest()
+
+
+# ==========================================================
+#  PLAN CACHE
+# ==========================================================
+class PlanCache:
+    """
+    In-memory cache of validated plans in front of the planning LLM.
+
+    A lookup first tries the exact normalised question; otherwise it takes
+    the most similar cached question (Jaccard over content words) among
+    those with exactly the same anchors, if it reaches the threshold.
+    Entries expire after `ttl` seconds and the least recently used one is
+    evicted once `max_entries` is reached. The whole cache is dropped when
+    the fingerprint (prompt files + tool set) changes.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = PLAN_CACHE_SIZE,
+        ttl: float = PLAN_CACHE_TTL,
+        threshold: float = SIMILARITY_THRESHOLD
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.fingerprint: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def set_fingerprint(self, fingerprint: str) -> None:
+        """Drops every entry if the planning context changed."""
+        with self._lock:
+            if fingerprint != self.fingerprint:
+                if self._entries:
+                    print("♻️ Planning prompt or tool set changed, clearing plan cache.")
+                self._entries.clear()
+                self.fingerprint = fingerprint
+
+    def get(self, question: str) -> Optional[Tuple[List[dict], dict]]:
+        """
+        Returns (plan, match info) for a cached equivalent question, or None.
+        """
+        key = normalize_question(question)
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+
+            entry = self._entries.get(key)
+            score = 1.0
+            if entry is None:
+                anchors = question_anchors(question)
+                terms = question_terms(question)
+                score = 0.0
+                for candidate in self._entries.values():
+                    if candidate["anchors"] != anchors:
+                        continue
+                    similarity = jaccard(terms, candidate["terms"])
+                    if similarity > score:
+                        entry, score = candidate, similarity
+                if score < self.threshold:
+                    entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._entries.move_to_end(entry["key"])
+            match = {"cached_question": entry["question"], "similarity": round(score, 3)}
+            return copy.deepcopy(entry["plan"]), match
+
+    def put(self, question: str, plan: List[dict]) -> None:
+        key = normalize_question(question)
+        with self._lock:
+            self._entries[key] = {
+                "key": key,
+                "question": question,
+                "anchors": question_anchors(question),
+                "terms": question_terms(question),
+                "plan": copy.deepcopy(plan),
+                "created_at": time.monotonic()
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def _expire(self, now: float) -> None:
+        expired = [k for k, e in self._entries.items() if now - e["created_at"] > self.ttl]
+        for k in expired:
+            del self._entries[k]
@@ -1,21 +1,36 @@
-import datetime
-import numpy as np
-import pandas as pd
+import os
+import json
+import inspect
+import threading
+from collections import deque
 from pydantic import Field
-from utils.tools import Tools
-from sqlalchemy.orm import Session
-from utils.utils import load_prompt
-from typing import List, Optional, Dict
+from utils.tools import get_tools, TOOL_ARG_TYPES
+from utils.utils import load_prompt, prompt_path
+from utils.serialization import to_jsonable
+from typing import Iterable, List, NamedTuple, Optional, Dict
 from typing_extensions import TypedDict
 from langchain_core.prompts import ChatPromptTemplate
-from crud.step import create_step, update_step
+from crud.trace import TraceRecorder
+from .plan_cache import PlanCache, plan_fingerprint
+from .tool_retrieval import ToolRetriever
+from .intent_router import IntentRouter
+from .compactor import render_plan
+
+# Prompt files the planning prompt is assembled from
+PLANNING_PROMPTS = ["0.business_context", "1.data_sources_context", "2.tools_planning"]
+REPAIR_PROMPT = "2.plan_repair"
+MAX_PLAN_REPAIRS = 2          # LLM repairs of an invalid plan before the run fails
 
 class State(TypedDict):
+    run_id: str
     question: str
     plan: Dict
     validation: bool
+    errors: List[Dict]
+    repair_attempts: int
     outputs: Dict
     response: str
+    failed: bool
 
 # FUNCTION ARGUMENTS 
 class ArgPair(TypedDict):
@@ -33,32 +48,17 @@ class TaskResponseFormatter(TypedDict):
 class Plan(TypedDict):
     plan: List[TaskResponseFormatter] = Field(description="List of tasks to be execute")
 
-def make_serializable(value):
-    """Recursively convert pandas/numpy/datetime objects to JSON-safe formats."""
-    if isinstance(value, pd.DataFrame):
-        return value.to_dict(orient="records")
-    elif isinstance(value, (list, tuple, set)):
-        return [make_serializable(v) for v in value]
-    elif isinstance(value, dict):
-        return {k: make_serializable(v) for k, v in value.items()}
-    elif isinstance(value, (pd.Timestamp, datetime.datetime, datetime.date)):
-        return value.isoformat()
-    elif isinstance(value, (np.integer,)):
-        return int(value)
-    elif isinstance(value, (np.floating,)):
-        return float(value)
-    elif isinstance(value, (np.ndarray,)):
-        return value.tolist()
-    elif value is None or isinstance(value, (str, int, float, bool)):
-        return value
-    else:
-        # Fallback: convert unknown objects to string
-        return str(value)
-
 class TaskPlanning:
-    def __init__(self, plan_structure_llm):
+    def __init__(self, plan_structure_llm, plan_cache: Optional[PlanCache] = None,
+                 intent_router: Optional[IntentRouter] = None):
         self.plan_structure_llm = plan_structure_llm
-        self.planning_prompt = self._build_prompt()
+        self.plan_cache = plan_cache if plan_cache is not None else PlanCache()
+        # Template questions and greetings planned without the LLM
+        self.intent_router = intent_router if intent_router is not None else IntentRouter()
+        self.repair_prompt = load_prompt(REPAIR_PROMPT)
+        self.tool_retriever = None
+        self._prompt_signature = None
+        self._refresh_prompt()
 
 
     def _build_prompt(self) -> ChatPromptTemplate:
@@ -66,57 +66,187 @@ class TaskPlanning:
         Builds the planning prompt that instructs the LLM to create
         a structured multi-step plan using the available tools.
         """
-        business_context = load_prompt("0.business_context")
-        data_sources = load_prompt("1.data_sources_context")
-        tools_description = load_prompt("2.tools_planning")
-        full_prompt = business_context + data_sources + tools_description
+        full_prompt = "".join(load_prompt(name) for name in PLANNING_PROMPTS)
+        self.plan_cache.set_fingerprint(plan_fingerprint(full_prompt, get_tools().TASK_FUNCS))
+        return self._template(full_prompt)
+
+
+    @staticmethod
+    def _template(system_prompt: str) -> ChatPromptTemplate:
         return ChatPromptTemplate.from_messages([
-            ("system", full_prompt),
+            ("system", system_prompt),
             ("human", "Question: {question}")
         ])
 
 
-    def task_planning(self, db: Session, state: State):
+    def retriever(self) -> ToolRetriever:
+        """
+        Tool retriever of the current planning prompt (rebuilt when its
+        files change); shared with the executor's plan analyzer.
+        """
+        self._refresh_prompt()
+        return self.tool_retriever
+
+
+    def _planning_context(self, state: State):
+        """
+        Planning prompt reduced to the tools, data sources and examples
+        relevant to the question, with the selected tools (None when the
+        full catalogue is used).
+        """
+        text, tools = self.retriever().context(state["question"])
+        if tools is None:
+            return self.planning_prompt, None
+        return self._template(text), tools
+
+
+    def _refresh_prompt(self) -> None:
+        """
+        Rebuilds the planning prompt (and re-keys the plan cache) when one
+        of its prompt files changed on disk since it was last read.
+        """
+        signature = []
+        for name in PLANNING_PROMPTS:
+            stat = os.stat(prompt_path(name))
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        if signature != self._prompt_signature:
+            self.planning_prompt = self._build_prompt()
+            self.tool_retriever = ToolRetriever()
+            self._prompt_signature = signature
+
+
+    def task_planning(self, trace: TraceRecorder, state: State):
         """
         Uses the planning LLM to generate a structured plan from a user question.
+        Questions equivalent to an already planned one reuse its plan.
+        """
+        step = self._start_planning(trace, state)
+        try:
+            routed = self._routed_plan(state)
+            if routed is not None:
+                return self._finish_planning(trace, step, {"plan": routed.plan}, route=routed.rule)
+            cached = self._cached_plan(state)
+            if cached is not None:
+                return self._finish_planning(trace, step, *cached)
+            template, tools = self._planning_context(state)
+            result = self.plan_structure_llm.invoke(template.invoke({"question": state["question"]}))
+            if tools is not None and not self._plan_of(result) and not self.tool_retriever.trust_empty_plan(state["question"]):
+                # A question about the data got no tools: retry with every tool
+                tools = None
+                prompt = self.planning_prompt.invoke({"question": state["question"]})
+                result = self.plan_structure_llm.invoke(prompt)
+            self._store_plan(state, result)
+            return self._finish_planning(trace, step, result, prompt_tools=tools)
+        except Exception as e:
+            self._planning_failed(trace, step, e)
+
+
+    async def atask_planning(self, trace: TraceRecorder, state: State):
+        """
+        Async variant of task_planning: awaits the planning LLM instead of
+        blocking the event loop.
         """
-        step = create_step(
-            db=db,
+        step = self._start_planning(trace, state)
+        try:
+            routed = self._routed_plan(state)
+            if routed is not None:
+                return self._finish_planning(trace, step, {"plan": routed.plan}, route=routed.rule)
+            cached = self._cached_plan(state)
+            if cached is not None:
+                return self._finish_planning(trace, step, *cached)
+            template, tools = self._planning_context(state)
+            result = await self.plan_structure_llm.ainvoke(await template.ainvoke({"question": state["question"]}))
+            if tools is not None and not self._plan_of(result) and not self.tool_retriever.trust_empty_plan(state["question"]):
+                # A question about the data got no tools: retry with every tool
+                tools = None
+                prompt = await self.planning_prompt.ainvoke({"question": state["question"]})
+                result = await self.plan_structure_llm.ainvoke(prompt)
+            self._store_plan(state, result)
+            return self._finish_planning(trace, step, result, prompt_tools=tools)
+        except Exception as e:
+            self._planning_failed(trace, step, e)
+
+
+    # ------------------------------------------------------
+    #  Intent router / plan cache
+    # ------------------------------------------------------
+    def _routed_plan(self, state: State):
+        route = self.intent_router.route(state["question"])
+        if route is None or plan_errors(route.plan, get_tools().TASK_FUNCS):
+            return None
+        print(f"🚦 Intent router: {route.rule} (planning LLM skipped)")
+        return route
+
+
+    def _cached_plan(self, state: State):
+        self._refresh_prompt()
+        hit = self.plan_cache.get(state["question"])
+        if hit is None:
+            return None
+        plan, match = hit
+        print(f"⚡ Plan cache hit (similarity {match['similarity']}): {match['cached_question']}")
+        return {"plan": plan}, match
+
+
+    @staticmethod
+    def _plan_of(result):
+        return result.get("plan") if isinstance(result, dict) else None
+
+
+    def _store_plan(self, state: State, result) -> None:
+        # Only plans that would pass validation are reused
+        plan = result.get("plan", []) if isinstance(result, dict) else None
+        if plan is not None and not plan_errors(plan, get_tools().TASK_FUNCS):
+            self.plan_cache.put(state["question"], plan)
+
+
+    @staticmethod
+    def _start_planning(trace: TraceRecorder, state: State):
+        return trace.create_step(
             run_id=state["run_id"],
             name="Planning",
             input_data=state["question"]
         )
 
-        try:
-            prompt = self.planning_prompt.invoke({"question": state["question"]})
-            result = self.plan_structure_llm.invoke(prompt)
 
-            update_step(
-                db=db,
-                step_id=step.id,
-                status="Completed",
-                output_data={"output": make_serializable(result)}
-            )
+    @staticmethod
+    def _finish_planning(trace: TraceRecorder, step, result, cache_match: Optional[dict] = None, prompt_tools=None,
+                         route: Optional[str] = None):
+        output = {"output": to_jsonable(result), "cache_hit": cache_match is not None}
+        if cache_match is not None:
+            output["cache_match"] = cache_match
+        elif route is not None:
+            # Intent router rule that produced the plan
+            output["route"] = route
+        else:
+            # Tools the planning prompt was reduced to (None: full catalogue)
+            output["prompt_tools"] = list(prompt_tools) if prompt_tools is not None else None
+        trace.update_step(
+            step_id=step.id,
+            status="Completed",
+            output_data=output
+        )
 
-            print("🧩 Plan generated successfully.")
-            print(result == {})
-            if result == {}:
-                return {"plan": []}
-            return {"plan": result["plan"]}
+        print("🧩 Plan generated successfully.")
+        # A new plan gets the full repair budget
+        if result == {}:
+            return {"plan": [], "repair_attempts": 0}
+        return {"plan": result["plan"], "repair_attempts": 0}
 
-        except Exception as e:
-            print(f"⚠️ Error generating task plan: {e}")
-            update_step(
-                db=db,
-                step_id=step.id,
-                status="Error",
-                output_data={"error": str(e)}
-            )
-            raise RuntimeError(f"Task planning failed: {e}") from e
+
+    @staticmethod
+    def _planning_failed(trace: TraceRecorder, step, e: Exception):
+        print(f"⚠️ Error generating task plan: {e}")
+        trace.update_step(
+            step_id=step.id,
+            status="Error",
+            output_data={"error": str(e)}
+        )
+        raise RuntimeError(f"Task planning failed: {e}") from e
 
 
     @staticmethod
-    def validate_plan(db: Session, state: State):
+    def validate_plan(trace: TraceRecorder, state: State):
         """
         Validate that the plan conforms to the required structure and logic.
         Ensures:
@@ -125,70 +255,32 @@ class TaskPlanning:
         - All tools are valid
         - Proper field types
         """
-        step = create_step(
-            db=db,
+        step = trace.create_step(
             run_id=state["run_id"],
             name="Plan Validation",
             input_data=state.get("plan", {})
         )
 
         try:
-            tools = Tools()
-            task_ids = set()
-            errors = []
-            plan = state.get("plan", [])
-
-            if not isinstance(plan, list):
-                raise ValueError("Plan must be a list of tasks")
-
-            for task in plan:
-                task_id = task.get("id")
-                task_name = task.get("task")
-                deps = task.get("dep", [])
-                args = task.get("args", [])
-
-                # ---- ID check
-                if not isinstance(task_id, str):
-                    errors.append(f"Task ID must be a string: {task_id}")
-                elif task_id in task_ids:
-                    errors.append(f"Duplicate task ID found: {task_id}")
-                else:
-                    task_ids.add(task_id)
-
-                # ---- Tool validity check
-                if task_name not in tools.TASK_FUNCS:
-                    errors.append(f"Invalid task/tool name: {task_name}")
-
-                # ---- Dependency check
-                if not isinstance(deps, list):
-                    errors.append(f"Dependencies must be a list for task {task_id}")
-                else:
-                    for dep in deps:
-                        if dep not in task_ids and dep not in [t.get("id") for t in plan]:
-                            errors.append(f"Task {task_id} depends on missing task '{dep}'")
-
-                # ---- Args format
-                if not isinstance(args, list):
-                    errors.append(f"Args must be a list for task {task_id}")
+            errors = plan_validator(get_tools().TASK_FUNCS).check(state.get("plan", []))
 
             if errors:
                 print("❌ Plan validation failed:")
                 for e in errors:
-                    print(f"   - {e}")
-                update_step(
-                    db=db,
+                    print(f"   - {e.error}")
+                errors = [e._asdict() for e in errors]
+                trace.update_step(
                     step_id=step.id,
                     status="Completed",
                     output_data={"validation": False, "errors": errors}
                 )
 
-                # Expected validation failure (not an exception)
+                # Expected validation failure (not an exception): repair_plan fixes it
                 return {"validation": False, "errors": errors}
 
             # ✅ Validation success
             print("✅ Plan validation passed.")
-            update_step(
-                db=db,
+            trace.update_step(
                 step_id=step.id,
                 status="Completed",
                 output_data={"validation": True, "errors": []}
@@ -198,8 +290,7 @@ class TaskPlanning:
         except Exception as e:
             # 🧱 Unexpected runtime failure
             print(f"⚠️ Error validating plan: {e}")
-            update_step(
-                db=db,
+            trace.update_step(
                 step_id=step.id,
                 status="Error",
                 output_data={"error": str(e)}
@@ -208,16 +299,306 @@ class TaskPlanning:
 
 
 
+    @staticmethod
+    async def avalidate_plan(trace: TraceRecorder, state: State):
+        """
+        Async node entry point; validation is CPU-only and returns immediately.
+        """
+        return TaskPlanning.validate_plan(trace, state)
+
+
+    # ------------------------------------------------------
+    #  Plan repair
+    # ------------------------------------------------------
+    def repair_plan(self, trace: TraceRecorder, state: State):
+        """
+        Sends only the tasks that failed validation, with their errors and
+        the relevant tool entries, to the planning LLM and merges the
+        corrected tasks back into the plan (at most MAX_PLAN_REPAIRS times).
+        """
+        step, broken, prompt = self._start_repair(trace, state)
+        try:
+            result = self.plan_structure_llm.invoke(prompt)
+            return self._finish_repair(trace, step, state, broken, result)
+        except Exception as e:
+            self._repair_failed(trace, step, e)
+
+
+    async def arepair_plan(self, trace: TraceRecorder, state: State):
+        """
+        Async variant of repair_plan (awaits the planning LLM).
+        """
+        step, broken, prompt = self._start_repair(trace, state)
+        try:
+            result = await self.plan_structure_llm.ainvoke(prompt)
+            return self._finish_repair(trace, step, state, broken, result)
+        except Exception as e:
+            self._repair_failed(trace, step, e)
+
+
+    def _start_repair(self, trace: TraceRecorder, state: State):
+        plan = state.get("plan", [])
+        errors = state.get("errors") or []
+        attempts = state.get("repair_attempts") or 0
+        step = trace.create_step(
+            run_id=state["run_id"],
+            name="Plan Repair",
+            input_data={"attempt": attempts + 1, "errors": errors}
+        )
+        if attempts >= MAX_PLAN_REPAIRS:
+            self._repair_failed(trace, step, RuntimeError(f"plan still invalid after {attempts} repairs"))
+
+        # Errors not tied to one task (e.g. a task that is not an object): repair every task
+        broken = {e["task_id"] for e in errors}
+        if None in broken:
+            broken = {t.get("id") for t in plan if isinstance(t, dict)}
+        broken_tasks = [t for t in plan if not isinstance(t, dict) or t.get("id") in broken]
+
+        self._refresh_prompt()
+        context = self.tool_retriever.repair_context(
+            state["question"], include=[t.get("task") for t in broken_tasks if isinstance(t, dict)]
+        )
+        template = ChatPromptTemplate.from_messages([("system", context + self.repair_prompt)])
+        prompt = template.invoke({
+            "question": state["question"],
+            "plan_outline": render_plan(plan),
+            "broken_tasks": json.dumps(broken_tasks, indent=2, ensure_ascii=False),
+            "errors": "\n".join(f"- {e['error']}" for e in errors)
+        })
+        return step, broken, prompt
+
+
+    def _finish_repair(self, trace: TraceRecorder, step, state: State, broken: set, result):
+        repaired = self._plan_of(result)
+        if not isinstance(repaired, list):
+            raise ValueError("Repair did not return a list of tasks")
+        plan = merge_repaired_tasks(state.get("plan", []), repaired, broken)
+        attempts = (state.get("repair_attempts") or 0) + 1
+        trace.update_step(
+            step_id=step.id,
+            status="Completed",
+            output_data={"repaired": to_jsonable(repaired), "plan": to_jsonable(plan)}
+        )
+        print(f"🛠️ Plan repaired (attempt {attempts}/{MAX_PLAN_REPAIRS}): {len(broken)} broken task(s) resent.")
+        return {"plan": plan, "repair_attempts": attempts}
+
+
+    @staticmethod
+    def _repair_failed(trace: TraceRecorder, step, e: Exception):
+        print(f"⚠️ Error repairing task plan: {e}")
+        trace.update_step(
+            step_id=step.id,
+            status="Error",
+            output_data={"error": str(e)}
+        )
+        raise RuntimeError(f"Plan repair failed: {e}") from e
+
+
+
+# ==========================================================
+#  PLAN CHECKS
+# ==========================================================
+# Task fields besides the tool call itself
+TASK_FLAGS = {"analyze_answer", "analyze_target_property"}
+
+
+class PlanError(NamedTuple):
+    task_id: Optional[str]      # None: not tied to one task
+    error: str
+
+
+class ToolSpec(NamedTuple):
+    args: Dict[str, Optional[type]]     # accepted argument -> expected type (None: any)
+    required: frozenset
+
+
+def _literal_matches(value, expected: Optional[type]) -> bool:
+    """Whether a literal argument value can be cast as the executor will (cast_arg)."""
+    if expected is None or expected in (str, bool):
+        return True
+    try:
+        if expected is list:
+            return isinstance(value, list) or (isinstance(value, str) and isinstance(json.loads(value), list))
+        expected(value)
+        return True
+    except (ValueError, TypeError):
+        return False
+
+
+class PlanValidator:
+    """
+    Plan checks compiled from the tool set: accepted arguments, required
+    arguments and expected types per tool (signatures + TOOL_ARG_TYPES).
+    `check` runs in one pass over the tasks and their arguments, plus a
+    linear topological sort for cycles.
+    """
+
+    def __init__(self, task_funcs: Dict):
+        self.specs: Dict[str, ToolSpec] = {}
+        for name, func in task_funcs.items():
+            params = {
+                p.name: p for p in inspect.signature(func).parameters.values()
+                if p.kind not in (inspect.Parameter.VAR_POSITIONAL, inspect.Parameter.VAR_KEYWORD)
+            }
+            types = TOOL_ARG_TYPES.get(name, {})
+            self.specs[name] = ToolSpec(
+                args={arg: types.get(arg) for arg in params},
+                required=frozenset(arg for arg, p in params.items() if p.default is inspect.Parameter.empty)
+            )
+
+    def check(self, plan, known_ids: Iterable[str] = ()) -> List[PlanError]:
+        """
+        Errors of a plan; `known_ids` are tasks outside it that may be
+        referenced (outputs already produced in the run).
+        Raises ValueError when the plan is not a list at all.
+        """
+        if not isinstance(plan, list):
+            raise ValueError("Plan must be a list of tasks")
+
+        errors: List[PlanError] = []
+        ids = set()
+        for task in plan:
+            if not isinstance(task, dict):
+                errors.append(PlanError(None, f"Task must be an object: {task}"))
+                continue
+            task_id = task.get("id")
+            if not isinstance(task_id, str):
+                errors.append(PlanError(None, f"Task ID must be a string: {task_id}"))
+            elif task_id in ids:
+                errors.append(PlanError(task_id, f"Duplicate task ID found: {task_id}"))
+            else:
+                ids.add(task_id)
+        known = ids.union(known_ids)
+
+        edges: Dict[str, set] = {}
+        for task in plan:
+            if not isinstance(task, dict) or not isinstance(task.get("id"), str):
+                continue
+            task_id, task_name = task["id"], task.get("task")
+            refs = edges.setdefault(task_id, set())
+            spec = self.specs.get(task_name)
+            if spec is None:
+                errors.append(PlanError(task_id, f"Invalid task/tool name: {task_name}"))
+
+            # ---- Dependencies
+            deps = task.get("dep", [])
+            if not isinstance(deps, list):
+                errors.append(PlanError(task_id, f"Dependencies must be a list for task {task_id}"))
+                deps = []
+            for dep in deps:
+                if dep not in known:
+                    errors.append(PlanError(task_id, f"Task {task_id} depends on missing task '{dep}'"))
+                elif dep in ids:
+                    refs.add(dep)
+
+            # ---- Arguments
+            args = task.get("args", [])
+            if not isinstance(args, list):
+                errors.append(PlanError(task_id, f"Args must be a list for task {task_id}"))
+                continue
+            seen = set()
+            for arg in args:
+                if not isinstance(arg, dict) or not isinstance(arg.get("key"), str) or "value" not in arg:
+                    errors.append(PlanError(task_id, f"Task {task_id} has a malformed argument (key/value expected): {arg}"))
+                    continue
+                key, value = arg["key"], arg["value"]
+                if key in seen:
+                    errors.append(PlanError(task_id, f"Task {task_id} sets argument '{key}' twice"))
+                seen.add(key)
+                if spec is not None and key not in spec.args:
+                    errors.append(PlanError(task_id, f"Tool {task_name} has no argument '{key}' (task {task_id}); accepted: {sorted(spec.args)}"))
+                    continue
+                if isinstance(value, str) and value.startswith("DEP_"):
+                    target = value[4:]
+                    if target not in known:
+                        errors.append(PlanError(task_id, f"Argument '{key}' of task {task_id} references missing task '{target}'"))
+                    elif target in ids:
+                        refs.add(target)
+                    if arg.get("property") is not None and not isinstance(arg["property"], str):
+                        errors.append(PlanError(task_id, f"Property of argument '{key}' in task {task_id} must be a string"))
+                elif spec is not None and not _literal_matches(value, spec.args[key]):
+                    expected = spec.args[key].__name__
+                    errors.append(PlanError(task_id, f"Argument '{key}' of task {task_id} must be {expected}, got {value!r}"))
+            if spec is not None:
+                for missing in sorted(spec.required - seen):
+                    errors.append(PlanError(task_id, f"Task {task_id} is missing required argument '{missing}' of {task_name}"))
+
+        # ---- Cycles (Kahn's algorithm over dep and DEP_ edges)
+        indegree = {task_id: len(refs) for task_id, refs in edges.items()}
+        dependents: Dict[str, List[str]] = {}
+        for task_id, refs in edges.items():
+            for ref in refs:
+                dependents.setdefault(ref, []).append(task_id)
+        ready = deque(task_id for task_id, n in indegree.items() if n == 0)
+        while ready:
+            for dependent in dependents.get(ready.popleft(), []):
+                indegree[dependent] -= 1
+                if indegree[dependent] == 0:
+                    ready.append(dependent)
+        for task_id, n in indegree.items():
+            if n > 0:
+                errors.append(PlanError(task_id, f"Task {task_id} is part of a dependency cycle"))
+        return errors
+
+
+_validators: Dict[tuple, PlanValidator] = {}
+_validators_lock = threading.Lock()
+
+
+def plan_validator(task_funcs: Dict) -> PlanValidator:
+    """Validator compiled once per tool set (same names and signatures on every data reload)."""
+    key = tuple(sorted(task_funcs))
+    with _validators_lock:
+        validator = _validators.get(key)
+        if validator is None:
+            validator = _validators[key] = PlanValidator(task_funcs)
+        return validator
+
+
+def plan_errors(plan, task_funcs: Dict, known_ids: Iterable[str] = ()) -> List[str]:
+    """
+    Error messages of a plan (see PlanValidator.check).
+    Raises ValueError when the plan is not a list at all.
+    """
+    return [e.error for e in plan_validator(task_funcs).check(plan, known_ids)]
+
+
+def merge_repaired_tasks(plan: List, repaired: List, broken: set) -> List:
+    """
+    Plan with the broken tasks replaced by the repaired ones of the same id
+    (broken tasks left out of the repair are dropped) and the new tasks of
+    the repair appended.
+    """
+    kept_ids = {t.get("id") for t in plan if isinstance(t, dict) and t.get("id") not in broken}
+    by_id = {}
+    for task in repaired:
+        if isinstance(task, dict) and task.get("id") not in kept_ids:
+            by_id.setdefault(task.get("id"), task)
+    merged = []
+    for task in plan:
+        if isinstance(task, dict) and task.get("id") not in broken:
+            merged.append(task)
+        elif isinstance(task, dict) and task.get("id") in by_id:
+            merged.append(by_id.pop(task.get("id")))
+    merged.extend(by_id.values())
+    return merged
+
+
 # ==========================================================
 #  VALIDATION ROUTER
 # ==========================================================
 def validation_router(state: State):
     """
     Determines which node to run next depending on the plan validation result.
+    If the run already failed → direct_response, which is skipped and
+    carries the fallback response to the end of the run.
     If plan is empty → go direct_response.
     If validation passes → run_plan.
-    Otherwise → replan.
+    Otherwise → repair the invalid tasks.
     """
+    if state.get("failed"):
+        print("⚠️ Run failed → fallback response.")
+        return "direct_response"
     if len(state.get("plan", [])) == 0:
         print("ℹ️ No tools needed → direct response path.")
         return "direct_response"
@@ -225,5 +606,5 @@ def validation_router(state: State):
         print("➡️  Plan validated → executing plan.")
         return "run_plan"
     else:
-        print("🔁 Plan invalid → re-generating.")
-        return "task_planning"
+        print("🔁 Plan invalid → repairing.")
+        return "repair_plan"
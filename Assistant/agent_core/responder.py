@@ -1,22 +1,30 @@
 import json
-from typing import Dict
-from sqlalchemy.orm import Session
+import asyncio
+from typing import Dict, Optional
 from utils.utils import load_prompt 
+from utils.serialization import dumps
 from typing_extensions import TypedDict
 from langchain_core.prompts import ChatPromptTemplate
-from crud.step import create_step, update_step
+from crud.trace import TraceRecorder
+from .executor import stream_writer
+from .response_cache import ResponseCache, prompt_version
 
 class State(TypedDict):
+    run_id: str
     question: str
     plan: Dict
     validation: bool
     outputs: Dict
+    response_context: Dict
     response: str
+    failed: bool
 
 class Responder():
-    def __init__(self, base_llm): 
+    def __init__(self, base_llm, response_cache: Optional[ResponseCache] = None): 
         self.generate_response_prompt, self.direct_response_prompt = self._build_response_prompts()
         self.base_llm = base_llm
+        # Answers of previous runs with the same question and tool outputs
+        self.response_cache = response_cache
 
     def _build_response_prompts(self) -> dict:
         """
@@ -26,6 +34,7 @@ class Responder():
         business_context = load_prompt("0.business_context")
         data_sources = load_prompt("1.data_sources_context")
         response_prompt = business_context + load_prompt("4.response_stage")
+        self.prompt_version = prompt_version(response_prompt)
         direct_response = business_context + data_sources + load_prompt("3.direct_response")
         return[
             ChatPromptTemplate.from_messages([
@@ -36,88 +45,148 @@ class Responder():
             ])
         ]
 
-    def generate_response(self, db: Session, state: State):
+    def generate_response(self, trace: TraceRecorder, state: State):
         """
         Combines the user question, plan, and tool outputs
         into a final natural-language answer.
         """
-        step = create_step(
-            db=db,
-            run_id=state["run_id"],
-            name="Response Generation",
-            input_data={
-                "question": state.get("question", ""),
-                "plan": json.dumps(state.get("plan", {}), indent=2, ensure_ascii=False),
-                "tool_outputs": json.dumps(state.get("outputs", {}), indent=2, ensure_ascii=False)
-            }
-        )
-
+        step, prompt_input = self._start_generate_response(trace, state)
         try:
-            prompt = self.generate_response_prompt.invoke({
-                "question": state.get("question", ""),
-                "plan": json.dumps(state.get("plan", {}), indent=2, ensure_ascii=False),
-                "tool_outputs": json.dumps(state.get("outputs", {}), indent=2, ensure_ascii=False)
-            })
-
+            key = self._cache_key(prompt_input)
+            cached = self.response_cache.get(trace.db, key) if key else None
+            if cached is not None:
+                return self._finish_cached_response(trace, step, cached)
+            prompt = self.generate_response_prompt.invoke(prompt_input)
             response = self.base_llm.invoke(prompt)
+            if key:
+                self.response_cache.put(trace.db, key, response.content)
+            return self._finish_response(trace, step, response, cache_hit=False if key else None)
+        except Exception as e:
+            print(f"⚠️ Error generating final response: {e}")
+            self._response_failed(trace, step, e)
+            # Re-raise to stop workflow
+            raise RuntimeError(f"Response generation failed: {e}") from e
 
-            update_step(
-                db=db,
-                step_id=step.id,
-                status="Completed",
-                output_data={"response": response.content}
-            )
-
-            return {"response": response.content}
 
+    async def agenerate_response(self, trace: TraceRecorder, state: State):
+        """
+        Async variant of generate_response (awaits the LLM call).
+        """
+        step, prompt_input = self._start_generate_response(trace, state)
+        try:
+            key = self._cache_key(prompt_input)
+            cached = await asyncio.to_thread(self.response_cache.get, trace.db, key) if key else None
+            if cached is not None:
+                return self._finish_cached_response(trace, step, cached)
+            prompt = await self.generate_response_prompt.ainvoke(prompt_input)
+            response = await self.base_llm.ainvoke(prompt)
+            if key:
+                await asyncio.to_thread(self.response_cache.put, trace.db, key, response.content)
+            return self._finish_response(trace, step, response, cache_hit=False if key else None)
         except Exception as e:
             print(f"⚠️ Error generating final response: {e}")
-            update_step(
-                db=db,
-                step_id=step.id,
-                status="Error",
-                output_data={"error": str(e)}
-            )
-            # Re-raise to stop workflow
+            self._response_failed(trace, step, e)
             raise RuntimeError(f"Response generation failed: {e}") from e
 
 
-    def direct_response(self, db: Session, state: State):
+    def direct_response(self, trace: TraceRecorder, state: State):
         """
         Handles questions that do not require tool execution.
         Produces a direct natural-language answer using only the context.
         """
-        step = create_step(
-            db=db,
-            run_id=state["run_id"],
-            name="Direct Response",
-            input_data=state.get("question", "")
-        )
-
+        step = self._start_direct_response(trace, state)
         try:
             prompt = self.direct_response_prompt.invoke({
                 "question": state.get("question", "")
             })
-
             response = self.base_llm.invoke(prompt)
+            return self._finish_response(trace, step, response)
+        except Exception as e:
+            print(f"⚠️ Error generating direct response: {e}")
+            self._response_failed(trace, step, e)
+            # Re-raise to stop workflow
+            raise RuntimeError(f"Direct response generation failed: {e}") from e
 
-            update_step(
-                db=db,
-                step_id=step.id,
-                status="Completed",
-                output_data={"response": response.content}
-            )
-
-            return {"response": response.content}
 
+    async def adirect_response(self, trace: TraceRecorder, state: State):
+        """
+        Async variant of direct_response (awaits the LLM call).
+        """
+        step = self._start_direct_response(trace, state)
+        try:
+            prompt = await self.direct_response_prompt.ainvoke({
+                "question": state.get("question", "")
+            })
+            response = await self.base_llm.ainvoke(prompt)
+            return self._finish_response(trace, step, response)
         except Exception as e:
             print(f"⚠️ Error generating direct response: {e}")
-            update_step(
-                db=db,
-                step_id=step.id,
-                status="Error",
-                output_data={"error": str(e)}
-            )
-            # Re-raise to stop workflow
+            self._response_failed(trace, step, e)
             raise RuntimeError(f"Direct response generation failed: {e}") from e
 
+
+    # ------------------------------------------------------
+    #  Step bookkeeping shared by the sync and async paths
+    # ------------------------------------------------------
+    @staticmethod
+    def _start_generate_response(trace: TraceRecorder, state: State):
+        # Compact text from the compact_outputs stage, full JSON without it
+        context = state.get("response_context") or {}
+        prompt_input = {
+            "question": state.get("question", ""),
+            "plan": context.get("plan") or json.dumps(state.get("plan", {}), indent=2, ensure_ascii=False),
+            "tool_outputs": context.get("tool_outputs") or dumps(state.get("outputs", {}), indent=True).decode("utf-8")
+        }
+        step = trace.create_step(
+            run_id=state["run_id"],
+            name="Response Generation",
+            input_data=prompt_input
+        )
+        return step, prompt_input
+
+    @staticmethod
+    def _start_direct_response(trace: TraceRecorder, state: State):
+        return trace.create_step(
+            run_id=state["run_id"],
+            name="Direct Response",
+            input_data=state.get("question", "")
+        )
+
+    def _cache_key(self, prompt_input: Dict[str, str]) -> Optional[str]:
+        if self.response_cache is None:
+            return None
+        return self.response_cache.key(
+            prompt_input["question"], prompt_input["plan"], prompt_input["tool_outputs"], self.prompt_version
+        )
+
+    @staticmethod
+    def _finish_response(trace: TraceRecorder, step, response, cache_hit: Optional[bool] = None):
+        output = {"response": response.content}
+        if cache_hit is not None:
+            output["cache_hit"] = cache_hit
+        trace.update_step(
+            step_id=step.id,
+            status="Completed",
+            output_data=output
+        )
+        return {"response": response.content}
+
+    @staticmethod
+    def _finish_cached_response(trace: TraceRecorder, step, response: str):
+        print("♻️ Response served from cache.")
+        # No LLM tokens to stream: streaming clients get the answer at once
+        stream_writer()({"event": "token", "data": response})
+        trace.update_step(
+            step_id=step.id,
+            status="Completed",
+            output_data={"response": response, "cache_hit": True}
+        )
+        return {"response": response}
+
+    @staticmethod
+    def _response_failed(trace: TraceRecorder, step, e: Exception):
+        trace.update_step(
+            step_id=step.id,
+            status="Error",
+            output_data={"error": str(e)}
+        )
@@ -0,0 +1,92 @@
+import hashlib
+import threading
+from collections import Counter
+from typing import Dict, Optional
+from sqlalchemy.orm import Session
+from utils.serialization import dumps
+from crud.response_cache import (
+    get_cached_response, save_cached_response, evict_cached_responses, clear_cached_responses
+)
+from .plan_cache import normalize_question
+
+RESPONSE_CACHE_TTL = 24 * 60 * 60      # seconds
+RESPONSE_CACHE_SIZE = 5000             # entries kept in the table
+EVICT_EVERY = 100                      # inserts between two eviction passes
+
+
+class ResponseCache:
+    """
+    Persistent cache of generated answers, stored in the application
+    database. An answer is reused when the question (normalised), the
+    plan and tool outputs text given to the LLM, the response prompt and
+    the model config are all the same as in the run that produced it.
+
+    Lookups and writes go through the run's DB session. A hit is a single
+    read; a miss costs one insert. Hit counts are collected in memory and
+    written, together with the TTL / LRU eviction, every `evict_every`
+    inserts. A failing cache (e.g. the table does not exist yet) only
+    costs the LLM call it would have saved.
+    """
+
+    def __init__(self, model_config: Dict, ttl_s: float = RESPONSE_CACHE_TTL, max_entries: int = RESPONSE_CACHE_SIZE,
+                 evict_every: int = EVICT_EVERY):
+        self.model_config = dumps(model_config)
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.evict_every = evict_every
+        self._hits: Counter = Counter()
+        self._inserts = 0
+        self._lock = threading.Lock()
+
+    def key(self, question: str, plan: str, tool_outputs: str, prompt_version: str) -> str:
+        h = hashlib.sha256()
+        for part in (prompt_version.encode("utf-8"), self.model_config, normalize_question(question).encode("utf-8"),
+                     plan.encode("utf-8"), tool_outputs.encode("utf-8")):
+            h.update(len(part).to_bytes(8, "big"))
+            h.update(part)
+        return h.hexdigest()
+
+    def get(self, db: Session, key: str) -> Optional[str]:
+        try:
+            response = get_cached_response(db, key, self.ttl_s)
+        except Exception as e:
+            db.rollback()
+            print(f"⚠️ Response cache lookup failed: {e}")
+            return None
+        if response is not None:
+            with self._lock:
+                self._hits[key] += 1
+        return response
+
+    def put(self, db: Session, key: str, response: str) -> None:
+        try:
+            save_cached_response(db, key, response)
+        except Exception as e:
+            db.rollback()
+            print(f"⚠️ Response cache write failed: {e}")
+            return
+        with self._lock:
+            self._inserts += 1
+            if self._inserts < self.evict_every:
+                return
+            hits, self._hits, self._inserts = self._hits, Counter(), 0
+        self.evict(db, hits)
+
+    def evict(self, db: Session, hits: Optional[Dict[str, int]] = None) -> None:
+        """Writes the collected hits and drops expired / least recently used entries."""
+        if hits is None:
+            with self._lock:
+                hits, self._hits = self._hits, Counter()
+        try:
+            evict_cached_responses(db, self.ttl_s, self.max_entries, hits)
+        except Exception as e:
+            db.rollback()
+            print(f"⚠️ Response cache eviction failed: {e}")
+
+    def clear(self, db: Session) -> int:
+        return clear_cached_responses(db)
+
+
+def prompt_version(prompt_text: str) -> str:
+    """Identifies a response prompt: cached answers are only reused under the same one."""
+    return hashlib.sha256(prompt_text.encode("utf-8")).hexdigest()[:16]
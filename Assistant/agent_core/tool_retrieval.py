@@ -0,0 +1,275 @@
+import re
+import math
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+from utils.utils import load_prompt
+from .plan_cache import question_terms
+
+BUSINESS_PROMPT = "0.business_context"
+SOURCES_PROMPT = "1.data_sources_context"
+TOOLS_PROMPT = "2.tools_planning"
+
+MAX_TOOLS = 10                # tools kept in a reduced catalogue (before chaining)
+MAX_EXAMPLES = 3              # worked examples kept in a reduced prompt
+RELATIVE_SCORE = 0.2          # keep tools scoring at least this share of the best one
+LONE_MATCH_MARGIN = 0.8       # best tool's lead over the runner-up (share of its score) for a lone keyword match
+PROMPT_CACHE_SIZE = 128       # assembled prompt texts kept per catalogue
+
+_BANNER = re.compile(r"^-{5,}\n(?P<title>[^\n]*)\n-{5,}\n", re.MULTILINE)
+_TOOL_NAME = re.compile(r'"name":\s*"(get_\w+)"')
+_ARG_NAME = re.compile(r'\{\{\s*"name":\s*"(\w+)"')
+_TASK_NAME = re.compile(r'"task":\s*"(\w+)"')
+_PLAN_TASK = re.compile(r'"task":\s*"(\w+)",\s*"id":\s*"(\w+)".*?"dep":\s*\[([^\]]*)\]', re.DOTALL)
+_QUERY = re.compile(r'\*\*User Query:\*\*\s*\n"?([^\n]*?)"?\n')
+_MENTION = re.compile(r"\bget_\w+")
+
+
+def _stem(word: str) -> str:
+    for suffix in ("ing", "ed", "es", "s", "ly"):
+        if len(word) > len(suffix) + 3 and word.endswith(suffix):
+            return word[:-len(suffix)]
+    return word
+
+
+def _terms(text: str) -> List[str]:
+    """Stemmed content words of a text (snake_case names split into words)."""
+    return [_stem(w) for w in question_terms(text.replace("_", " "))]
+
+
+# ==========================================================
+#  CATALOGUE PARSING
+# ==========================================================
+class ToolCatalogue:
+    """
+    Structured view of the planning prompt files: the tool catalogue of
+    2.tools_planning split into one entry per tool, its worked examples,
+    and the data-source sections of 1.data_sources_context grouped by
+    data source. Texts are kept verbatim (braces stay escaped for the
+    prompt templates), so a reduced prompt is the full one minus entries.
+    """
+
+    def __init__(self, business: str, sources: str, tools: str):
+        self.business = business
+        self._parse_tools(tools)
+        self._parse_sources(sources)
+        self._build_index()
+
+    @classmethod
+    def load(cls) -> "ToolCatalogue":
+        return cls(load_prompt(BUSINESS_PROMPT), load_prompt(SOURCES_PROMPT), load_prompt(TOOLS_PROMPT))
+
+    def _parse_tools(self, text: str) -> None:
+        banners = list(_BANNER.finditer(text))
+        tools_banner = next(b for b in banners if "AVAILABLE TOOLS" in b.group("title"))
+        examples_banner = next(b for b in banners if "EXAMPLES" in b.group("title"))
+
+        # Instructions, output format and rules: always kept
+        self.header = text[:tools_banner.end()]
+
+        # One entry per "  {{ ... }}" block of the catalogue list
+        self.tools: Dict[str, Dict] = {}
+        block = []
+        for line in text[tools_banner.end():examples_banner.start()].splitlines():
+            if line == "  {{":
+                block = [line]
+            elif block:
+                block.append(line.rstrip(","))
+                if line.rstrip(",") == "  }}":
+                    entry = "\n".join(block)
+                    name = _TOOL_NAME.search(entry).group(1)
+                    args = _ARG_NAME.findall(entry.split('"output"')[0])
+                    self.tools[name] = {"text": entry, "args": [a for a in args if a != name]}
+                    block = []
+
+        self.examples_banner = examples_banner.group(0)
+        self.examples: List[Dict] = []
+        # Tools whose output feeds each tool (DEP_ references) in some example
+        self.producers: Dict[str, set] = {name: set() for name in self.tools}
+        for chunk in re.split(r"\n-{3}\n", text[examples_banner.end():]):
+            chunk = chunk.strip("\n")
+            if not chunk.startswith("### Example"):
+                continue
+            query = _QUERY.search(chunk)
+            tasks = {task_id: task for task, task_id, _ in _PLAN_TASK.findall(chunk)}
+            for task, _, deps in _PLAN_TASK.findall(chunk):
+                for dep in re.findall(r'"(\w+)"', deps):
+                    if task in self.producers and tasks.get(dep) in self.producers:
+                        self.producers[task].add(tasks[dep])
+            self.examples.append({
+                "text": chunk,
+                "query": query.group(1) if query else "",
+                "tools": set(_TASK_NAME.findall(chunk))
+            })
+
+    def _parse_sources(self, text: str) -> None:
+        # A "... DATA SOURCE CONTEXT" heading opens a data source; the
+        # sections after it (tables, column overviews) belong to it
+        self.sources: List[Dict] = []
+        for section in re.split(r"(?m)^(?=### )", text):
+            if not section.strip():
+                continue
+            if "DATA SOURCE" in section.split("\n", 1)[0] or not self.sources:
+                self.sources.append({"text": section, "families": set()})
+            else:
+                self.sources[-1]["text"] += section
+        for source in self.sources:
+            for tool in set(_MENTION.findall(source["text"])) & set(self.tools):
+                source["families"] |= self.families(tool)
+
+    def families(self, tool: str) -> set:
+        """Entity ids a tool works on (segment, topic, article), from its argument names."""
+        families = set()
+        for arg in self.tools[tool]["args"]:
+            arg = arg.rstrip("s")
+            if arg.endswith("_id"):
+                families.add(arg)
+        return families
+
+    # ------------------------------------------------------
+    #  Lexical index (BM25 over tool name, objective and
+    #  the example queries that use the tool)
+    # ------------------------------------------------------
+    def _build_index(self, k1: float = 1.2, b: float = 0.75) -> None:
+        docs = {}
+        for name, tool in self.tools.items():
+            objective = re.search(r'"objective":\s*"([^"]*)"', tool["text"])
+            words = _terms(name) + _terms(objective.group(1) if objective else "")
+            for example in self.examples:
+                if name in example["tools"]:
+                    words += _terms(example["query"])
+            docs[name] = Counter(words)
+
+        n_docs = len(docs)
+        avg_len = sum(sum(d.values()) for d in docs.values()) / max(n_docs, 1)
+        doc_freq = Counter(term for d in docs.values() for term in d)
+        self._k1, self._b, self._avg_len = k1, b, avg_len
+        # Terms of most tools ("segment", "most", "read") do not tell them apart
+        self._idf = {
+            term: 0.0 if df > n_docs / 2 else math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for term, df in doc_freq.items()
+        }
+        self._docs = docs
+
+    def score(self, question: str) -> Dict[str, float]:
+        terms = set(_terms(question))
+        scores = {}
+        for name, doc in self._docs.items():
+            length = sum(doc.values())
+            s = 0.0
+            for term in terms:
+                tf = doc.get(term, 0)
+                if tf:
+                    norm = tf + self._k1 * (1 - self._b + self._b * length / self._avg_len)
+                    s += self._idf[term] * tf * (self._k1 + 1) / norm
+            scores[name] = s
+        return scores
+
+    # ------------------------------------------------------
+    #  Selection and assembly
+    # ------------------------------------------------------
+    def select(self, question: str, include: Iterable[str] = ()) -> Optional[Tuple[str, ...]]:
+        """
+        Tools relevant to the question, the tools that feed them in the
+        examples and `include`, in catalogue order; None when nothing in
+        the catalogue matches the question.
+        """
+        scores = self.score(question)
+        best = max(scores.values(), default=0.0)
+        if best <= 0:
+            return None
+        ranked = sorted(scores, key=lambda name: -scores[name])
+        chosen = {name for name in ranked[:MAX_TOOLS] if scores[name] >= RELATIVE_SCORE * best}
+        chosen |= {producer for name in chosen for producer in self.producers[name]}
+        chosen |= set(include) & set(self.tools)
+        return tuple(name for name in self.tools if name in chosen)
+
+    def prompt_text(self, tools: Tuple[str, ...], question: str) -> str:
+        """
+        Business context, the data sources the selected tools work on, the
+        planning instructions, the selected tool entries and the examples
+        that only use selected tools (closest to the question first).
+        """
+        families = set().union(*(self.families(t) for t in tools)) if tools else set()
+        sources = [s["text"] for s in self.sources if s["families"] & families]
+
+        terms = question_terms(question)
+        examples = [e for e in self.examples if e["tools"] and e["tools"] <= set(tools)]
+        examples.sort(key=lambda e: -len(terms & question_terms(e["query"])))
+
+        entries = ",\n\n".join(self.tools[t]["text"] for t in tools)
+        parts = [
+            self.business,
+            "".join(sources),
+            self.header,
+            f"\n[\n{entries}\n]\n\n\n",
+            self.examples_banner,
+            "\n\n---\n\n".join(e["text"] for e in examples[:MAX_EXAMPLES]) + "\n"
+        ]
+        return "".join(parts)
+
+    def repair_text(self, tools: Tuple[str, ...]) -> str:
+        """Business context, planning instructions and the selected tool entries (no sources, no examples)."""
+        entries = ",\n\n".join(self.tools[t]["text"] for t in tools)
+        return "".join([self.business, self.header, f"\n[\n{entries}\n]\n"])
+
+    def lone_match(self, question: str) -> bool:
+        """
+        Whether the question matches at most one tool, far ahead of every
+        other one: a single incidental word ("What is the weather like?"),
+        not a question about the data, which matches several tools closely.
+        """
+        best, runner_up = (sorted(self.score(question).values(), reverse=True) + [0.0, 0.0])[:2]
+        return best <= 0 or (best - runner_up) / best >= LONE_MATCH_MARGIN
+
+
+# ==========================================================
+#  RETRIEVER
+# ==========================================================
+class ToolRetriever:
+    """
+    Assembles the reduced planning context for a question: only the tools,
+    data sources and examples it is likely to need. Falls back to the full
+    prompt when the question matches nothing in the catalogue.
+    """
+
+    def __init__(self, catalogue: Optional[ToolCatalogue] = None):
+        self.catalogue = catalogue or ToolCatalogue.load()
+        self.full_text = "".join(
+            load_prompt(name) for name in (BUSINESS_PROMPT, SOURCES_PROMPT, TOOLS_PROMPT)
+        )
+        self._texts: Dict[Tuple, str] = {}
+        self._lock = threading.Lock()
+
+    def context(self, question: str, include: Iterable[str] = ()) -> Tuple[str, Optional[Tuple[str, ...]]]:
+        """
+        (prompt text, selected tools); selected tools is None when the
+        full catalogue is used.
+        """
+        tools = self.catalogue.select(question, include)
+        if tools is None:
+            return self.full_text, None
+        # Example order depends on the question terms as well
+        key = (tools, question_terms(question))
+        with self._lock:
+            text = self._texts.get(key)
+        if text is None:
+            text = self.catalogue.prompt_text(tools, question)
+            with self._lock:
+                if len(self._texts) >= PROMPT_CACHE_SIZE:
+                    self._texts.clear()
+                self._texts[key] = text
+        return text, tools
+
+    def trust_empty_plan(self, question: str) -> bool:
+        """
+        Whether an empty plan from the reduced prompt can be kept: the
+        question only matches the catalogue on a lone word (small talk).
+        Otherwise the reduced prompt may have left out the tool it needs.
+        """
+        return self.catalogue.lone_match(question)
+
+    def repair_context(self, question: str, include: Iterable[str] = ()) -> str:
+        """Tool entries a plan repair needs: those relevant to the question plus `include`."""
+        tools = self.catalogue.select(question, include) or tuple(self.catalogue.tools)
+        return self.catalogue.repair_text(tools)
@@ -1,14 +1,18 @@
-import uuid
-from typing import Dict
-from sqlalchemy.orm import Session
+import asyncio
+from typing import Dict, List
+from crud.trace import TraceRecorder
 from langgraph.graph import StateGraph
 from typing_extensions import TypedDict
-from langgraph.checkpoint.memory import InMemorySaver
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from langgraph.checkpoint.base import BaseCheckpointSaver
 
 # Import core modules
 from .responder import Responder
 from .executor import TaskExecutor
 from .planner import TaskPlanning, validation_router
+from .checkpointer import create_checkpointer
+from .response_cache import ResponseCache
+from .compactor import OutputCompactor
 
 
 # ==========================================================
@@ -20,57 +24,114 @@ class State(TypedDict):
     question: str
     plan: Dict
     validation: bool
+    errors: List[Dict]       # validation errors of the plan ({task_id, error})
+    repair_attempts: int     # LLM repairs of the current plan (reset by task_planning)
     outputs: Dict
+    plan_versions: List      # plan as re-planned by run_plan (first entry: the validated plan)
+    response_context: Dict   # compact plan / tool outputs text for the response prompt
     response: str
+    failed: bool   # run-level failure flag, reset by every new question
 
 
 # ==========================================================
 #  WORKFLOW DEFINITION
 # ==========================================================
 class Workflow:
-    def __init__(self, base_llm, plan_structure_llm):
+    """
+    Holds only run-independent objects (LLMs, step modules, compiled graph),
+    so a single instance can serve concurrent questions. Everything that
+    belongs to one run travels with that run:
+    - run_id and the failure flag live in the graph state;
+    - the run's TraceRecorder (and through it the DB session) is passed in
+      config["configurable"]["trace"], since it must not be checkpointed.
+    """
+    def __init__(self, base_llm, plan_structure_llm, checkpointer: BaseCheckpointSaver = None,
+                 response_cache: ResponseCache = None, compactor: OutputCompactor = None):
         self.base_llm = base_llm
         self.plan_structure_llm = plan_structure_llm
-        self.db: Session | None = None
-        self.failed = False  # workflow-level failure flag
-        self.graph = self._build_workflow()
+        # Thread state between questions (bounded in memory unless configured)
+        self.checkpointer = checkpointer or create_checkpointer()
 
         # Core step modules
         self.task_planning = TaskPlanning(self.plan_structure_llm)
-        self.task_executor = TaskExecutor(self.base_llm, self.plan_structure_llm)
-        self.response = Responder(self.base_llm)
+        self.task_executor = TaskExecutor(self.base_llm, self.plan_structure_llm,
+                                          retriever=self.task_planning.retriever)
+        self.compactor = compactor or OutputCompactor()
+        self.response = Responder(self.base_llm, response_cache)
+
+        self.graph = self._build_workflow()
 
     # ------------------------------------------------------
-    #  DB setter
+    #  Per-run configuration
     # ------------------------------------------------------
-    def set_db(self, db: Session):
-        self.db = db
+    @staticmethod
+    def run_config(thread_id: str, trace: TraceRecorder) -> RunnableConfig:
+        return {"configurable": {"thread_id": str(thread_id), "trace": trace}}
 
     # ------------------------------------------------------
     #  SAFE EXECUTION WRAPPER
     # ------------------------------------------------------
-    def _safe_node_call(self, func, state: State):
+    @staticmethod
+    def _skip_failed(func, state: State) -> bool:
+        print(f"🧩 Executing node: {func.__name__}")
+        # Stop if the run has already failed
+        if state.get("failed"):
+            print("⚠️ Skipping node execution because workflow has failed previously.")
+            return True
+        return False
+
+    @staticmethod
+    def _failure_update(func, e: Exception) -> dict:
+        print(f"[Workflow] ❌ Error in {func.__name__}: {e}")
+        return {
+            "failed": True,
+            "response": "Sorry, something went wrong while processing your request.",
+            "outputs": {"error": str(e)}
+        }
+
+    def _safe_node_call(self, func, state: State, config: RunnableConfig):
         """
-        Executes a node safely. If any node fails, marks the workflow as failed,
+        Executes a node safely. If any node fails, marks the run as failed,
         returns a default response, and prevents further node execution.
         """
-        print(f"🧩 Executing node: {func.__name__}")
+        if self._skip_failed(func, state):
+            # Carry the fallback response through to the terminal node
+            return {"response": state.get("response")}
+        trace = config["configurable"]["trace"]
+        try:
+            return func(trace, state)
+        except Exception as e:
+            return self._failure_update(func, e)
+        finally:
+            # Node boundary: persist its steps and tool calls
+            trace.flush(final=False)
 
-        # Stop if workflow has already failed
-        if self.failed:
-            print("⚠️ Skipping node execution because workflow has failed previously.")
-            return state
+    async def _asafe_node_call(self, func, state: State, config: RunnableConfig):
+        """
+        Async counterpart of _safe_node_call for coroutine node functions.
+        """
+        if self._skip_failed(func, state):
+            return {"response": state.get("response")}
+        trace = config["configurable"]["trace"]
         try:
-            return func(self.db, state)
+            return await func(trace, state)
         except Exception as e:
-            print(f"[Workflow] ❌ Error in {func.__name__}: {e}")
-            self.failed = True  # mark workflow as failed
+            return self._failure_update(func, e)
+        finally:
+            await asyncio.to_thread(trace.flush, False)
 
-            # Build fallback response safely
-            if not isinstance(state.get("response"), dict):
-                state["response"] = "Sorry, something went wrong while processing your request."
-            state["outputs"] = {"error": str(e)}
-            return state
+    def _node(self, func, afunc) -> RunnableLambda:
+        """
+        Wraps a step as a graph node usable from both `stream` (sync step)
+        and `astream` (async step).
+        """
+        def node(state: State, config: RunnableConfig):
+            return self._safe_node_call(func, state, config)
+
+        async def anode(state: State, config: RunnableConfig):
+            return await self._asafe_node_call(afunc, state, config)
+
+        return RunnableLambda(node, afunc=anode, name=func.__name__)
 
     # ------------------------------------------------------
     #  WORKFLOW GRAPH
@@ -82,40 +143,32 @@ class Workflow:
         graph_builder = StateGraph(State)
 
         # Add all workflow nodes
-        graph_builder.add_node("task_planning", self._node_task_planning)
-        graph_builder.add_node("validate_plan", self._node_validate_plan)
-        graph_builder.add_node("run_plan", self._node_run_plan)
-        graph_builder.add_node("generate_response", self._node_generate_response)
-        graph_builder.add_node("direct_response", self._node_direct_response)
+        graph_builder.add_node("task_planning", self._node(
+            self.task_planning.task_planning, self.task_planning.atask_planning))
+        graph_builder.add_node("validate_plan", self._node(
+            TaskPlanning.validate_plan, TaskPlanning.avalidate_plan))
+        graph_builder.add_node("repair_plan", self._node(
+            self.task_planning.repair_plan, self.task_planning.arepair_plan))
+        graph_builder.add_node("run_plan", self._node(
+            self.task_executor.run_plan, self.task_executor.arun_plan))
+        graph_builder.add_node("compact_outputs", self._node(
+            self.compactor.compact_outputs, self.compactor.acompact_outputs))
+        graph_builder.add_node("generate_response", self._node(
+            self.response.generate_response, self.response.agenerate_response))
+        graph_builder.add_node("direct_response", self._node(
+            self.response.direct_response, self.response.adirect_response))
 
         # Define flow connections
         graph_builder.set_entry_point("task_planning")
         graph_builder.add_edge("task_planning", "validate_plan")
         graph_builder.add_conditional_edges("validate_plan", validation_router)
-        graph_builder.add_edge("run_plan", "generate_response")
+        graph_builder.add_edge("repair_plan", "validate_plan")
+        graph_builder.add_edge("run_plan", "compact_outputs")
+        graph_builder.add_edge("compact_outputs", "generate_response")
 
         # Define terminal nodes
         graph_builder.set_finish_point("generate_response")
         graph_builder.set_finish_point("direct_response")
 
-        # Add in-memory checkpoint for state persistence
-        checkpointer = InMemorySaver()
-        return graph_builder.compile(checkpointer=checkpointer)
-
-    # ------------------------------------------------------
-    #  NODE WRAPPERS
-    # ------------------------------------------------------
-    def _node_task_planning(self, state: State):
-        return self._safe_node_call(self.task_planning.task_planning, state)
-
-    def _node_validate_plan(self, state: State):
-        return self._safe_node_call(self.task_planning.validate_plan, state)
-
-    def _node_run_plan(self, state: State):
-        return self._safe_node_call(self.task_executor.run_plan, state)
-
-    def _node_generate_response(self, state: State):
-        return self._safe_node_call(self.response.generate_response, state)
-
-    def _node_direct_response(self, state: State):
-        return self._safe_node_call(self.response.direct_response, state)
+        # Thread state persistence (see checkpointer.create_checkpointer)
+        return graph_builder.compile(checkpointer=self.checkpointer)
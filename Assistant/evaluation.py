@@ -0,0 +1,215 @@
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from sqlalchemy import insert
+from sqlalchemy.orm import Session, sessionmaker
+
+from db.insert_dataset import DatasetEntry
+from crud.message import create_human_message, create_assistant_message
+from models.thread import Thread
+from models.step import Step
+from models.toolCall import ToolCall
+from models.datasetEvaluation import DatasetEvaluation
+
+EVAL_WORKERS = 4
+
+
+# ==========================================================
+#  SCORING
+# ==========================================================
+BATCH_SUFFIX = "_batch"
+
+
+def label_name(tool_name: str) -> str:
+    """Dataset label of a tool: multi-segment tools count as their single-segment tool."""
+    if tool_name.endswith(BATCH_SUFFIX):
+        return tool_name[:-len(BATCH_SUFFIX)]
+    return tool_name
+
+
+def tool_match(labels, actual) -> Dict:
+    """Labelled vs. executed tools of one question, as stored in DatasetEvaluation."""
+    labels, actual = set(labels or []), {label_name(tool) for tool in actual}
+    matched = len(actual.intersection(labels))
+    total_labels = len(labels)
+    return {
+        "labels": sorted(labels),
+        "actual_tools": sorted(actual),
+        "matched": matched,
+        "total_labels": total_labels,
+        "match_ratio": matched / total_labels if total_labels > 0 else 0,
+        "match_ratio_str": f"{matched}/{total_labels}" if total_labels > 0 else "0/0"
+    }
+
+
+def executed_tools(db: Session, run_ids: List[uuid.UUID]) -> Dict[uuid.UUID, List[str]]:
+    """
+    Distinct tools called while executing the plan of each run, for a
+    whole batch of runs in one grouped query.
+    """
+    rows = (
+        db.query(Step.run_id, ToolCall.tool_name)
+        .join(ToolCall, ToolCall.step_id == Step.id)
+        .filter(Step.run_id.in_(run_ids), Step.name == "Plan Execution")
+        .group_by(Step.run_id, ToolCall.tool_name)
+        .all()
+    )
+    tools: Dict[uuid.UUID, List[str]] = {run_id: [] for run_id in run_ids}
+    for run_id, tool_name in rows:
+        if tool_name is not None:
+            tools[run_id].append(tool_name)
+    return tools
+
+
+def save_evaluations(db: Session, thread_id: uuid.UUID, finished: List[Dict]) -> List[Dict]:
+    """
+    Scores finished entries from the tool calls of their runs and writes
+    their DatasetEvaluation rows with one bulk INSERT.
+    """
+    tools = executed_tools(db, [f["run_id"] for f in finished])
+    rows = [
+        {"thread_id": thread_id, "question": f["question"], **tool_match(f["labels"], tools[f["run_id"]])}
+        for f in finished
+    ]
+    db.execute(insert(DatasetEvaluation), rows)
+    db.commit()
+    return rows
+
+
+# ==========================================================
+#  RUNNER
+# ==========================================================
+class DatasetEvaluationRunner:
+    """
+    Runs the evaluation dataset through the agent with bounded concurrency.
+
+    Every worker uses its own DB session, and every entry its own graph
+    checkpoint key ("<thread_id>:<entry_id>"), so concurrent runs on the
+    evaluation thread never restore or overwrite each other's state.
+    Each finished entry is scored and its DatasetEvaluation row saved as
+    soon as it completes: those rows are the checkpoint. Running again on
+    the same thread skips the entries already evaluated there, so an
+    interrupted evaluation resumes where it stopped. A failing entry is
+    reported and left for the next run.
+    """
+
+    def __init__(self, agent, max_workers: int = EVAL_WORKERS,
+                 progress: Optional[Callable[[int, int, Dict], None]] = None):
+        self.agent = agent
+        self.max_workers = max_workers
+        self.progress = progress
+
+    def run(self, db: Session, user_id: uuid.UUID, name: str = "Dataset Evaluation",
+            thread_id: Optional[uuid.UUID] = None) -> Dict:
+        thread_id = self._evaluation_thread(db, user_id, name, thread_id)
+
+        done = {
+            question for (question,) in
+            db.query(DatasetEvaluation.question).filter(DatasetEvaluation.thread_id == thread_id)
+        }
+        # Plain values: ORM objects must not cross into the worker sessions
+        entries = [
+            (entry.id, entry.user_query, entry.tools_used)
+            for entry in db.query(DatasetEntry).order_by(DatasetEntry.id)
+            if entry.user_query not in done
+        ]
+        total = len(entries)
+        print(f"📦 {total} dataset entries to process ({len(done)} already evaluated).")
+
+        session_factory = sessionmaker(bind=db.get_bind(), autocommit=False, autoflush=False)
+        summary = {"thread_id": str(thread_id), "skipped": len(done), "completed": 0, "failed": []}
+        started = time.perf_counter()
+
+        finished: List[Dict] = []
+        pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ardi-eval")
+        futures = [
+            pool.submit(self._evaluate_entry, session_factory, thread_id, entry)
+            for entry in entries
+        ]
+        collected = set()
+        try:
+            for n, future in enumerate(as_completed(futures), start=1):
+                collected.add(future)
+                result = future.result()
+                if result["status"] == "completed":
+                    finished.append(result)
+                    summary["completed"] += self._checkpoint(db, thread_id, finished)
+                else:
+                    summary["failed"].append({"entry_id": result["entry_id"], "error": result["error"]})
+                self._report(n, total, result, time.perf_counter() - started)
+        finally:
+            # On interruption, drop queued entries but keep every run that finished
+            pool.shutdown(wait=True, cancel_futures=True)
+            for future in futures:
+                if future not in collected and future.done() and not future.cancelled():
+                    result = future.result()
+                    if result["status"] == "completed":
+                        finished.append(result)
+            if finished:
+                summary["completed"] += self._checkpoint(db, thread_id, finished)
+
+        summary["elapsed_s"] = round(time.perf_counter() - started, 2)
+        print(
+            f"🏁 Evaluation finished: {summary['completed']} completed, "
+            f"{len(summary['failed'])} failed, {summary['skipped']} skipped ({summary['elapsed_s']}s)"
+        )
+        return summary
+
+    @staticmethod
+    def _evaluation_thread(db: Session, user_id: uuid.UUID, name: str, thread_id: Optional[uuid.UUID]):
+        if thread_id is not None:
+            if db.get(Thread, thread_id) is None:
+                raise ValueError(f"Evaluation thread {thread_id} not found")
+            print(f"🔁 Resuming evaluation thread {thread_id}")
+            return thread_id
+
+        thread = Thread(name=name, user_id=user_id)
+        db.add(thread)
+        db.commit()
+        db.refresh(thread)
+        return thread.id
+
+    @staticmethod
+    def _checkpoint(db: Session, thread_id: uuid.UUID, finished: List[Dict]) -> int:
+        rows = save_evaluations(db, thread_id, finished)
+        matched = sum(r["matched"] for r in rows)
+        labels = sum(r["total_labels"] for r in rows)
+        print(f"💾 Checkpoint: {len(rows)} entries saved ({matched}/{labels} labelled tools matched)")
+        finished.clear()
+        return len(rows)
+
+    def _evaluate_entry(self, session_factory, thread_id: uuid.UUID, entry) -> Dict:
+        entry_id, user_query, tools_used = entry
+        db = session_factory()
+        try:
+            human_msg = create_human_message(db, thread_id=thread_id, content=user_query)
+            run_id, execution = self.agent.ask_with_run_id(
+                db, human_msg, checkpoint_key=f"{thread_id}:{entry_id}"
+            )
+            # Node errors end in a fallback answer; they must not be checkpointed
+            failure = next(
+                (u for u in execution.values() if isinstance(u, dict) and u.get("failed")), None
+            )
+            if failure is not None:
+                raise RuntimeError((failure.get("outputs") or {}).get("error", "Agent run failed"))
+
+            resp_obj = execution.get("direct_response") or execution.get("generate_response")
+            response_text = resp_obj["response"] if resp_obj else None
+            create_assistant_message(db, thread_id=thread_id, content=response_text, resp_msg_id=human_msg.id)
+            return {"status": "completed", "entry_id": entry_id, "question": user_query,
+                    "labels": tools_used, "run_id": run_id}
+        except Exception as e:
+            db.rollback()
+            return {"status": "failed", "entry_id": entry_id, "question": user_query, "error": str(e)}
+        finally:
+            db.close()
+
+    def _report(self, n: int, total: int, result: Dict, elapsed: float) -> None:
+        eta = elapsed / n * (total - n)
+        if result["status"] == "completed":
+            print(f"📊 [{n}/{total}] ✅ {result['question']} (ETA {eta:.0f}s)")
+        else:
+            print(f"📊 [{n}/{total}] ❌ {result['question']}: {result['error']} (ETA {eta:.0f}s)")
+        if self.progress is not None:
+            self.progress(n, total, result)
@@ -0,0 +1,251 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import threading
+import tracemalloc
+import numpy as np
+from collections import defaultdict
+from typing import Dict, List
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from benchmarks.synthetic_data import generate_dataset
+from benchmarks.fake_llm import FakePlanModel, FakeChatModel
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+DATASET_PATH = os.path.join(PROJECT_ROOT, "datasets/evaluation_dataset.json")
+
+_TABLE = re.compile(r"\b(?:INTO|FROM|UPDATE)\s+\"?(\w+)", re.IGNORECASE)
+
+
+# ==========================================================
+#  MEASUREMENTS
+# ==========================================================
+class Timings:
+    """Thread-safe collection of latency samples (ms) grouped by label."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def add(self, label: str, ms: float) -> None:
+        with self._lock:
+            self.samples[label].append(ms)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.samples.clear()
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {
+            label: {
+                "count": len(values),
+                "p50_ms": round(float(np.percentile(values, 50)), 3),
+                "p95_ms": round(float(np.percentile(values, 95)), 3),
+                "total_ms": round(float(np.sum(values)), 3)
+            }
+            for label, values in sorted(self.samples.items())
+        }
+
+
+def instrument_db(engine, timings: Timings) -> None:
+    """Times every statement sent to the DB, labelled '<VERB> <table>'."""
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_start"].pop()
+        table = _TABLE.search(statement)
+        label = f"{statement.split(None, 1)[0].upper()} {table.group(1) if table else ''}".strip()
+        timings.add(label, (time.perf_counter() - started) * 1000)
+
+
+def instrument_agent(agent, nodes: Timings, tools: Timings) -> None:
+    """Wraps the workflow node wrapper and the tool call to record latencies."""
+    workflow = agent.workflow
+    safe_node_call = workflow._safe_node_call
+    timed_call = workflow.task_executor._timed_call
+
+    def timed_node(func, state, config):
+        started = time.perf_counter()
+        try:
+            return safe_node_call(func, state, config)
+        finally:
+            nodes.add(func.__name__, (time.perf_counter() - started) * 1000)
+
+    def timed_tool(func, args):
+        result, started_at, ended_at = timed_call(func, args)
+        tools.add(func.__name__, (ended_at - started_at).total_seconds() * 1000)
+        return result, started_at, ended_at
+
+    workflow._safe_node_call = timed_node
+    workflow.task_executor._timed_call = timed_tool
+
+
+# ==========================================================
+#  BENCHMARK SETUP
+# ==========================================================
+def build_agent(entries: List[dict], llm_latency_ms: float):
+    from utils.utils import Settings, LLMConfig
+    from Assistant.ARDI import Agent
+
+    class BenchmarkAgent(Agent):
+        def _init_llms(self):
+            self.base_llm = FakeChatModel(llm_latency_ms)
+            self.plan_structure_llm = FakePlanModel(entries, llm_latency_ms)
+
+    settings = Settings(llm=LLMConfig(provider="fake", model_name="benchmark", temperature=0, max_tokens=0))
+    return BenchmarkAgent(settings)
+
+
+def build_db():
+    """In-memory SQLite database with the application schema and one user/thread."""
+    import models  # noqa: F401  (registers every table on Base)
+    from models.datasetEvaluation import DatasetEvaluation  # noqa: F401
+    from models.responseCache import ResponseCacheEntry  # noqa: F401
+    from db.base import Base
+    from models.user import User
+    from models.thread import Thread
+    from utils.serialization import json_serializer, loads
+
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+        json_serializer=json_serializer,
+        json_deserializer=loads
+    )
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine, autocommit=False, autoflush=False)()
+    user = User(username="benchmark", password_hash="-")
+    db.add(user)
+    db.commit()
+    thread = Thread(name="Benchmark", user_id=user.id)
+    db.add(thread)
+    db.commit()
+    return engine, db, thread
+
+
+def reset_caches(agent, db) -> None:
+    """Cold runs: every question goes through planning, every tool and the response LLM."""
+    agent.workflow.task_planning.plan_cache.clear()
+    agent.workflow.task_executor.tool_cache.clear()
+    if agent.workflow.response.response_cache is not None:
+        agent.workflow.response.response_cache.clear(db)
+
+
+# ==========================================================
+#  RUNNER
+# ==========================================================
+def run_benchmark(data_dir: str, iterations: int, llm_latency_ms: float, warm: bool, limit: int = None) -> dict:
+    from utils.data_store import reload_data_store
+    from crud.message import create_human_message
+
+    with open(DATASET_PATH, "r", encoding="utf-8") as f:
+        entries = json.load(f)[:limit]
+
+    load_started = time.perf_counter()
+    reload_data_store(data_dir)
+    load_ms = (time.perf_counter() - load_started) * 1000
+
+    engine, db, thread = build_db()
+    agent = build_agent(entries, llm_latency_ms)
+
+    nodes, tools, queries, asks = Timings(), Timings(), Timings(), Timings()
+    instrument_agent(agent, nodes, tools)
+    instrument_db(engine, queries)
+
+    def ask_all(record: bool):
+        for entry in entries:
+            message = create_human_message(db, thread.id, entry["user_query"])
+            if not warm:
+                reset_caches(agent, db)
+            started = time.perf_counter()
+            agent.ask(db, message)
+            if record:
+                asks.add("Agent.ask", (time.perf_counter() - started) * 1000)
+
+    # Warm-up pass (imports, prompt templates, lazily built indexes)
+    ask_all(record=False)
+    for timings in (nodes, tools, queries):
+        timings.clear()
+
+    for _ in range(iterations):
+        ask_all(record=True)
+    results = {
+        "questions": len(entries),
+        "iterations": iterations,
+        "llm_latency_ms": llm_latency_ms,
+        "cache": "warm" if warm else "cold",
+        "data_load_ms": round(load_ms, 3),
+        "ask": asks.summary(),
+        "nodes": nodes.summary(),
+        "tools": tools.summary(),
+        "db": queries.summary()
+    }
+
+    # Separate pass for memory: tracemalloc would distort the timings above
+    tracemalloc.start()
+    ask_all(record=False)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    results["memory"] = {
+        "tracemalloc_peak_mb": round(peak / 2**20, 2),
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 2)
+    }
+    return results
+
+
+def print_report(results: dict) -> None:
+    print(
+        f"\n📊 {results['questions']} questions x {results['iterations']} iterations | "
+        f"LLM latency {results['llm_latency_ms']} ms | {results['cache']} caches | "
+        f"data load {results['data_load_ms']} ms"
+    )
+    for section in ("ask", "nodes", "tools", "db"):
+        print(f"\n{section.upper():<40}{'count':>8}{'p50 ms':>12}{'p95 ms':>12}{'total ms':>14}")
+        for label, s in results[section].items():
+            print(f"{label:<40}{s['count']:>8}{s['p50_ms']:>12.3f}{s['p95_ms']:>12.3f}{s['total_ms']:>14.3f}")
+    memory = results["memory"]
+    print(f"\nMEMORY  tracemalloc peak {memory['tracemalloc_peak_mb']} MB | max RSS {memory['max_rss_mb']} MB\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark of the ARDI agent pipeline.")
+    parser.add_argument("--data-dir", help="Dataset folder (a synthetic one is generated when omitted)")
+    parser.add_argument("--iterations", type=int, default=3, help="Timed passes over the evaluation questions")
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N questions")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Simulated latency of every LLM call")
+    parser.add_argument("--warm", action="store_true", help="Keep plan/tool caches between questions")
+    parser.add_argument("--output", help="Also write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    data_dir = args.data_dir or generate_dataset(tempfile.mkdtemp(prefix="ardi-bench-"))
+    # Keep the report readable: the pipeline prints every step
+    stdout = sys.stdout
+    with open(os.devnull, "w") as devnull:
+        sys.stdout = devnull
+        try:
+            results = run_benchmark(data_dir, args.iterations, args.llm_latency_ms, args.warm, args.limit)
+        finally:
+            sys.stdout = stdout
+
+    print_report(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    # Usage: python -m benchmarks.agent_benchmark [--iterations 3] [--llm-latency-ms 0]
+    main()
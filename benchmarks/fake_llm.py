@@ -0,0 +1,135 @@
+import re
+import json
+import time
+import asyncio
+from typing import Dict, List, Optional
+from langchain_core.messages import AIMessage
+
+# Tools returning article ids, and where the ids sit in their output
+ARTICLE_PRODUCERS = {
+    "get_segment_engage_docs": "docs_engage",
+    "get_segment_not_engage_docs": "docs_notengage",
+    "get_segment_high_rep_docs": "high_representative_docs",
+    "get_segment_articles_by_time": "articles",
+    "get_news_topics_high_docs": None,
+    "get_news_topics_low_docs": None,
+}
+ARTICLE_CONSUMERS = {"get_articles_info", "get_top_recent_articles", "get_unique_clusters"}
+TOPIC_CONSUMERS = {"get_news_topics_info", "get_news_topics_high_docs", "get_news_topics_low_docs"}
+
+
+def _number_after(question: str, word: str, default: int) -> int:
+    match = re.search(rf"{word}\D{{0,3}}(\d+)", question, re.IGNORECASE)
+    return int(match.group(1)) if match else default
+
+
+def build_plan(question: str, tools_used: List[str], n_segments: int = 12, n_topics: int = 8) -> List[dict]:
+    """
+    Deterministic plan for a dataset question: one task per labelled tool,
+    in order, with arguments taken from the question when present and
+    article/topic ids chained from the closest earlier producer.
+    """
+    segment_id = str(_number_after(question, "segment", 0) % n_segments)
+    topic_id = _number_after(question, "topic", 0) % n_topics
+    hours = [int(h) for h in re.findall(r"(\d{1,2}):00", question)] or [6, 12]
+
+    plan, articles_from, topics_from = [], None, None
+    for i, tool in enumerate(tools_used):
+        task_id = f"t{i + 1}"
+        if tool in ARTICLE_CONSUMERS and articles_from is not None:
+            producer_id, prop = articles_from
+            ids_arg = {"key": "articles_ids", "value": f"DEP_{producer_id}"}
+            if prop:
+                ids_arg["property"] = prop
+        else:
+            ids_arg = {"key": "articles_ids", "value": json.dumps(["A000001", "A000002", "A000003"])}
+
+        if tool in TOPIC_CONSUMERS:
+            topics_arg = (
+                {"key": "topics_id", "value": f"DEP_{topics_from}"} if topics_from
+                else {"key": "topics_id", "value": json.dumps([topic_id])}
+            )
+
+        if tool == "get_segment_articles_by_time":
+            args = [
+                {"key": "segment_id", "value": segment_id},
+                {"key": "start_hour", "value": str(hours[0])},
+                {"key": "end_hour", "value": str(hours[-1] if len(hours) > 1 else (hours[0] + 6) % 24)}
+            ]
+        elif tool == "get_topic_transitions":
+            args = [{"key": "segment_id", "value": segment_id}, {"key": "top_n", "value": "5"}]
+        elif tool == "get_next_topic_prediction":
+            args = [
+                {"key": "segment_id", "value": segment_id},
+                {"key": "current_topic", "value": "Topic 0"},
+                {"key": "top_n", "value": "3"}
+            ]
+        elif tool == "get_top_recent_articles":
+            args = [ids_arg, {"key": "top", "value": "5"}]
+        elif tool in ARTICLE_CONSUMERS:
+            args = [ids_arg]
+        elif tool in TOPIC_CONSUMERS:
+            args = [topics_arg]
+        else:
+            args = [{"key": "segment_id", "value": segment_id}]
+
+        deps = sorted({a["value"][4:] for a in args if a["value"].startswith("DEP_")})
+        plan.append({"task": tool, "id": task_id, "dep": deps, "args": args})
+
+        if tool in ARTICLE_PRODUCERS:
+            articles_from = (task_id, ARTICLE_PRODUCERS[tool])
+        if tool == "get_unique_clusters":
+            topics_from = task_id
+    return plan
+
+
+def _question_from(prompt) -> Optional[str]:
+    # Planning prompts end with the human message "Question: <question>"
+    messages = getattr(prompt, "messages", None) or []
+    if messages and str(messages[-1].content).startswith("Question: "):
+        return messages[-1].content[len("Question: "):]
+    return None
+
+
+class FakePlanModel:
+    """
+    Stand-in for the structured planning LLM: returns the canned plan of
+    a known dataset question (empty plan otherwise) after a fixed latency.
+    """
+
+    def __init__(self, entries: List[dict], latency_ms: float = 0.0, n_segments: int = 12, n_topics: int = 8):
+        self.latency = latency_ms / 1000
+        self.plans: Dict[str, List[dict]] = {
+            e["user_query"]: build_plan(e["user_query"], e["tools_used"], n_segments, n_topics)
+            for e in entries
+        }
+
+    def invoke(self, prompt):
+        time.sleep(self.latency)
+        return {"plan": json.loads(json.dumps(self.plans.get(_question_from(prompt), [])))}
+
+    async def ainvoke(self, prompt):
+        await asyncio.sleep(self.latency)
+        return {"plan": json.loads(json.dumps(self.plans.get(_question_from(prompt), [])))}
+
+
+class FakeChatModel:
+    """
+    Stand-in for the base chat LLM: a short deterministic answer derived
+    from the prompt size, after a fixed latency.
+    """
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000
+
+    @staticmethod
+    def _answer(prompt) -> AIMessage:
+        return AIMessage(content=f"Benchmark answer ({len(str(prompt))} prompt characters).")
+
+    def invoke(self, prompt):
+        time.sleep(self.latency)
+        return self._answer(prompt)
+
+    async def ainvoke(self, prompt):
+        await asyncio.sleep(self.latency)
+        return self._answer(prompt)
@@ -0,0 +1,82 @@
+import sys
+import json
+import argparse
+from typing import Dict, List
+
+from benchmarks.agent_benchmark import DATASET_PATH
+
+
+# ==========================================================
+#  ROUTER PRECISION
+# ==========================================================
+def evaluate_router(entries: List[dict]) -> Dict:
+    """
+    Routes every dataset question and compares the tools of the routed
+    plans with the labelled ones. Precision counts routed questions whose
+    tool set equals the labels; coverage is the share of questions that
+    skip the planning LLM.
+    """
+    from Assistant.agent_core.intent_router import IntentRouter
+
+    router = IntentRouter()
+    rows = []
+    for entry in entries:
+        route = router.route(entry["user_query"])
+        tools = sorted({task["task"] for task in route.plan}) if route is not None else None
+        rows.append({
+            "question": entry["user_query"],
+            "labels": sorted(set(entry["tools_used"])),
+            "routed": tools,
+            "rule": route.rule if route is not None else None,
+            "correct": tools is not None and tools == sorted(set(entry["tools_used"]))
+        })
+
+    routed = [r for r in rows if r["routed"] is not None]
+    correct = sum(r["correct"] for r in routed)
+    return {
+        "questions": len(rows),
+        "routed": len(routed),
+        "correct": correct,
+        "precision": round(correct / len(routed), 4) if routed else None,
+        "coverage": round(len(routed) / len(rows), 4) if rows else None,
+        "rows": rows
+    }
+
+
+def print_report(results: Dict) -> None:
+    for row in results["rows"]:
+        if row["routed"] is None:
+            mark = "⏭️ "
+        else:
+            mark = "✅" if row["correct"] else "❌"
+        print(f"{mark} {row['question'][:80]:<80} {row['rule'] or 'LLM'}")
+    print(
+        f"\n📊 {results['routed']}/{results['questions']} routed (coverage {results['coverage']}) | "
+        f"{results['correct']} correct (precision {results['precision']})\n"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precision of the intent router on the evaluation dataset.")
+    parser.add_argument("--dataset", default=DATASET_PATH, help="Evaluation dataset (JSON list of questions)")
+    parser.add_argument("--data-dir", help="Dataset folder, for segment titles (the default data store otherwise)")
+    parser.add_argument("--min-precision", type=float, default=None, help="Exit with status 1 below this precision")
+    args = parser.parse_args(argv)
+
+    if args.data_dir:
+        from utils.data_store import reload_data_store
+        reload_data_store(args.data_dir)
+
+    with open(args.dataset, encoding="utf-8") as f:
+        entries = json.load(f)
+    results = evaluate_router(entries)
+    print_report(results)
+
+    if args.min_precision is not None and (results["precision"] or 0) < args.min_precision:
+        print(f"❌ Precision below {args.min_precision}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    # Usage: python -m benchmarks.router_precision [--min-precision 1.0]
+    main()
@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+import pickle as pkl
+import numpy as np
+import pandas as pd
+
+DAY_PARTS = ["morning", "afternoon", "evening", "night"]
+
+
+def generate_dataset(
+    path: str,
+    n_segments: int = 12,
+    n_events: int = 5000,
+    n_articles: int = 3000,
+    n_topics: int = 8,
+    seed: int = 0
+) -> str:
+    """
+    Writes a synthetic dataset with the same layout as the real data folder
+    (user_segments_viz.pkl, news_topics.pkl, news_viz2.json), so the data
+    store and every tool can run without the production files.
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(path, exist_ok=True)
+    article_ids = [f"A{i:06d}" for i in range(n_articles)]
+    topics = [f"Topic {i}" for i in range(n_topics)]
+
+    # User segments: one event log per segment plus its descriptive fields
+    segments = {}
+    for s in range(n_segments):
+        event_time = pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 30 * 86400, n_events), unit="s")
+        df = pd.DataFrame({
+            "id": rng.choice(article_ids, n_events),
+            "event_time": event_time,
+            "event_date": event_time.normalize(),
+            "user_pseudo_id": rng.integers(0, n_events // 3, n_events).astype(str),
+            "session_id_unique": rng.integers(0, n_events, n_events).astype(str),
+            "true_engagement": rng.random(n_events) > 0.4,
+            "avg_scroll_depth": rng.random(n_events),
+            "avg_engaged_secs": rng.integers(1, 300, n_events).astype(float),
+            "avg_words_per_minute": rng.normal(250, 40, n_events),
+            "event_on_day_part": rng.choice(DAY_PARTS, n_events),
+            "event_on_weekend": event_time.dayofweek >= 5,
+            "diff": rng.integers(0, 3600, n_events).astype(float),
+        })
+        transitions = rng.random((n_topics + 1, n_topics + 1))
+        transitions = transitions / transitions.sum(1, keepdims=True)
+        labels = topics + ["end"]
+        segments[s] = {
+            "title": f"Segment {s} title",
+            "desc": f"Segment {s} description",
+            "docs_engaged": np.array(rng.choice(article_ids, 30)),
+            "docs_notengaged": np.array(rng.choice(article_ids, 30)),
+            "high_docs": np.array(rng.choice(article_ids, 15)),
+            "low_docs": np.array(rng.choice(article_ids, 15)),
+            "df": df,
+            "regions": {f"Region {r}": int(rng.integers(10, 1000)) for r in range(7)},
+            "user_type_cnt": {"frequent": int(rng.integers(100, 1000)), "nonfrequent": int(rng.integers(100, 1000))},
+            "seq_model": {"df": pd.DataFrame(transitions, index=labels, columns=labels)},
+            "regions_desc": "regions",
+        }
+    with open(os.path.join(path, "user_segments_viz.pkl"), "wb") as f:
+        pkl.dump(segments, f)
+
+    # News topics
+    news_topics = {
+        i: {
+            "title": topics[i],
+            "desc": f"{topics[i]} description",
+            "high_docs": np.array(rng.choice(article_ids, 10)),
+            "low_docs": np.array(rng.choice(article_ids, 10))
+        }
+        for i in range(n_topics)
+    }
+    with open(os.path.join(path, "news_topics.pkl"), "wb") as f:
+        pkl.dump(news_topics, f)
+
+    # Raw articles, column oriented with the article id as inner key
+    published = pd.Timestamp("2023-06-01").value // 10**6 + rng.integers(0, 200 * 86400 * 1000, n_articles)
+    raw = {"title": {}, "teaserText": {}, "first_publication_date": {}, "clusters": {}}
+    for i, article_id in enumerate(article_ids):
+        raw["title"][article_id] = f"Title {article_id}"
+        raw["teaserText"][article_id] = f"Teaser {article_id}"
+        raw["first_publication_date"][article_id] = int(published[i])
+        raw["clusters"][article_id] = sorted(set(rng.integers(0, n_topics, 2).tolist()))
+    with open(os.path.join(path, "news_viz2.json"), "w", encoding="utf-8") as f:
+        json.dump(raw, f)
+
+    return path
+
+
+if __name__ == "__main__":
+    # Usage: python -m benchmarks.synthetic_data <output_dir>
+    print(f"✅ Synthetic dataset written to {generate_dataset(sys.argv[1])}")
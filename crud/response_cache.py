@@ -0,0 +1,58 @@
+from typing import Dict, Optional
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete, update, bindparam
+from sqlalchemy.orm import Session
+from models.responseCache import ResponseCacheEntry
+
+
+def get_cached_response(db: Session, key: str, ttl_s: float) -> Optional[str]:
+    """
+    Returns the cached answer for a key, or None when it is missing or
+    older than the TTL. Read-only: expired rows are left to
+    evict_cached_responses and hits are recorded by the caller.
+    """
+    row = db.execute(
+        select(ResponseCacheEntry.response, ResponseCacheEntry.created_at)
+        .where(ResponseCacheEntry.key == key)
+    ).first()
+    if row is None or row.created_at < datetime.utcnow() - timedelta(seconds=ttl_s):
+        return None
+    return row.response
+
+
+def save_cached_response(db: Session, key: str, response: str) -> None:
+    """Stores (or refreshes) an answer."""
+    now = datetime.utcnow()
+    db.merge(ResponseCacheEntry(key=key, response=response, hits=0, created_at=now, last_used_at=now))
+    db.commit()
+
+
+def evict_cached_responses(db: Session, ttl_s: float, max_entries: int, hits: Dict[str, int]) -> None:
+    """
+    Batched maintenance: records the hits collected since the last run
+    (count and last use), then deletes expired entries and the least
+    recently used ones beyond max_entries, in one transaction.
+    """
+    now = datetime.utcnow()
+    table = ResponseCacheEntry.__table__
+    if hits:
+        db.execute(
+            update(table)
+            .where(table.c.key == bindparam("k"))
+            .values(hits=table.c.hits + bindparam("n"), last_used_at=now),
+            [{"k": key, "n": n} for key, n in hits.items()]
+        )
+    db.execute(delete(table).where(table.c.created_at < now - timedelta(seconds=ttl_s)))
+    overflow = (
+        select(table.c.key)
+        .order_by(table.c.last_used_at.desc())
+        .offset(max_entries)
+    )
+    db.execute(delete(table).where(table.c.key.in_(overflow)))
+    db.commit()
+
+
+def clear_cached_responses(db: Session) -> int:
+    deleted = db.query(ResponseCacheEntry).delete()
+    db.commit()
+    return deleted
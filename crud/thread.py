@@ -1,12 +1,17 @@
-import json
 import uuid
+from datetime import datetime, timezone
+from typing import Optional
 from models.thread import Thread
 from models.message import Message
 from models.step import Step
 from models.run import Run
 from fastapi import HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session, selectinload
 from models.datasetEvaluation import DatasetEvaluation
+from models.graphCheckpoint import GraphCheckpoint, GraphCheckpointWrite
+
+HISTORY_PAGE_SIZE = 50
 
 
 def get_dataset_evaluations(db: Session):
@@ -66,8 +71,21 @@ def load_threads(
 def load_thread_messages(
     db: Session,
     thread_id: uuid.UUID,
-    user_id: uuid.UUID
+    user_id: uuid.UUID,
+    before: Optional[int] = None,
+    limit: int = HISTORY_PAGE_SIZE,
+    before_id: Optional[uuid.UUID] = None
 ):
+    """
+    Returns one page of a thread's messages in chronological order.
+    The client pages backwards by passing the oldest message it has as
+    the cursor: `before_id` (its id) selects the messages ordered before
+    it on (created_at, id), so messages sharing its timestamp are not
+    skipped. `before` alone (its timestamp in ms, UTC) is still accepted
+    and returns the messages created strictly before that millisecond.
+    Runs and their "Plan Execution" steps are eager-loaded with two
+    set-based queries instead of two queries per message.
+    """
     # Validate thread ownership
     thread = (
         db.query(Thread)
@@ -78,50 +96,64 @@ def load_thread_messages(
     if not thread:
         raise HTTPException(status_code=404, detail="Thread not found or not owned by this user")
 
-    # Load messages ordered by created_at ASC
-    messages = (
+    # Load the newest `limit` messages before the cursor, with their runs
+    # and plan execution steps in one round trip each
+    query = (
         db.query(Message)
         .filter(Message.thread_id == thread_id)
-        .order_by(Message.created_at.asc())
+        .options(
+            selectinload(Message.run)
+            .selectinload(Run.steps.and_(Step.name == "Plan Execution"))
+        )
+    )
+    if before_id is not None:
+        # Keyset cursor: the exact (created_at, id) of the cursor message
+        cursor = (
+            db.query(Message.created_at)
+            .filter(Message.id == before_id, Message.thread_id == thread_id)
+            .scalar()
+        )
+        if cursor is None:
+            raise HTTPException(status_code=404, detail="Cursor message not found in this thread")
+        query = query.filter(or_(
+            Message.created_at < cursor,
+            and_(Message.created_at == cursor, Message.id < before_id)
+        ))
+    elif before is not None:
+        # created_at is written as naive UTC (datetime.utcnow)
+        cutoff = datetime.fromtimestamp(before / 1000, tz=timezone.utc).replace(tzinfo=None)
+        query = query.filter(Message.created_at < cutoff)
+
+    messages = (
+        query
+        .order_by(Message.created_at.desc(), Message.id.desc())
+        .limit(limit)
         .all()
     )
+    messages.reverse()
 
     enriched_messages = []
 
     for msg in messages:
         outputs_ref = []
-        run = (
-            db.query(Run)
-            .filter(Run.message_id == msg.id)
-            .first()
-        )
-
-        if run:
-            plan_execution = (
-                db.query(Step)
-                .filter(Step.run_id == run.id, Step.name == "Plan Execution")
-                .order_by(Step.created_at.desc())
-                .first()
-            )   
-            if plan_execution: 
-                print("Plan")
-                try:
-                    print(plan_execution.output)
-                    output_dict = plan_execution.output or {}
-                    outputs = output_dict.get("outputs", [])
-                    for output in outputs:
-                        outputs_ref.append(outputs[output])
-                except (ValueError, TypeError):
-                    outputs = []
-
-
+        run = msg.run
+
+        if run and run.steps:
+            plan_execution = max(run.steps, key=lambda s: s.created_at)
+            try:
+                output_dict = plan_execution.output or {}
+                outputs = output_dict.get("outputs", [])
+                for output in outputs:
+                    outputs_ref.append(outputs[output])
+            except (ValueError, TypeError, AttributeError):
+                outputs_ref = []
 
         enriched_messages.append({
             "id": msg.id,
             "role": msg.role,
             "content": msg.content,
             "response_to": msg.response_to,
-            "timestamp": int(msg.created_at.timestamp() * 1000),
+            "timestamp": int(msg.created_at.replace(tzinfo=timezone.utc).timestamp() * 1000),
             "outputs": outputs_ref
         })
 
@@ -167,7 +199,13 @@ def remove_thread(
             detail="Thread not found or not owned by this user"
         )
 
-    # Delete thread (cascade handles messages/runs/steps/tool_calls)
+    # Delete thread (cascade handles messages/runs/steps/tool_calls);
+    # saved graph state is keyed by the thread id, or "<thread_id>:<entry_id>"
+    # for the runs of a dataset evaluation
+    for model in (GraphCheckpointWrite, GraphCheckpoint):
+        db.query(model).filter(
+            or_(model.thread_id == str(thread_id), model.thread_id.like(f"{thread_id}:%"))
+        ).delete(synchronize_session=False)
     db.delete(thread)
     db.commit()
 
@@ -0,0 +1,196 @@
+import os
+import uuid
+from datetime import datetime
+from typing import Dict, List
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+from models.step import Step
+from models.toolCall import ToolCall
+from utils.serialization import dumps
+
+FALLBACK_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../logs/trace_fallback.jsonl")
+
+
+class TraceRecorder:
+    """
+    Run-scoped recorder for Step and ToolCall rows.
+
+    Mirrors the create/update helpers of crud.step and crud.tool, but keeps
+    the rows in memory while the agent is working and writes them with bulk
+    INSERT/UPDATE statements on flush(), so the workflow does not pay a
+    commit + refresh round trip for every step and tool call. The workflow
+    flushes after every node and the run flushes once more when it ends.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self._steps: Dict[uuid.UUID, Step] = {}
+        self._tool_calls: Dict[uuid.UUID, ToolCall] = {}
+        self._inserted: set = set()
+        self._dirty: set = set()
+
+    # ------------------------------------------------------
+    #  STEPS
+    # ------------------------------------------------------
+    def create_step(
+        self,
+        run_id: uuid.UUID,
+        name: str,
+        input_data: dict,
+        status: str = "started"
+    ) -> Step:
+        """
+        Buffers a new Step linked to a Run. The id is assigned client-side
+        so it can be referenced before the row reaches the DB.
+        """
+        step = Step(
+            id=uuid.uuid4(),
+            run_id=run_id,
+            name=name,
+            input=input_data,
+            output=None,
+            status=status,
+            created_at=datetime.utcnow(),
+        )
+        self._steps[step.id] = step
+        return step
+
+    def update_step(
+        self,
+        step_id: uuid.UUID,
+        status: str = None,
+        output_data: dict = None
+    ) -> Step:
+        """
+        Updates a buffered step: status, output data, or both.
+        """
+        step = self._steps.get(step_id)
+        if step is None:
+            raise ValueError(f"Step with ID {step_id} not found")
+
+        if status is not None:
+            step.status = status
+
+        if output_data is not None:
+            step.output = output_data
+
+        self._dirty.add(step_id)
+        return step
+
+    # ------------------------------------------------------
+    #  TOOL CALLS
+    # ------------------------------------------------------
+    def create_tool_call(
+        self,
+        step_id: uuid.UUID,
+        tool_name: str,
+        input_data: dict,
+        meta: dict | None = None,
+    ) -> ToolCall:
+        """
+        Buffers a new ToolCall linked to a Step.
+        """
+        tool_call = ToolCall(
+            id=uuid.uuid4(),
+            step_id=step_id,
+            tool_name=tool_name,
+            input=input_data,
+            output=None,
+            status="success",
+            error_message=None,
+            started_at=datetime.utcnow(),
+            ended_at=None,
+            meta=meta or {},
+        )
+        self._tool_calls[tool_call.id] = tool_call
+        return tool_call
+
+    def update_tool_call(
+        self,
+        tool_call_id: uuid.UUID,
+        status: str,
+        output_data: dict | None = None,
+        error_message: str | None = None
+    ) -> ToolCall:
+        """
+        Updates a buffered ToolCall with output or error information.
+        Sets ended_at automatically.
+        """
+        tool_call = self._tool_calls.get(tool_call_id)
+        if tool_call is None:
+            raise ValueError(f"ToolCall with ID {tool_call_id} not found")
+
+        tool_call.status = status              # "success", "error" or "cancelled"
+        tool_call.ended_at = datetime.utcnow()
+
+        if output_data is not None:
+            tool_call.output = output_data
+
+        if error_message is not None:
+            tool_call.error_message = error_message
+
+        self._dirty.add(tool_call_id)
+        return tool_call
+
+    def cancel_tool_calls(self, tool_call_ids: List[uuid.UUID], reason: str) -> None:
+        """
+        Marks buffered ToolCalls abandoned before finishing as "cancelled"
+        (with ended_at); they are written by the next flush's bulk update.
+        """
+        for tool_call_id in tool_call_ids:
+            self.update_tool_call(tool_call_id, status="cancelled", error_message=reason)
+
+    # ------------------------------------------------------
+    #  PERSISTENCE
+    # ------------------------------------------------------
+    @staticmethod
+    def _row(obj) -> dict:
+        return {c.key: getattr(obj, c.key) for c in obj.__table__.columns}
+
+    def _pending(self, rows: Dict[uuid.UUID, object]):
+        new = [self._row(o) for k, o in rows.items() if k not in self._inserted]
+        changed = [self._row(o) for k, o in rows.items() if k in self._inserted and k in self._dirty]
+        return new, changed
+
+    def flush(self, final: bool = True) -> None:
+        """
+        Writes everything recorded since the last flush in one transaction:
+        bulk INSERT for new rows, bulk UPDATE (by primary key) for rows that
+        changed after being written. Steps go first so tool calls can
+        reference them. Rows only count as written once the commit succeeds.
+        If the DB rejects the batch, the rows stay pending for the next
+        flush; on the final one they are appended to a local JSONL file
+        instead of being lost, and the agent answer is still returned.
+        """
+        new_steps, changed_steps = self._pending(self._steps)
+        new_calls, changed_calls = self._pending(self._tool_calls)
+        if not (new_steps or changed_steps or new_calls or changed_calls):
+            return
+
+        try:
+            if new_steps:
+                self.db.execute(insert(Step), new_steps)
+            if new_calls:
+                self.db.execute(insert(ToolCall), new_calls)
+            if changed_steps:
+                self.db.execute(update(Step), changed_steps)
+            if changed_calls:
+                self.db.execute(update(ToolCall), changed_calls)
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            if not final:
+                print(f"⚠️ Trace flush failed, retrying with the next one: {e}")
+                return
+            print(f"⚠️ Trace flush failed, writing rows to {FALLBACK_LOG}: {e}")
+            self._write_fallback(new_steps + changed_steps, new_calls + changed_calls)
+        self._inserted.update(self._steps.keys(), self._tool_calls.keys())
+        self._dirty.clear()
+
+    @staticmethod
+    def _write_fallback(steps: List[dict], tool_calls: List[dict]) -> None:
+        os.makedirs(os.path.dirname(FALLBACK_LOG), exist_ok=True)
+        with open(FALLBACK_LOG, "a", encoding="utf-8") as f:
+            for table, rows in (("steps", steps), ("tool_calls", tool_calls)):
+                for row in rows:
+                    f.write(dumps({"table": table, "row": row}).decode("utf-8") + "\n")
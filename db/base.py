@@ -1,8 +1,11 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from utils.serialization import json_serializer, loads
 
 DATABASE_URL = "postgresql://joseandres:@localhost/ardi_dev"
 
-engine = create_engine(DATABASE_URL)
+# JSON columns are written with the shared serializer, which embeds the
+# already serialized tool outputs as-is
+engine = create_engine(DATABASE_URL, json_serializer=json_serializer, json_deserializer=loads)
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 Base = declarative_base()
@@ -14,7 +14,14 @@ from models.step import Step
 from models.message import Message
 from models.toolCall import ToolCall
 from models.datasetEvaluation import DatasetEvaluation
+from models.graphCheckpoint import GraphCheckpoint, GraphCheckpointWrite
+from models.responseCache import ResponseCacheEntry
 
 print("Creating database tables...")
 Base.metadata.create_all(bind=engine)
+
+# create_all skips the indexes of tables that already exist
+for table in Base.metadata.sorted_tables:
+    for index in table.indexes:
+        index.create(bind=engine, checkfirst=True)
 print("Done.")
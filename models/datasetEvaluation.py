@@ -10,7 +10,7 @@ class DatasetEvaluation(Base):
     __tablename__ = "dataset_evaluations"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    thread_id = Column(UUID(as_uuid=True), ForeignKey("threads.id", ondelete="CASCADE"), nullable=False)
+    thread_id = Column(UUID(as_uuid=True), ForeignKey("threads.id", ondelete="CASCADE"), nullable=False, index=True)
     question = Column(String, nullable=False)
     labels = Column(JSON, nullable=False)       
     actual_tools = Column(JSON, nullable=False) 
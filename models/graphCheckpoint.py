@@ -0,0 +1,37 @@
+from sqlalchemy import Column, String, Integer, DateTime, LargeBinary
+from db.base import Base
+from datetime import datetime
+
+# ----------------------------------------
+# GRAPH CHECKPOINT (Latest LangGraph state of a thread)
+# ----------------------------------------
+class GraphCheckpoint(Base):
+    __tablename__ = "graph_checkpoints"
+
+    # Only the latest checkpoint of each thread is kept
+    thread_id = Column(String, primary_key=True)
+    checkpoint_ns = Column(String, primary_key=True, default="")
+    checkpoint_id = Column(String, nullable=False)
+    parent_checkpoint_id = Column(String, nullable=True)
+    type = Column(String, nullable=False)
+    checkpoint = Column(LargeBinary, nullable=False)     # zlib-compressed serde payload
+    meta_type = Column(String, nullable=False)
+    meta = Column(LargeBinary, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+# ----------------------------------------
+# GRAPH CHECKPOINT WRITE (Pending writes of the latest checkpoint)
+# ----------------------------------------
+class GraphCheckpointWrite(Base):
+    __tablename__ = "graph_checkpoint_writes"
+
+    thread_id = Column(String, primary_key=True)
+    checkpoint_ns = Column(String, primary_key=True, default="")
+    checkpoint_id = Column(String, primary_key=True)
+    task_id = Column(String, primary_key=True)
+    idx = Column(Integer, primary_key=True)
+    channel = Column(String, nullable=False)
+    type = Column(String, nullable=False)
+    value = Column(LargeBinary, nullable=False)
+    task_path = Column(String, default="")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, Text
+from sqlalchemy import Column, String, DateTime, ForeignKey, Text, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from db.base import Base
@@ -10,6 +10,10 @@ from datetime import datetime
 # ----------------------------------------
 class Message(Base):
     __tablename__ = "messages"
+    # Backs the history keyset cursor (thread, created_at, id)
+    __table_args__ = (
+        Index("ix_messages_thread_created_id", "thread_id", "created_at", "id"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     thread_id = Column(UUID(as_uuid=True), ForeignKey("threads.id", ondelete="CASCADE"))
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, String, Integer, DateTime, Text
+from db.base import Base
+from datetime import datetime
+
+# ----------------------------------------
+# RESPONSE CACHE (Generated answers by prompt fingerprint)
+# ----------------------------------------
+class ResponseCacheEntry(Base):
+    __tablename__ = "response_cache"
+
+    # sha256 of question, tool outputs, response prompt and model config
+    key = Column(String(64), primary_key=True)
+    response = Column(Text, nullable=False)
+    hits = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    last_used_at = Column(DateTime, default=datetime.utcnow, index=True)
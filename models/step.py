@@ -12,7 +12,7 @@ class Step(Base):
     __tablename__ = "steps"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    run_id = Column(UUID(as_uuid=True), ForeignKey("runs.id", ondelete="CASCADE"))
+    run_id = Column(UUID(as_uuid=True), ForeignKey("runs.id", ondelete="CASCADE"), index=True)
     name = Column(String)
     input = Column(JSON)
     output = Column(JSON)
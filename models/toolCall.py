@@ -12,7 +12,7 @@ class ToolCall(Base):
     __tablename__ = "tool_calls"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    step_id = Column(UUID(as_uuid=True), ForeignKey("steps.id", ondelete="CASCADE"))
+    step_id = Column(UUID(as_uuid=True), ForeignKey("steps.id", ondelete="CASCADE"), index=True)
     tool_name = Column(String)
     input = Column(JSON)
     output = Column(JSON)
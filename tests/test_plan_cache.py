@@ -0,0 +1,53 @@
+from Assistant.agent_core.plan_cache import PlanCache, question_anchors
+
+ENGAGE = "Show the list of most popular articles among users that engage with the recommendations of segment 3 in the last weeks"
+NOT_ENGAGE = "Show the list of most popular articles among users that do not engage with the recommendations of segment 3 in the last weeks"
+
+
+def _plan(tool):
+    return [{"task": tool, "id": "docs_1", "dep": [], "args": [{"key": "segment_id", "value": "3"}]}]
+
+
+def _cache():
+    cache = PlanCache()
+    cache.set_fingerprint("test")
+    return cache
+
+
+def test_negation_is_an_anchor():
+    assert question_anchors(ENGAGE) != question_anchors(NOT_ENGAGE)
+    assert question_anchors(NOT_ENGAGE) == question_anchors(NOT_ENGAGE.replace("do not", "don't"))
+
+
+def test_negation_mismatch_is_never_a_hit():
+    cache = _cache()
+    cache.put(ENGAGE, _plan("get_segment_engage_docs"))
+    assert cache.get(NOT_ENGAGE) is None
+
+    cache = _cache()
+    cache.put(NOT_ENGAGE, _plan("get_segment_not_engage_docs"))
+    assert cache.get(ENGAGE) is None
+
+
+def test_similar_question_with_same_negation_hits():
+    cache = _cache()
+    cache.put(NOT_ENGAGE, _plan("get_segment_not_engage_docs"))
+    hit = cache.get(NOT_ENGAGE.replace("the last weeks", "the last few weeks"))
+    assert hit is not None and hit[0][0]["task"] == "get_segment_not_engage_docs"
+
+
+MORNING = "Which articles are read by the frequent users of segment 3 in the morning compared with the rest of their usual daily reading habits and interests"
+POPULAR = "Show the list of most popular articles among the frequent users of segment 3 together with their usual reading habits and interests"
+
+
+def test_day_part_mismatch_is_never_a_hit():
+    cache = _cache()
+    cache.put(MORNING, _plan("get_segment_articles_by_time"))
+    assert cache.get(MORNING.replace("morning", "evening")) is None
+
+
+def test_superlative_mismatch_is_never_a_hit():
+    cache = _cache()
+    cache.put(POPULAR, _plan("get_segment_engage_docs"))
+    assert cache.get(POPULAR.replace("most popular", "least popular")) is None
+    assert cache.get(POPULAR.replace("most popular", "top popular")) is None
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterable, List, Tuple
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class ArticleStore:
+    """
+    Read-only, id-indexed view of the raw articles (`news_raw`).
+
+    Built once per data snapshot:
+    - id -> row positions, so a lookup costs O(k) for k ids instead of an
+      `isin` scan over every article;
+    - publication dates parsed (epoch ms) and formatted once;
+    - a rank of every article in publication-date order (secondary index);
+    - the cluster ids of every article as a tuple.
+    Results keep the row order of `news_raw`, as the original filters did.
+    """
+
+    def __init__(self, news_raw: pd.DataFrame):
+        self.news_raw = news_raw
+
+        positions: Dict[object, List[int]] = {}
+        for pos, article_id in enumerate(news_raw["id"].tolist()):
+            positions.setdefault(article_id, []).append(pos)
+        self.positions = positions
+
+        # Formatted once; unparsable dates stay missing as before
+        published = pd.to_datetime(news_raw["first_publication_date"], unit="ms", errors="coerce")
+        formatted = published.dt.strftime(DATE_FORMAT)
+        self.table = news_raw[["id", "title", "teaserText"]].assign(first_publication_date=formatted)
+
+        # Date rank over the formatted value (the resolution the tools sort on);
+        # -1 marks a missing date so it sorts last
+        codes, _ = pd.factorize(formatted, sort=True)
+        self.date_rank = codes
+
+        self.clusters: List[Tuple] = [self._cluster_tuple(c) for c in news_raw["clusters"].tolist()]
+
+    @staticmethod
+    def _cluster_tuple(value) -> Tuple:
+        if value is None or (isinstance(value, float) and np.isnan(value)):
+            return ()
+        return tuple(value)
+
+    def lookup(self, articles_ids: Iterable) -> np.ndarray:
+        """Row positions of the given ids (duplicates and unknown ids ignored), in table order."""
+        if not pd.api.types.is_list_like(articles_ids):
+            raise TypeError(
+                f"only list-like objects are allowed to be passed to isin(), you passed a `{type(articles_ids).__name__}`"
+            )
+        found = set()
+        for article_id in articles_ids:
+            try:
+                found.update(self.positions.get(article_id, ()))
+            except TypeError:
+                # Unhashable values can never match an id
+                continue
+        return np.array(sorted(found), dtype=np.int64)
+
+    # ------------------------------------------------------
+    #  QUERIES
+    # ------------------------------------------------------
+    def info(self, articles_ids: Iterable) -> pd.DataFrame:
+        """id, title, teaser and formatted publication date of the given articles."""
+        return self.table.iloc[self.lookup(articles_ids)].copy()
+
+    def most_recent(self, articles_ids: Iterable, top: int) -> pd.DataFrame:
+        """
+        The given articles, newest first (missing dates last, ties in
+        table order), limited to `top`.
+        """
+        pos = self.lookup(articles_ids)
+        order = np.argsort(-self.date_rank[pos], kind="stable")
+        cols = ["title", "teaserText", "first_publication_date"]
+        return self.table.iloc[pos[order]][cols].head(top)
+
+    def unique_clusters(self, articles_ids: Iterable) -> List:
+        """Sorted distinct cluster ids over the given articles."""
+        clusters = set()
+        for pos in self.lookup(articles_ids):
+            clusters.update(self.clusters[pos])
+        return sorted(clusters)
@@ -0,0 +1,111 @@
+import os
+import json
+import threading
+import pickle as pkl
+import pandas as pd
+from typing import Callable, List, Optional
+from utils.segment_aggregates import build_segment_aggregates, load_segment_aggregates
+from utils.article_store import ArticleStore
+from utils.topic_transitions import TopicTransitions
+from utils.segment_columns import has_columnar_segments, load_columnar_segments
+
+
+PROJECT_ROOT = os.path.abspath(os.getcwd())
+DATA_PATH = os.path.join(PROJECT_ROOT, "data/")
+
+
+class DataStore:
+    """
+    Read-only snapshot of the analytical datasets (user segments, news topics
+    and raw articles). One instance is shared by the whole process; consumers
+    must never mutate the frames it exposes. A reload builds a new snapshot
+    instead of modifying the current one.
+    """
+
+    def __init__(self, data_path: str = DATA_PATH, version: int = 1):
+        self.data_path = data_path
+        self.version = version
+
+        # Load the user segment data: event tables are memory mapped from
+        # the columnar copy when it exists (python -m utils.segment_columns)
+        if has_columnar_segments(data_path):
+            segments = load_columnar_segments(data_path)
+        else:
+            with open(os.path.join(data_path, "user_segments_viz.pkl"), "rb") as f:
+                segments = pkl.load(f)
+        self.user_segments = pd.DataFrame.from_dict(segments, orient="index").reset_index()
+        self.user_segments.rename(columns={'index': 'id'}, inplace=True)
+
+        # Per-segment aggregates used by the segment tools: read from the
+        # offline sidecar when it matches the pickle, computed once otherwise
+        self.segment_aggregates = (
+            load_segment_aggregates(data_path)
+            or build_segment_aggregates(self.user_segments)
+        )
+
+        # Transition matrices of every segment, stacked once for ranking
+        self.topic_transitions = TopicTransitions(self.user_segments)
+
+        # Load news topics data
+        with open(os.path.join(data_path, "news_topics.pkl"), "rb") as f:
+            topics = pkl.load(f)
+        if isinstance(topics, pd.DataFrame):
+            self.news_topics = topics.reset_index()
+        else:
+            self.news_topics = pd.DataFrame.from_dict(topics, orient="index").reset_index()
+        self.news_topics.rename(columns={'index': 'id'}, inplace=True)
+
+        # Load the raw news articles data
+        with open(os.path.join(data_path, "news_viz2.json"), "r", encoding="utf-8") as f:
+            self.news_raw = pd.DataFrame(json.load(f)).reset_index()
+        self.news_raw.rename(columns={'index': 'id'}, inplace=True)
+
+        # Id-indexed article lookups (dates and clusters prepared once)
+        self.articles = ArticleStore(self.news_raw)
+
+
+# ==========================================================
+#  PROCESS-WIDE STORE
+# ==========================================================
+_store: Optional[DataStore] = None
+_store_lock = threading.Lock()
+_reload_hooks: List[Callable[[DataStore], None]] = []
+
+
+def get_data_store() -> DataStore:
+    """
+    Returns the process-wide data store, loading it on first use.
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = DataStore()
+    return _store
+
+
+def reload_data_store(data_path: Optional[str] = None) -> DataStore:
+    """
+    Re-reads the datasets from disk and swaps the shared snapshot.
+    Readers holding the previous snapshot keep a consistent view of it;
+    registered reload hooks are notified with the new store.
+    """
+    global _store
+    with _store_lock:
+        previous = _store
+        _store = DataStore(
+            data_path=data_path or (previous.data_path if previous else DATA_PATH),
+            version=(previous.version + 1) if previous else 1
+        )
+        store = _store
+    for hook in list(_reload_hooks):
+        hook(store)
+    return store
+
+
+def on_data_store_reload(hook: Callable[[DataStore], None]) -> Callable[[DataStore], None]:
+    """
+    Registers a callback invoked after every reload (usable as a decorator).
+    """
+    _reload_hooks.append(hook)
+    return hook
@@ -0,0 +1,194 @@
+import os
+import sys
+import pickle as pkl
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Optional
+from utils.segment_columns import columnar_meta_path
+
+AGGREGATES_FILE = "segment_aggregates.pkl"
+SEGMENTS_FILE = "user_segments_viz.pkl"
+DAY_PARTS = ["morning", "afternoon", "evening", "night"]
+
+
+# ==========================================================
+#  PER-SEGMENT AGGREGATIONS
+# ==========================================================
+def engagement_stats(df: pd.DataFrame) -> Dict[str, Any]:
+    """Engagement means/medians over the engaged events of a segment."""
+    df = df[df["true_engagement"] == True]
+    return {
+        "avg_scroll_depth": round(float(df["avg_scroll_depth"].mean()), 2),
+        "avg_engaged_secs": round(float(df["avg_engaged_secs"].mean()), 2),
+        "avg_words_per_minute": round(float(df["avg_words_per_minute"].mean()), 2),
+        "median_engaged_secs": round(float(df["avg_engaged_secs"].median()), 2),
+        "engagement_rate": round(len(df[df["true_engagement"] == True]) / len(df), 3)
+    }
+
+
+def time_activity(df: pd.DataFrame) -> Dict[str, Any]:
+    """Hourly read histogram of a segment and its peak hour."""
+    if "time_bin" in df.columns:
+        activity = df.groupby("time_bin").size().reset_index(name="reads")
+        activity = activity.rename(columns={"time_bin": "hour"})
+        try:
+            activity["hour_order"] = activity["hour"].str.slice(0, 2).astype(int)
+            activity = activity.sort_values("hour_order")
+        except Exception:
+            pass
+        activity_list = [
+            {"hour": str(h), "reads": int(r)}
+            for h, r in zip(activity["hour"], activity["reads"])
+        ]
+    elif "event_time" in df.columns:
+        hours = df["event_time"].dt.hour.dropna().to_numpy(dtype=np.int64)
+        counts = np.bincount(hours, minlength=24)
+        activity_list = [
+            {"hour": f"{h:02}:00-{h:02}:59", "reads": int(c)}
+            for h, c in enumerate(counts) if c > 0
+        ]
+    else:
+        raise ValueError("Expected a 'time_bin' or 'event_time' column in the dataframe.")
+
+    # Identify the peak activity time (first hour holding the maximum)
+    peak = max(activity_list, key=lambda x: x["reads"])
+    return {
+        "activity_by_hour": activity_list,
+        "peak_activity": peak["hour"],
+        "peak_value": peak["reads"]
+    }
+
+
+def day_part_activity(df: pd.DataFrame) -> Dict[str, Any]:
+    """Reads per day part (morning, afternoon, evening, night) and the peak part."""
+    if "event_on_day_part" not in df.columns:
+        raise ValueError("The dataframe must contain an 'event_on_day_part' column.")
+    day_part_counts = df["event_on_day_part"].value_counts().to_dict()
+    activity_by_day_part = {part: int(day_part_counts.get(part, 0)) for part in DAY_PARTS}
+    peak_day_part = max(activity_by_day_part, key=activity_by_day_part.get)
+    return {
+        "activity_by_day_part": activity_by_day_part,
+        "peak_day_part": peak_day_part,
+        "peak_value": activity_by_day_part[peak_day_part]
+    }
+
+
+def hour_article_index(df: pd.DataFrame) -> Dict[int, Dict[str, np.ndarray]]:
+    """
+    For every hour of the day, the distinct article ids read in that hour,
+    ordered by their first appearance in the event log, with that position.
+    """
+    events = pd.DataFrame({
+        "hour": df["event_time"].dt.hour,
+        "id": df["id"].to_numpy(),
+        "pos": np.arange(len(df))
+    }).dropna(subset=["hour"])
+    events = events.drop_duplicates(subset=["hour", "id"], keep="first")
+    return {
+        int(hour): {"ids": group["id"].to_numpy(), "pos": group["pos"].to_numpy()}
+        for hour, group in events.groupby("hour", sort=True)
+    }
+
+
+def articles_in_window(index: Dict[int, Dict[str, np.ndarray]], start_hour: int, end_hour: int, limit: int) -> List[str]:
+    """
+    Distinct articles read in [start_hour, end_hour) (wrapping past midnight
+    when start_hour > end_hour), in event-log order, capped at `limit`.
+    Only the first `limit` entries of each hour can reach the result.
+    """
+    if start_hour <= end_hour:
+        hours = [h for h in index if start_hour <= h < end_hour]
+    else:
+        hours = [h for h in index if h >= start_hour or h < end_hour]
+
+    candidates = []
+    for h in hours:
+        bucket = index[h]
+        candidates.extend(zip(bucket["pos"][:limit], bucket["ids"][:limit]))
+    candidates.sort(key=lambda x: x[0])
+
+    articles, seen = [], set()
+    for _, article_id in candidates:
+        if article_id not in seen:
+            seen.add(article_id)
+            articles.append(article_id)
+            if len(articles) == limit:
+                break
+    return articles
+
+
+def _safe(func, df: pd.DataFrame) -> Optional[Any]:
+    # Segments whose frame cannot be aggregated keep the live code path,
+    # so the tool raises the same error it always did.
+    try:
+        return func(df)
+    except Exception:
+        return None
+
+
+def build_segment_aggregates(user_segments: pd.DataFrame) -> Dict[Any, Dict[str, Any]]:
+    """
+    Materialises the per-segment aggregates used by the segment tools,
+    keyed by the same row label the tools use with `user_segments.loc`.
+    """
+    aggregates = {}
+    for label, df in user_segments["df"].items():
+        if not isinstance(df, pd.DataFrame):
+            continue
+        aggregates[label] = {
+            "engagement": _safe(engagement_stats, df),
+            "time_activity": _safe(time_activity, df),
+            "day_part": _safe(day_part_activity, df),
+            "hour_articles": _safe(hour_article_index, df)
+        }
+    return aggregates
+
+
+# ==========================================================
+#  SIDECAR FILE
+# ==========================================================
+def _source_signature(data_path: str) -> Dict[str, Any]:
+    # The columnar copy, when present, is what the data store loads
+    source = columnar_meta_path(data_path)
+    if not os.path.exists(source):
+        source = os.path.join(data_path, SEGMENTS_FILE)
+    stat = os.stat(source)
+    return {"file": os.path.basename(source), "size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def load_segment_aggregates(data_path: str) -> Optional[Dict[Any, Dict[str, Any]]]:
+    """Loads the sidecar file if it was built from the current segment pickle."""
+    path = os.path.join(data_path, AGGREGATES_FILE)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            payload = pkl.load(f)
+        if payload.get("source") != _source_signature(data_path):
+            print("⚠️ Segment aggregates sidecar is stale, recomputing at load.")
+            return None
+        return payload["aggregates"]
+    except Exception as e:
+        print(f"⚠️ Could not read segment aggregates sidecar: {e}")
+        return None
+
+
+def write_segment_aggregates(data_path: str, aggregates: Dict[Any, Dict[str, Any]]) -> str:
+    """Stores precomputed aggregates next to the segment pickle they derive from."""
+    path = os.path.join(data_path, AGGREGATES_FILE)
+    payload = {
+        "source": _source_signature(data_path),
+        "aggregates": aggregates
+    }
+    with open(path, "wb") as f:
+        pkl.dump(payload, f, protocol=pkl.HIGHEST_PROTOCOL)
+    return path
+
+
+if __name__ == "__main__":
+    # Usage: python -m utils.segment_aggregates [data_path]
+    from utils.data_store import DATA_PATH, DataStore
+
+    data_path = sys.argv[1] if len(sys.argv) > 1 else DATA_PATH
+    store = DataStore(data_path)
+    print(f"✅ Segment aggregates written to {write_segment_aggregates(data_path, store.segment_aggregates)}")
@@ -0,0 +1,180 @@
+import os
+import sys
+import shutil
+import pickle as pkl
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, Tuple
+
+COLUMNAR_DIR = "user_segments_columnar"
+META_FILE = "meta.pkl"
+FORMAT_VERSION = 1
+
+# Reader/session identifiers are only counted, never shown. They are
+# stored as integer surrogate ids: as categories, their millions of
+# distinct strings would be unpickled into every worker
+SURROGATE_COLUMNS = ("user_pseudo_id", "session_id_unique")
+
+
+# ==========================================================
+#  COLUMN ENCODING
+# ==========================================================
+def _encode_column(values: pd.Series, surrogate: bool = False) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """
+    Turns a column into a fixed-width array that can be memory mapped,
+    plus what is needed to rebuild the original column.
+    """
+    dtype = values.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        return (
+            values.cat.codes.to_numpy(),
+            {"kind": "categorical", "categories": dtype.categories, "ordered": dtype.ordered}
+        )
+    if isinstance(dtype, pd.DatetimeTZDtype):
+        return values.dt.tz_convert("UTC").dt.tz_localize(None).to_numpy("datetime64[ns]"), {"kind": "datetime_tz", "tz": str(dtype.tz)}
+    if dtype.kind in "biufcmM":
+        return values.to_numpy(), {"kind": "array"}
+    # Strings and other objects: sorted codes, so grouping and ordering
+    # behave as on the original values
+    try:
+        codes, categories = pd.factorize(values, sort=True)
+    except TypeError:
+        # Mixed, unorderable values: keep first-appearance order
+        codes, categories = pd.factorize(values)
+    if surrogate:
+        # Surrogate ids follow the sorted values, so counting, distinct
+        # counts and grouping order are unchanged; missing values stay NaN
+        if (codes < 0).any():
+            return np.where(codes < 0, np.nan, codes), {"kind": "surrogate"}
+        return codes.astype(np.int64), {"kind": "surrogate"}
+    # Store the codes in the width pandas uses for this many categories,
+    # so the loader can wrap them without a copy
+    codes = pd.Categorical.from_codes(codes, categories=categories).codes
+    return codes, {"kind": "codes", "categories": categories}
+
+
+def _decode_column(arr: np.ndarray, spec: Dict[str, Any]):
+    kind = spec["kind"]
+    if kind in ("array", "surrogate"):
+        return arr
+    if kind == "datetime_tz":
+        return pd.DatetimeIndex(arr).tz_localize("UTC").tz_convert(spec["tz"])
+    # Codes were validated when written; validating again would read every page
+    if kind == "categorical":
+        return pd.Categorical.from_codes(arr, dtype=pd.CategoricalDtype(spec["categories"], spec["ordered"]), validate=False)
+    return pd.Categorical.from_codes(arr, categories=spec["categories"], validate=False)
+
+
+# ==========================================================
+#  CONVERSION
+# ==========================================================
+def write_columnar_segments(data_path: str, segments: Dict[Any, Dict[str, Any]], surrogate_columns=SURROGATE_COLUMNS) -> str:
+    """
+    Writes the per-segment event tables as one .npy file per column
+    (data/user_segments_columnar/s<n>/c<i>.npy) and everything else
+    (titles, regions, docs, transition models, column specs) to meta.pkl.
+    The folder is replaced atomically. The pickle stays the source of
+    truth: surrogate-id columns do not keep their original strings.
+    """
+    target = os.path.join(data_path, COLUMNAR_DIR)
+    tmp = target + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    meta = {"version": FORMAT_VERSION, "segments": {}}
+    for n, (label, fields) in enumerate(segments.items()):
+        keys = list(fields)
+        fields = dict(fields)
+        df = fields.pop("df", None)
+        entry = {"keys": keys, "fields": fields, "table": None}
+        if isinstance(df, pd.DataFrame):
+            folder = f"s{n}"
+            os.makedirs(os.path.join(tmp, folder))
+            columns = []
+            for i, name in enumerate(df.columns):
+                arr, spec = _encode_column(df[name], surrogate=name in surrogate_columns)
+                np.save(os.path.join(tmp, folder, f"c{i}.npy"), np.ascontiguousarray(arr), allow_pickle=False)
+                columns.append({"name": name, **spec})
+            if isinstance(df.index, pd.RangeIndex):
+                index = {"range": (df.index.start, df.index.stop, df.index.step), "name": df.index.name}
+            else:
+                np.save(os.path.join(tmp, folder, "index.npy"), np.ascontiguousarray(df.index.to_numpy()), allow_pickle=False)
+                index = {"range": None, "name": df.index.name}
+            entry["table"] = {"folder": folder, "columns": columns, "index": index, "rows": len(df)}
+        meta["segments"][label] = entry
+
+    with open(os.path.join(tmp, META_FILE), "wb") as f:
+        pkl.dump(meta, f, protocol=pkl.HIGHEST_PROTOCOL)
+
+    previous = target + ".old"
+    shutil.rmtree(previous, ignore_errors=True)
+    if os.path.exists(target):
+        os.replace(target, previous)
+    os.replace(tmp, target)
+    shutil.rmtree(previous, ignore_errors=True)
+    return target
+
+
+# ==========================================================
+#  LOADING
+# ==========================================================
+def columnar_meta_path(data_path: str) -> str:
+    return os.path.join(data_path, COLUMNAR_DIR, META_FILE)
+
+
+def has_columnar_segments(data_path: str) -> bool:
+    return os.path.exists(columnar_meta_path(data_path))
+
+
+def _open_table(folder: str, table: Dict[str, Any]) -> pd.DataFrame:
+    columns = {}
+    for i, spec in enumerate(table["columns"]):
+        # Read-only memory map: pages are loaded on access and shared
+        # between every process that maps the same file
+        arr = np.load(os.path.join(folder, f"c{i}.npy"), mmap_mode="r")
+        columns[spec["name"]] = _decode_column(arr, spec)
+
+    index = table["index"]
+    if index["range"] is not None:
+        idx = pd.RangeIndex(*index["range"], name=index["name"])
+    else:
+        idx = pd.Index(np.load(os.path.join(folder, "index.npy"), mmap_mode="r"), name=index["name"], copy=False)
+    return pd.DataFrame(columns, index=idx, copy=False)
+
+
+def load_columnar_segments(data_path: str) -> Dict[Any, Dict[str, Any]]:
+    """
+    Returns the same {segment: fields} mapping as user_segments_viz.pkl,
+    with every 'df' backed by memory-mapped column files (zero copy).
+    """
+    base = os.path.join(data_path, COLUMNAR_DIR)
+    with open(os.path.join(base, META_FILE), "rb") as f:
+        meta = pkl.load(f)
+    if meta.get("version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported columnar segments version: {meta.get('version')}")
+
+    segments = {}
+    for label, entry in meta["segments"].items():
+        fields = dict(entry["fields"])
+        table = entry["table"]
+        if table is not None:
+            fields["df"] = _open_table(os.path.join(base, table["folder"]), table)
+        # Original field order (it sets the column order of user_segments)
+        segments[label] = {k: fields[k] for k in entry["keys"] if k in fields}
+    return segments
+
+
+if __name__ == "__main__":
+    # Usage: python -m utils.segment_columns [data_path]
+    from utils.data_store import DATA_PATH
+    from utils.segment_aggregates import SEGMENTS_FILE, build_segment_aggregates, write_segment_aggregates
+
+    data_path = sys.argv[1] if len(sys.argv) > 1 else DATA_PATH
+    with open(os.path.join(data_path, SEGMENTS_FILE), "rb") as f:
+        segments = pkl.load(f)
+    print(f"✅ Columnar segments written to {write_columnar_segments(data_path, segments)}")
+
+    # The aggregates sidecar is keyed on the segment source, refresh it too
+    user_segments = pd.DataFrame.from_dict(segments, orient="index").reset_index()
+    user_segments.rename(columns={'index': 'id'}, inplace=True)
+    print(f"✅ Segment aggregates written to {write_segment_aggregates(data_path, build_segment_aggregates(user_segments))}")
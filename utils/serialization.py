@@ -0,0 +1,49 @@
+import datetime
+import orjson
+import numpy as np
+import pandas as pd
+from typing import Any
+
+# Non-string keys are written as strings (as json.dumps does); datetimes
+# go through _default so pandas Timestamps keep their isoformat()
+OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+def _default(value: Any) -> Any:
+    """Types orjson does not handle natively, converted to JSON-safe values."""
+    if isinstance(value, pd.DataFrame):
+        return value.to_dict(orient="records")
+    if isinstance(value, (pd.Timestamp, datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    # Fallback: convert unknown objects to string
+    return str(value)
+
+
+def dumps(value: Any, indent: bool = False) -> bytes:
+    """UTF-8 JSON of any tool result, plan or trace payload (NaN/inf become null)."""
+    return orjson.dumps(value, default=_default, option=(OPTIONS | orjson.OPT_INDENT_2) if indent else OPTIONS)
+
+
+def loads(data: bytes) -> Any:
+    return orjson.loads(data)
+
+
+def to_jsonable(value: Any) -> Any:
+    """Plain JSON-safe copy of a value (pandas/numpy/datetime converted)."""
+    return orjson.loads(dumps(value))
+
+
+def raw(data: bytes) -> orjson.Fragment:
+    """Already serialized JSON, embedded as-is by dumps() and the DB engines."""
+    return orjson.Fragment(data)
+
+
+def json_serializer(value: Any) -> str:
+    """SQLAlchemy `json_serializer` for JSON columns (accepts raw fragments)."""
+    return dumps(value).decode("utf-8")
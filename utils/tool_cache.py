@@ -0,0 +1,85 @@
+import json
+import inspect
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Tuple
+
+TOOL_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Returned by get() on a miss (None is a valid tool result)
+MISS = object()
+
+
+class ToolResultCache:
+    """
+    Memoizes tool results across runs. Tools are pure functions of the data
+    store snapshot, so a result is identified by the tool name, its
+    canonical arguments and the store version.
+
+    Values are the JSON bytes of the result (utils.serialization.dumps),
+    produced once per result and reused as-is: they are immutable, so
+    every hit decodes an independent copy, and their size is what bounds
+    the cache (least recently used entries are evicted first).
+    """
+
+    def __init__(self, max_bytes: int = TOOL_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(tool_name: str, func: Callable, args: Dict[str, Any], version: int) -> Tuple:
+        """
+        Canonical key for a call: defaults are filled in (so an omitted
+        top_n equals the explicit default) and arguments are ordered by name.
+        """
+        try:
+            bound = inspect.signature(func).bind(**args)
+            bound.apply_defaults()
+            args = bound.arguments
+        except TypeError:
+            # Let the tool raise its own error on the real call
+            pass
+        canonical = json.dumps(args, sort_keys=True, default=str, ensure_ascii=False)
+        return (tool_name, canonical, version)
+
+    def get(self, key: Tuple) -> Any:
+        """JSON bytes of the cached result, or MISS."""
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self.misses += 1
+                return MISS
+            self.hits += 1
+            self._entries.move_to_end(key)
+        return data
+
+    def put(self, key: Tuple, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._entries[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self, *_) -> None:
+        """Drops every entry (usable directly as a data store reload hook)."""
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "hits": self.hits,
+            "misses": self.misses
+        }
@@ -1,35 +1,46 @@
-import os
-import json
-import pickle as pkl
 import pandas as pd
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
+from utils.data_store import DataStore, get_data_store
+from utils import segment_aggregates as aggs
+
+# Expected argument types per tool; plan arguments arrive as strings and
+# are cast before the call
+TOOL_ARG_TYPES = {
+    "get_segment_description": {"segment_id": int},
+    "get_segment_engagement_stats": {"segment_id": int},
+    "get_topic_transitions": {"segment_id": int, "top_n": int},
+    "get_next_topic_prediction": {"segment_id": int, "current_topic": str, "top_n": int},
+    "get_segment_regions": {"segment_id": int, "top_n": int},
+    "get_segment_time_activity": {"segment_id": int},
+    "get_segment_activity_by_day_part": {"segment_id": int},
+    "get_topic_transitions_batch": {"segment_ids": list, "top_n": int},
+    "get_segment_engagement_stats_batch": {"segment_ids": list},
+    "get_segment_regions_batch": {"segment_ids": list, "top_n": int},
+    "get_segment_time_activity_batch": {"segment_ids": list},
+    "get_segment_activity_by_day_part_batch": {"segment_ids": list},
+    "get_segment_articles_by_time": {"segment_id": int, "start_hour": int, "end_hour": int},
+    "get_segment_engage_docs": {"segment_id": int},
+    "get_segment_not_engage_docs": {"segment_id": int},
+    "get_segment_high_rep_docs": {"segment_id": int},
+    "get_articles_info": {"articles_ids": list},
+    "get_top_recent_articles": {"articles_ids": list, "top": int},
+    "get_unique_clusters": {"articles_ids": list},
+    "get_news_topics_info": {"topics_id": list},
+    "get_news_topics_high_docs": {"topics_id": list},
+    "get_news_topics_low_docs": {"topics_id": list},
+}
 
 class Tools:
-    def __init__(self):
-        # Load the user segments
-        self.user_segments = pd.DataFrame()
-        PROJECT_ROOT = os.path.abspath(os.getcwd()) 
-        DATA_PATH = os.path.join(PROJECT_ROOT, "data/")
-
-        # Load the uswe segment data
-        with open(os.path.join(DATA_PATH, "user_segments_viz.pkl"), "rb") as f:
-            data = pkl.load(f)
-            self.user_segments = pd.DataFrame.from_dict(data, orient="index").reset_index()
-            self.user_segments.rename(columns={'index': 'id'}, inplace=True)
-
-        # Load news topics data
-        self.news_topics = pd.DataFrame()
-        with open(os.path.join(DATA_PATH, "news_topics.pkl"), "rb") as f:
-            self.news_topics = pkl.load(f)
-            self.news_topics = pd.DataFrame.from_dict(data, orient="index").reset_index()
-            self.news_topics.rename(columns={'index': 'id'}, inplace=True)
-
-        # Load the raw news articles data
-        self.news_raw = pd.DataFrame()
-        with open(os.path.join(DATA_PATH, "news_viz2.json"), "r", encoding="utf-8") as f:
-            self.news_raw = pd.DataFrame(json.load(f)).reset_index()
-            self.news_raw.rename(columns={'index': 'id'}, inplace=True)
-        
+    def __init__(self, store: Optional[DataStore] = None):
+        # Bind to the shared, read-only data store (loaded once per process)
+        self.store = store or get_data_store()
+        self.user_segments = self.store.user_segments
+        self.news_topics = self.store.news_topics
+        self.news_raw = self.store.news_raw
+        self.segment_aggregates = self.store.segment_aggregates
+        self.articles = self.store.articles
+        self.topic_transitions = self.store.topic_transitions
+
         self.TASK_FUNCS = {
             # User Segment tools
             "get_segment_description": self.get_segment_description, 
@@ -44,6 +55,13 @@ class Tools:
             "get_segment_high_rep_docs": self.get_segment_high_rep_docs, 
             "get_segment_activity_by_day_part": self.get_segment_activity_by_day_part, 
 
+            # Multi-segment tools (one task instead of one per segment)
+            "get_topic_transitions_batch": self.get_topic_transitions_batch, 
+            "get_segment_engagement_stats_batch": self.get_segment_engagement_stats_batch, 
+            "get_segment_regions_batch": self.get_segment_regions_batch, 
+            "get_segment_time_activity_batch": self.get_segment_time_activity_batch, 
+            "get_segment_activity_by_day_part_batch": self.get_segment_activity_by_day_part_batch, 
+
             # Articles topics tools
             "get_articles_info": self.get_articles_info, 
             "get_top_recent_articles": self.get_top_recent_articles, 
@@ -56,6 +74,35 @@ class Tools:
         }
 
 
+    def _segment_aggregate(self, segment_id: int, name: str, compute):
+        """
+        Returns a precomputed per-segment aggregate, falling back to computing
+        it from the segment's event frame when it was not materialised.
+        """
+        aggregate = self.segment_aggregates.get(segment_id, {}).get(name)
+        if aggregate is None:
+            aggregate = compute(self.user_segments.loc[segment_id, "df"])
+        return aggregate
+
+    def _segment_aggregates(self, segment_ids: List[int], name: str, compute) -> List[Dict[str, Any]]:
+        """
+        Batch form of _segment_aggregate: the segments without a precomputed
+        aggregate are read with a single row selection, then computed.
+        """
+        found = {s: self.segment_aggregates.get(s, {}).get(name) for s in segment_ids}
+        missing = list(dict.fromkeys(s for s, aggregate in found.items() if aggregate is None))
+        if missing:
+            frames = self.user_segments.loc[missing, "df"]
+            found.update({s: compute(df) for s, df in zip(missing, frames)})
+        return [found[s] for s in segment_ids]
+
+    @staticmethod
+    def _segment_ids(segment_ids: List[int]) -> List[int]:
+        try:
+            return [int(segment_id) for segment_id in segment_ids]
+        except (ValueError, TypeError):
+            raise ValueError(f"Invalid segment_ids: {segment_ids}. Must be a list of integers.")
+
     # User Segment Analysis tools
     def get_segment_description(self, segment_id: int) -> Dict[str, Any]:
         try:
@@ -79,16 +126,8 @@ class Tools:
         except (ValueError, TypeError):
             raise ValueError(f"Invalid segment_id: {segment_id}. Must be an integer.")
 
-        df = self.user_segments.loc[segment_id, "df"].copy()
-        df = df[df["true_engagement"] == True]
-        return {
-            "segment_id": segment_id,
-            "avg_scroll_depth": round(float(df["avg_scroll_depth"].mean()), 2),
-            "avg_engaged_secs": round(float(df["avg_engaged_secs"].mean()), 2),
-            "avg_words_per_minute": round(float(df["avg_words_per_minute"].mean()), 2),
-            "median_engaged_secs": round(float(df["avg_engaged_secs"].median()), 2),
-            "engagement_rate": round(len(df[df["true_engagement"] == True]) / len(df), 3)
-        }
+        stats = self._segment_aggregate(segment_id, "engagement", aggs.engagement_stats)
+        return {"segment_id": segment_id, **stats}
 
     def get_topic_transitions(self, segment_id: int, top_n = 10) -> List[Dict[str, Any]]:
         try:
@@ -97,18 +136,16 @@ class Tools:
         except (ValueError, TypeError):
             raise ValueError(f"Invalid segment_id: {segment_id}. Must be an integer.")
         
-        seq_model = self.user_segments.loc[segment_id, "seq_model"]['df'].copy()
-        if isinstance(seq_model, pd.DataFrame):
-            transitions = []
-            for from_topic in seq_model.index:
-                for to_topic in seq_model.columns:
-                    prob = seq_model.at[from_topic, to_topic]
-                    transitions.append({
-                        "from_topic": from_topic,
-                        "to_topic": to_topic,
-                        "probability": round(float(prob), 2)
-                    })
-        return sorted(transitions, key=lambda x: x["probability"], reverse=True)[:top_n]
+        return self.topic_transitions.top(segment_id, top_n)
+
+    def get_topic_transitions_batch(self, segment_ids: List[int], top_n = 10) -> List[Dict[str, Any]]:
+        segment_ids = self._segment_ids(segment_ids)
+        try:
+            top_n = int(top_n)
+        except (ValueError, TypeError):
+            raise ValueError(f"Invalid top_n: {top_n}. Must be an integer.")
+
+        return self.topic_transitions.top_batch(segment_ids, top_n)
 
     def get_next_topic_prediction(self, segment_id: int, current_topic: str, top_n = 3) -> Dict[str, Any]:
         try:
@@ -157,30 +194,12 @@ class Tools:
         except (ValueError, TypeError):
             raise ValueError(f"Invalid segment_id: {segment_id}. Must be an integer.")
         
-        df = self.user_segments.loc[segment_id, "df"].copy()
-        if "time_bin" in df.columns:
-            time_col = "time_bin"
-        elif "event_time" in df.columns:
-            df["time_bin"] = df["event_time"].dt.strftime("%H:00-%H:59")
-            time_col = "time_bin"
-        else:
-            raise ValueError("Expected a 'time_bin' or 'event_time' column in the dataframe.")
-        activity = df.groupby(time_col).size().reset_index(name="reads")
-        try:
-            activity["hour_order"] = activity[time_col].str.slice(0, 2).astype(int)
-            activity = activity.sort_values("hour_order")
-        except Exception:
-            pass
-        # Identify the peak activity time
-        peak_row = activity.loc[activity["reads"].idxmax()]
-        peak_activity = str(peak_row[time_col])
-        peak_value = int(peak_row["reads"])
-        activity_list = activity[[time_col, "reads"]].rename(columns={time_col: "hour"}).to_dict(orient="records")
+        activity = self._segment_aggregate(segment_id, "time_activity", aggs.time_activity)
         return {
             "segment_id": segment_id,
-            "activity_by_hour": activity_list,
-            "peak_activity": peak_activity,
-            "peak_value": peak_value
+            "activity_by_hour": [dict(row) for row in activity["activity_by_hour"]],
+            "peak_activity": activity["peak_activity"],
+            "peak_value": activity["peak_value"]
         }
 
 
@@ -192,18 +211,13 @@ class Tools:
         except (ValueError, TypeError):
             raise ValueError(f"Invalid segment_id: {segment_id}. Must be an integer.")
         
-        df = self.user_segments.loc[segment_id, "df"].copy()
-        df["hour"] = df["event_time"].dt.hour
-        if start_hour <= end_hour:
-            filtered_df = df[(df["hour"] >= start_hour) & (df["hour"] < end_hour)]
-        else:
-            filtered_df = df[(df["hour"] >= start_hour) | (df["hour"] < end_hour)]
-        articles_read = filtered_df["id"].unique().tolist()
+        index = self._segment_aggregate(segment_id, "hour_articles", aggs.hour_article_index)
+        articles_read = aggs.articles_in_window(index, start_hour, end_hour, limit=10)   # Limit to 10 y now
         return {
             "segment_id": segment_id,
             "start_hour": start_hour,
             "end_hour": end_hour,
-            "articles": articles_read[:10]   # Limit to 10 y now
+            "articles": articles_read
         }
 
     def get_segment_engage_docs(self, segment_id: int) -> Dict[str, Any]:
@@ -248,54 +262,79 @@ class Tools:
         except (ValueError, TypeError):
             raise ValueError(f"Invalid segment_id: {segment_id}. Must be an integer.")
         
-        df = self.user_segments.loc[segment_id, "df"]
-        if "event_on_day_part" not in df.columns:
-            raise ValueError("The dataframe must contain an 'event_on_day_part' column.")
-        day_part_counts = df["event_on_day_part"].value_counts().to_dict()
-        standard_parts = ["morning", "afternoon", "evening", "night"]
-        activity_by_day_part = {part: day_part_counts.get(part, 0) for part in standard_parts}
-        peak_day_part = max(activity_by_day_part, key=activity_by_day_part.get)
-        peak_value = activity_by_day_part[peak_day_part]
+        activity = self._segment_aggregate(segment_id, "day_part", aggs.day_part_activity)
         return {
             "segment_id": segment_id,
-            "activity_by_day_part": activity_by_day_part,
-            "peak_day_part": peak_day_part,
-            "peak_value": int(peak_value)
+            "activity_by_day_part": dict(activity["activity_by_day_part"]),
+            "peak_day_part": activity["peak_day_part"],
+            "peak_value": activity["peak_value"]
         }
 
 
+    # Multi-segment tools: one task for a comparison over N segments, with
+    # the segment rows and aggregates looked up once for all of them
+    def get_segment_engagement_stats_batch(self, segment_ids: List[int]) -> List[Dict[str, Any]]:
+        segment_ids = self._segment_ids(segment_ids)
+        stats = self._segment_aggregates(segment_ids, "engagement", aggs.engagement_stats)
+        return [{"segment_id": segment_id, **s} for segment_id, s in zip(segment_ids, stats)]
+
+    def get_segment_regions_batch(self, segment_ids: List[int], top_n: int = 7) -> List[Dict[str, Any]]:
+        segment_ids = self._segment_ids(segment_ids)
+        try:
+            top_n = int(top_n)
+        except (ValueError, TypeError):
+            raise ValueError(f"Invalid top_n: {top_n}. Must be an integer.")
+
+        results = []
+        for segment_id, regions in zip(segment_ids, self.user_segments.loc[segment_ids, "regions"]):
+            if not isinstance(regions, dict):
+                raise TypeError("Expected 'regions' field to be a dictionary.")
+            sorted_regions = sorted(regions.items(), key=lambda x: x[1], reverse=True)[:top_n]
+            results.append({
+                "segment_id": segment_id,
+                "regions": [{"region": r, "readers": int(v)} for r, v in sorted_regions]
+            })
+        return results
+
+    def get_segment_time_activity_batch(self, segment_ids: List[int]) -> List[Dict[str, Any]]:
+        segment_ids = self._segment_ids(segment_ids)
+        activities = self._segment_aggregates(segment_ids, "time_activity", aggs.time_activity)
+        return [
+            {
+                "segment_id": segment_id,
+                "activity_by_hour": [dict(row) for row in activity["activity_by_hour"]],
+                "peak_activity": activity["peak_activity"],
+                "peak_value": activity["peak_value"]
+            }
+            for segment_id, activity in zip(segment_ids, activities)
+        ]
+
+    def get_segment_activity_by_day_part_batch(self, segment_ids: List[int]) -> List[Dict[str, Any]]:
+        segment_ids = self._segment_ids(segment_ids)
+        activities = self._segment_aggregates(segment_ids, "day_part", aggs.day_part_activity)
+        return [
+            {
+                "segment_id": segment_id,
+                "activity_by_day_part": dict(activity["activity_by_day_part"]),
+                "peak_day_part": activity["peak_day_part"],
+                "peak_value": activity["peak_value"]
+            }
+            for segment_id, activity in zip(segment_ids, activities)
+        ]
+
+
     # Article tools 
     def get_articles_info(self, articles_ids: List[str]):
-        cols = ['id', 'title', 'teaserText', 'first_publication_date']
-        df = self.news_raw[self.news_raw['id'].isin(articles_ids)][cols].copy()
-        # Convert to datetime safely (if numeric timestamps)
-        df['first_publication_date'] = pd.to_datetime(
-            df['first_publication_date'], unit='ms', errors='coerce'
-        )
-        # Convert to ISO-formatted string (safe for JSON serialization)
-        df['first_publication_date'] = df['first_publication_date'].dt.strftime('%Y-%m-%d %H:%M:%S')
-        return df
+        # Indexed lookup; publication dates are already formatted as '%Y-%m-%d %H:%M:%S'
+        return self.articles.info(articles_ids)
 
 
     def get_top_recent_articles(self, articles_ids: List[str], top: int):
-        cols = ['title', 'teaserText', 'first_publication_date']
-        filtered = self.news_raw.loc[self.news_raw['id'].isin(articles_ids), cols]
-        filtered = filtered.copy()
-        # Convert to datetime safely
-        filtered['first_publication_date'] = pd.to_datetime(
-            filtered['first_publication_date'], unit='ms', errors='coerce'
-        )
-        # Convert Timestamp to string (ISO 8601)
-        filtered['first_publication_date'] = filtered['first_publication_date'].dt.strftime('%Y-%m-%d %H:%M:%S')
-        # Sort and return
-        return filtered.sort_values(by='first_publication_date', ascending=False).head(top)
+        return self.articles.most_recent(articles_ids, top)
 
 
     def get_unique_clusters(self, articles_ids: List[str]):
-        filtered = self.news_raw.loc[self.news_raw['id'].isin(articles_ids)]
-        clusters = filtered['clusters'].dropna().tolist()
-        unique_clusters = sorted(set([c for sublist in clusters for c in sublist]))
-        return unique_clusters
+        return self.articles.unique_clusters(articles_ids)
 
 
     # News topics
@@ -319,3 +358,21 @@ class Tools:
 
 
 
+
+
+
+# ==========================================================
+#  SHARED TOOLS INSTANCE
+# ==========================================================
+_tools: Optional[Tools] = None
+
+def get_tools() -> Tools:
+    """
+    Returns a Tools instance bound to the current data store snapshot,
+    rebuilding it only when the store has been reloaded.
+    """
+    global _tools
+    store = get_data_store()
+    if _tools is None or _tools.store is not store:
+        _tools = Tools(store)
+    return _tools
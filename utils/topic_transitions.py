@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List
+
+
+class TopicTransitions:
+    """
+    Topic transition matrices of every segment stacked into one 3-D array
+    (segment x from_topic x to_topic), built once per data snapshot.
+
+    Probabilities are stored already rounded to 2 decimals, the precision
+    the tools rank and report them with, so ties between cells are broken
+    exactly as before: row-major order of the segment's matrix. Segments
+    with smaller matrices only use the top-left block of their slice.
+    """
+
+    def __init__(self, user_segments: pd.DataFrame):
+        models = {}
+        for label, seq_model in user_segments["seq_model"].items():
+            df = seq_model.get("df") if isinstance(seq_model, dict) else None
+            if isinstance(df, pd.DataFrame):
+                models[label] = df
+
+        n_rows = max((df.shape[0] for df in models.values()), default=0)
+        n_cols = max((df.shape[1] for df in models.values()), default=0)
+        self.matrix = np.full((len(models), n_rows, n_cols), np.nan)
+        self.position: Dict[Any, int] = {}
+        self.labels: List[tuple] = []
+        for pos, (label, df) in enumerate(models.items()):
+            # Python's round (not np.round) to match the reported values
+            rounded = [[round(float(v), 2) for v in row] for row in df.to_numpy()]
+            self.matrix[pos, :df.shape[0], :df.shape[1]] = rounded
+            self.position[label] = pos
+            self.labels.append((list(df.index), list(df.columns)))
+        # Ranking key: missing probabilities rank below every value
+        self.rank = np.where(np.isnan(self.matrix), -np.inf, self.matrix)
+
+    def _segment(self, segment_id) -> int:
+        if segment_id not in self.position:
+            raise KeyError(segment_id)
+        return self.position[segment_id]
+
+    @staticmethod
+    def _top_cells(key: np.ndarray, top_n: int) -> np.ndarray:
+        """
+        Flat indices of the top_n cells, highest first, ties in row-major order.
+        Only the cells at or above the top_n-th value are sorted.
+        """
+        # Same slicing semantics as list[:top_n]
+        count = len(range(len(key))[:top_n])
+        if count == 0:
+            return np.empty(0, dtype=np.int64)
+        if count < len(key):
+            threshold = np.partition(key, len(key) - count)[len(key) - count]
+            candidates = np.flatnonzero(key >= threshold)
+        else:
+            candidates = np.arange(len(key))
+        order = np.argsort(-key[candidates], kind="stable")
+        return candidates[order][:count]
+
+    def _top(self, pos: int, top_n: int) -> List[Dict[str, Any]]:
+        rows, cols = self.labels[pos]
+        block = (pos, slice(0, len(rows)), slice(0, len(cols)))
+        values = self.matrix[block].ravel()
+        cells = self._top_cells(self.rank[block].ravel(), top_n)
+        return [
+            {
+                "from_topic": rows[i // len(cols)],
+                "to_topic": cols[i % len(cols)],
+                "probability": float(values[i])
+            }
+            for i in cells.tolist()
+        ]
+
+    def top(self, segment_id, top_n: int) -> List[Dict[str, Any]]:
+        """The top_n most probable transitions of one segment."""
+        return self._top(self._segment(segment_id), top_n)
+
+    def top_batch(self, segment_ids: List, top_n: int) -> List[Dict[str, Any]]:
+        """
+        The top_n most probable transitions of several segments, ranked with
+        one stable sort over their stacked slices. Cells outside a segment's
+        block rank below its missing cells, so each segment keeps the order
+        of top().
+        """
+        positions = [self._segment(s) for s in segment_ids]
+        if not positions:
+            return []
+        n_cols = self.matrix.shape[2]
+        shapes = np.array([(len(self.labels[p][0]), len(self.labels[p][1])) for p in positions])
+        inside = (
+            (np.arange(self.matrix.shape[1])[None, :, None] < shapes[:, 0, None, None])
+            & (np.arange(n_cols)[None, None, :] < shapes[:, 1, None, None])
+        )
+        key = np.where(np.isneginf(self.rank[positions]), -1.0, self.rank[positions])
+        key = np.where(inside, key, -2.0).reshape(len(positions), -1)
+        order = np.argsort(-key, axis=1, kind="stable")
+
+        results = []
+        for segment_id, pos, (n_rows, n_block_cols), cells in zip(segment_ids, positions, shapes, order):
+            rows, cols = self.labels[pos]
+            count = len(range(n_rows * n_block_cols)[:top_n])
+            results.append({
+                "segment_id": segment_id,
+                "transitions": [
+                    {
+                        "from_topic": rows[i // n_cols],
+                        "to_topic": cols[i % n_cols],
+                        "probability": float(self.matrix[pos, i // n_cols, i % n_cols])
+                    }
+                    for i in cells[:count].tolist()
+                ]
+            })
+        return results
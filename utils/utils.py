@@ -6,10 +6,13 @@ def load_config(path: str):
     with open(path, "r") as f:
         return yaml.safe_load(f)
     
+PROMPTS_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../config/prompts"))
+
+def prompt_path(name: str) -> str:
+    return os.path.join(PROMPTS_DIR, f"{name}.txt")
+
 def load_prompt(name: str) -> str:
-    base_dir = os.path.dirname(os.getcwd())
-    config_path = os.path.abspath(os.path.join(base_dir, "Thesis-AI/config/prompts", f"{name}.txt"))
-    with open(config_path, "r") as file:
+    with open(prompt_path(name), "r") as file:
         return file.read()
     
 class LLMConfig(BaseModel):
@@ -22,5 +25,21 @@ class PromptConfig(BaseModel):
     planning: str
     response: str
 
+class CheckpointerConfig(BaseModel):
+    backend: str = "memory"          # "memory" | "database"
+    max_threads: int = 256           # memory: threads kept before evicting the least recently used
+    max_idle_minutes: int = 120      # memory: threads idle longer than this are evicted
+
+class ResponseCacheConfig(BaseModel):
+    enabled: bool = True
+    ttl_hours: float = 24            # cached answers older than this are regenerated
+    max_entries: int = 5000          # least recently used answers beyond this are evicted
+
+class CompactionConfig(BaseModel):
+    max_tokens: int = 3000           # tool outputs in the response prompt are summarised to fit this
+
 class Settings(BaseModel):
     llm: LLMConfig
+    checkpointer: CheckpointerConfig = CheckpointerConfig()
+    response_cache: ResponseCacheConfig = ResponseCacheConfig()
+    compaction: CompactionConfig = CompactionConfig()